@@ -1,13 +1,42 @@
+import atexit
+from collections import Counter
+from datetime import date
+import io
+from itertools import islice
+import threading
+from typing import Optional
+
+import click
 from dotenv import load_dotenv
 from flask import Flask, jsonify, make_response, Response, request
 from werkzeug.exceptions import BadRequest, Unauthorized
 # from flask_cors import CORS
 
 from config import ProductionConfig
+from stock_portfolio.clients.http_client import http_client
+from stock_portfolio.clients.redis_client import redis_client
 from stock_portfolio.db import db
-from stock_portfolio.models.stock_model import UserStocks
+from stock_portfolio.models.price_history_model import PriceHistory
+from stock_portfolio.models.stock_model import (
+    WARMUP_CHUNK_SIZE,
+    WARMUP_MAX_ROWS_PER_SECOND,
+    UserStocks,
+    quote_provider,
+    stock_cache_reads,
+    stock_cache_write_stats,
+)
 from stock_portfolio.models.mongo_session_model import login_user, logout_user
-from stock_portfolio.models.user_model import Users
+from stock_portfolio.models.user_model import Users, user_cache
+from stock_portfolio.utils.cache_reconciler import RECONCILE_BATCH, CacheReconciler
+from stock_portfolio.utils.local_cache import local_cache
+from stock_portfolio.utils.password_hasher import PasswordHasher, benchmark_logins, password_hasher
+from stock_portfolio.utils.price_refresher import PriceRefresher
+from stock_portfolio.utils.quote_cache import quote_cache
+from stock_portfolio.utils.record_codec import migrate_legacy_records
+from stock_portfolio.utils.session_store import session_store
+from stock_portfolio.utils.user_import import PROVISION_CHUNK_SIZE, read_user_rows, user_file_format
+from stock_portfolio.utils.single_flight import price_flight
+from stock_portfolio.utils.upstream_scheduler import alpha_vantage_scheduler
 import logging
 
 # Load environment variables from .env file
@@ -16,6 +45,12 @@ app = Flask(__name__)
 
 logging.basicConfig(level=logging.INFO)
 
+MAX_BATCH_SYMBOLS = 100  # Upper bound on symbols per /api/stock-prices request
+MAX_BATCH_TRADES = 1000  # Upper bound on orders per /api/trades request
+MAX_BULK_USERS = 1000  # Upper bound on rows per /api/users/bulk request; larger files go through provision-users
+WARMUP_LOCK_KEY = "stocks:warmup:lock"
+WARMUP_LOCK_TTL = 300  # Seconds before another worker may warm the cache again
+
 def create_app(config_class=ProductionConfig):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -26,6 +61,32 @@ def create_app(config_class=ProductionConfig):
 
     user_stock = UserStocks()
 
+    price_refresher = None
+    if app.config.get('PRICE_REFRESHER_ENABLED'):
+        price_refresher = PriceRefresher(app)
+        price_refresher.start()
+        atexit.register(price_refresher.stop)
+    app.extensions['price_refresher'] = price_refresher
+
+    local_cache.enabled = bool(app.config.get('LOCAL_CACHE_ENABLED'))
+    if local_cache.enabled:
+        atexit.register(local_cache.stop)
+
+    user_cache.enabled = bool(app.config.get('USER_CACHE_ENABLED'))
+    if user_cache.enabled:
+        atexit.register(user_cache.stop)
+
+    if app.config.get('CACHE_WARMUP_ON_START'):
+        # Warm in the background so the app starts serving (from SQL) straight away
+        threading.Thread(target=warm_cache, args=(app,), name="cache-warmup", daemon=True).start()
+
+    cache_reconciler = None
+    if app.config.get('CACHE_RECONCILER_ENABLED'):
+        cache_reconciler = CacheReconciler(app)
+        cache_reconciler.start()
+        atexit.register(cache_reconciler.stop)
+    app.extensions['cache_reconciler'] = cache_reconciler
+
     ####################################################
     #
     # Healthchecks
@@ -44,6 +105,39 @@ def create_app(config_class=ProductionConfig):
         app.logger.info('Health check')
         return make_response(jsonify({'status': 'healthy'}), 200)
 
+    @app.route('/api/stats', methods=['GET'])
+    def stats() -> Response:
+        """
+        Route to report cache counters.
+
+        Returns:
+            JSON response containing hit and miss counters for the quote cache,
+            coalescing counters for concurrent price lookups, per-host latency
+            of outbound HTTP calls, the Alpha Vantage request budget, quote provider
+            circuit breaker and hedging counters, the latency of commit-time stock cache write-through, hit
+            ratios for the in-process and Redis stock cache tiers (the Redis quote tier is `quote_cache`), when the background price refresher is enabled its
+            per-symbol refresh lag, when the cache reconciler is enabled the
+            drift it has found, the password KDF settings and hashing latency,
+            session token lookups, and user lookup cache hits and misses.
+        """
+        return make_response(jsonify({
+            'quote_cache': quote_cache.stats(),
+            'price_flight': price_flight.stats(),
+            'http': http_client.stats(),
+            'alpha_vantage_scheduler': alpha_vantage_scheduler.stats(),
+            'quote_provider': quote_provider.stats(),
+            'price_refresher': price_refresher.stats() if price_refresher else None,
+            'stock_cache_write': stock_cache_write_stats.snapshot(),
+            'cache_tiers': {
+                'local': local_cache.stats(),
+                'redis_stocks': stock_cache_reads.snapshot(),
+            },
+            'cache_reconciler': cache_reconciler.stats() if cache_reconciler else None,
+            'password_hasher': password_hasher.stats(),
+            'sessions': session_store.stats(),
+            'user_cache': user_cache.stats(),
+        }), 200)
+
     ##########################################################
     #
     # User management
@@ -87,6 +181,59 @@ def create_app(config_class=ProductionConfig):
             app.logger.error("Failed to add user: %s", str(e))
             return make_response(jsonify({'error': str(e)}), 500)
 
+    @app.route('/api/users/bulk', methods=['POST'])
+    def bulk_create_users() -> Response:
+        """
+        Route to provision many users from a CSV or NDJSON file.
+
+        The file is either the request body (Content-Type `text/csv` or
+        `application/x-ndjson`) or a multipart upload in the `file` field, named
+        `.csv`, `.ndjson` or `.jsonl`. CSV files need a `username,password` header;
+        NDJSON files hold one `{"username": ..., "password": ...}` object per line.
+        At most MAX_BULK_USERS rows are accepted; the file is checked against the limit
+        before any user is created, and users are then created in chunks. Larger files
+        go through the `provision-users` command.
+
+        Returns:
+            JSON response with the number of users created, duplicates and invalid rows,
+            and a report per row.
+
+        Raises:
+            400 error if the file format is not recognised, the file is malformed or it
+            holds more than MAX_BULK_USERS rows.
+            500 error if there is an issue adding the users to the database; chunks
+            before the failing one stay created.
+        """
+        upload = request.files.get('file')
+        fmt = user_file_format(upload.filename if upload else request.content_type)
+        if fmt is None:
+            return make_response(jsonify({'error': 'Send a CSV or NDJSON file as the body or in the "file" field'}), 400)
+
+        stream = upload.stream if upload else request.stream
+        lines = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        try:
+            rows = list(islice(read_user_rows(lines, fmt), MAX_BULK_USERS + 1))
+            if len(rows) > MAX_BULK_USERS:
+                app.logger.warning("Rejected bulk user file with more than %d rows", MAX_BULK_USERS)
+                return make_response(jsonify({'error': f"At most {MAX_BULK_USERS} users may be provisioned at once"}), 400)
+            reports = list(Users.bulk_create_users(rows))
+        except (ValueError, UnicodeDecodeError) as e:
+            app.logger.warning("Rejected bulk user file: %s", str(e))
+            return make_response(jsonify({'error': str(e)}), 400)
+        except Exception as e:
+            app.logger.error("Failed to bulk add users: %s", str(e))
+            return make_response(jsonify({'error': str(e)}), 500)
+
+        counts = Counter(report['status'] for report in reports)
+        app.logger.info("Bulk user provisioning: %d created, %d duplicates, %d invalid",
+                        counts['created'], counts['duplicate'], counts['invalid'])
+        return make_response(jsonify({
+            'created': counts['created'],
+            'duplicates': counts['duplicate'],
+            'invalid': counts['invalid'],
+            'rows': reports,
+        }), 200)
+
     @app.route('/api/delete-user', methods=['DELETE'])
     def delete_user() -> Response:
         """
@@ -122,6 +269,11 @@ def create_app(config_class=ProductionConfig):
             app.logger.error("Failed to delete user: %s", str(e))
             return make_response(jsonify({'error': str(e)}), 500)
 
+    def session_token() -> Optional[str]:
+        """Returns the token from an `Authorization: Bearer <token>` header, if the request has one."""
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        return (token.strip() or None) if scheme.lower() == 'bearer' else None
+
     @app.route('/api/login', methods=['POST'])
     def login():
         """
@@ -132,7 +284,8 @@ def create_app(config_class=ProductionConfig):
             - password (str): The user's password.
 
         Returns:
-            JSON response indicating the success of the login.
+            JSON response indicating the success of the login, with a session token
+            to send as `Authorization: Bearer <token>` on later requests.
 
         Raises:
             400 error if input validation fails.
@@ -148,19 +301,18 @@ def create_app(config_class=ProductionConfig):
         password = data['password']
 
         try:
-            # Validate user credentials
-            if not Users.check_password(username, password):
+            # Validate user credentials and get the user ID in one query
+            user_id = Users.authenticate(username, password)
+            if user_id is None:
                 app.logger.warning("Login failed for username: %s", username)
                 raise Unauthorized("Invalid username or password.")
 
-            # Get user ID
-            user_id = Users.get_id_by_username(username)
-
             # Load user's combatants into the battle model
             login_user(user_id, user_stock)
+            token = session_store.create(user_id, username)
 
             app.logger.info("User %s logged in successfully.", username)
-            return jsonify({"message": f"User {username} logged in successfully."}), 200
+            return jsonify({"message": f"User {username} logged in successfully.", "token": token}), 200
 
         except Unauthorized as e:
             return jsonify({"error": str(e)}), 401
@@ -174,7 +326,11 @@ def create_app(config_class=ProductionConfig):
         """
         Route to log out a user and save their combatants to MongoDB.
 
-        Expected JSON Input:
+        The user is identified by their session token (`Authorization: Bearer <token>`),
+        without a database lookup; the token is revoked once the logout has succeeded. Requests without a token may
+        still name the user in the body.
+
+        Expected JSON Input (without a session token):
             - username (str): The username of the user.
 
         Returns:
@@ -182,25 +338,37 @@ def create_app(config_class=ProductionConfig):
 
         Raises:
             400 error if input validation fails or user is not found in MongoDB.
+            401 error if the session token is unknown or has expired.
             500 error for any unexpected server-side issues.
         """
-        data = request.get_json()
-        if not data or 'username' not in data:
+        token = session_token()
+        data = request.get_json(silent=True)
+        if not token and (not data or 'username' not in data):
             app.logger.error("Invalid request payload for logout.")
-            raise BadRequest("Invalid request payload. 'username' is required.")
+            raise BadRequest("Invalid request payload. A session token or 'username' is required.")
 
-        username = data['username']
+        username = data['username'] if not token else None
 
         try:
-            # Get user ID
-            user_id = Users.get_id_by_username(username)
+            if token:
+                session = session_store.authenticate(token)
+                if session is None:
+                    raise Unauthorized("Invalid or expired session token.")
+                user_id, username = session
+            else:
+                user_id = Users.get_id_by_username(username)
 
             # Save user's combatants and clear the battle model
             logout_user(user_id, user_stock)
+            if token:
+                # Only once the user's state is saved, so a failed logout can be retried
+                session_store.revoke(token)
 
             app.logger.info("User %s logged out successfully.", username)
             return jsonify({"message": f"User {username} logged out successfully."}), 200
 
+        except Unauthorized as e:
+            return jsonify({"error": str(e)}), 401
         except ValueError as e:
             app.logger.warning("Logout failed for username %s: %s", username, str(e))
             return jsonify({"error": str(e)}), 400
@@ -300,12 +468,59 @@ def create_app(config_class=ProductionConfig):
 
         try:
             #print out the stock symbol and its price
-            price = user_stock.get_stock_price(symbol)
+            quote = user_stock.get_stock_quote(symbol)
             ## print_stock_price(symbol, stock_price)
-            return jsonify({"message": "Success"}), 201
+            return jsonify({
+                "message": "Success",
+                "symbol": symbol,
+                "price": quote.price,
+                "as_of": quote.as_of or None,
+                "age_seconds": quote.age,
+                "stale": quote.stale,
+            }), 201
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 400
+        except ConnectionError as ce:
+            # Upstream unavailable or out of request budget, with no stored price to fall back on
+            return jsonify({"error": str(ce)}), 503
         except Exception as e:
             return jsonify({"error": f"Error adding stock to the database: {str(e)}"}), 500
         
+    @app.route('/api/stock-prices', methods=['POST'])
+    def view_stocks() -> Response:
+        """
+        Fetches and returns the stock prices for a list of stock symbols.
+
+        Symbols that are not cached are fetched from the price API concurrently, so the
+        request takes roughly one upstream round trip regardless of how many symbols
+        are requested.
+
+        Request:
+            - JSON body containing a list of stock symbols (`symbols`).
+
+        Returns:
+            Response:
+                - If successful: A JSON response with per-symbol prices and errors and HTTP status 200.
+                - If validation fails: A JSON response with an error message and HTTP status 400.
+                - If an error occurs while storing the prices: A JSON response with an error message and HTTP status 500.
+        """
+        data = request.get_json()
+        symbols = data.get("symbols") if data else None
+
+        if not isinstance(symbols, list) or not symbols:
+            return jsonify({"error": "A non-empty list of stock symbols is required"}), 400
+        if len(symbols) > MAX_BATCH_SYMBOLS:
+            return jsonify({"error": f"At most {MAX_BATCH_SYMBOLS} symbols may be requested at once"}), 400
+        if not all(isinstance(symbol, str) and symbol.isalnum() for symbol in symbols):
+            return jsonify({"error": "Invalid stock symbol format"}), 400
+
+        app.logger.info('Finding prices for %d stocks', len(symbols))
+        try:
+            prices, errors = user_stock.get_stock_prices(symbols)
+            return jsonify({"prices": prices, "errors": errors}), 200
+        except Exception as e:
+            return jsonify({"error": f"Error updating stock prices: {str(e)}"}), 500
+
     @app.route('/api/add-stock', methods=['POST'])
     def add_stock() -> Response:
         """
@@ -436,6 +651,46 @@ def create_app(config_class=ProductionConfig):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
         
+    @app.route('/api/trades', methods=['POST'])
+    def bulk_trade() -> Response:
+        """
+        Applies many buy and sell orders in one transaction.
+
+        Request:
+            - JSON body containing a list of orders (`orders`), each with `symbol`, `side`
+              ("buy" or "sell") and `quantity`, and an optional `mode`: "atomic" (the default,
+              all orders or none) or "best_effort" (failing orders are skipped).
+
+        Returns:
+            Response:
+                - If the batch was accepted: A JSON response with per-order results and HTTP status 200.
+                - If validation fails: A JSON response with an error message and HTTP status 400.
+                - If an atomic batch was rejected or the holdings changed mid-batch: A JSON
+                  response with per-order results or an error message and HTTP status 409.
+                - If an error occurs while applying the trades: A JSON response with an error message and HTTP status 500.
+        """
+        data = request.get_json()
+        orders = data.get("orders") if data else None
+        mode = data.get("mode", "atomic") if data else "atomic"
+
+        if not isinstance(orders, list) or not orders:
+            return jsonify({"error": "A non-empty list of orders is required"}), 400
+        if len(orders) > MAX_BATCH_TRADES:
+            return jsonify({"error": f"At most {MAX_BATCH_TRADES} orders may be submitted at once"}), 400
+        if mode not in ("atomic", "best_effort"):
+            return jsonify({"error": "Mode must be 'atomic' or 'best_effort'"}), 400
+
+        app.logger.info('Applying %d trades (%s)', len(orders), mode)
+        try:
+            results, committed = user_stock.apply_trades(orders, atomic=mode == "atomic")
+        except ValueError as ve:
+            return jsonify({"error": str(ve)}), 409
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+        status = 409 if mode == "atomic" and not committed and any(r["status"] == "failed" for r in results) else 200
+        return jsonify({"committed": committed, "results": results}), status
+
     @app.route('/api/view-port', methods=['GET'])
     def view_portfolio() -> Response:
         """
@@ -464,6 +719,87 @@ def create_app(config_class=ProductionConfig):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    @app.route('/api/portfolio-value', methods=['GET'])
+    def portfolio_value() -> Response:
+        """
+        Values the user's stock portfolio at the stored prices.
+
+        Returns:
+            Response:
+                - If successful: A JSON response with per-position market values and weights
+                  (as parallel columns), the total value and HTTP status 200.
+                - If an error occurs while valuing the portfolio: A JSON response with an error message and HTTP status 500.
+        """
+        try:
+            valuation = user_stock.get_portfolio_valuation()
+            app.logger.info("Valued %d positions at %f", valuation["position_count"], valuation["total_value"])
+            return jsonify(valuation), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/api/price-history', methods=['GET'])
+    def price_history() -> Response:
+        """
+        Returns the stored daily price history for a stock.
+
+        Request:
+            - JSON body containing the stock symbol (`symbol`) and optionally `start` and
+              `end` dates (YYYY-MM-DD).
+
+        Returns:
+            Response:
+                - If successful: A JSON response with the daily OHLCV bars, oldest first, and HTTP status 200.
+                - If validation fails: A JSON response with an error message and HTTP status 400.
+                - If an error occurs while reading the history: A JSON response with an error message and HTTP status 500.
+        """
+        data = request.get_json()
+        symbol = data.get("symbol") if data else None
+
+        if not symbol or not symbol.isalnum():
+            return jsonify({"error": "Invalid stock symbol format"}), 400
+        try:
+            start = date.fromisoformat(data["start"]) if data.get("start") else None
+            end = date.fromisoformat(data["end"]) if data.get("end") else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+
+        try:
+            history = PriceHistory.get_history(symbol, start, end)
+            return jsonify({"symbol": symbol, "history": history}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route('/api/sync-history', methods=['POST'])
+    def sync_history() -> Response:
+        """
+        Brings the stored daily price history up to date.
+
+        Symbols already synced recently are fetched in compact form and only new days
+        are stored; symbols without history are backfilled with the full series.
+
+        Request:
+            - Optional JSON body containing a list of stock symbols (`symbols`). Defaults
+              to every held stock.
+
+        Returns:
+            Response:
+                - If successful: A JSON response with a per-symbol sync report and errors and HTTP status 200.
+                - If validation fails: A JSON response with an error message and HTTP status 400.
+                - If an error occurs while storing the history: A JSON response with an error message and HTTP status 500.
+        """
+        data = request.get_json(silent=True) or {}
+        symbols = data.get("symbols")
+
+        if symbols is not None and (not isinstance(symbols, list) or
+                                    not all(isinstance(symbol, str) and symbol.isalnum() for symbol in symbols)):
+            return jsonify({"error": "Invalid stock symbol format"}), 400
+
+        try:
+            reports, errors = user_stock.sync_price_history(symbols if symbols is not None else user_stock.get_held_symbols())
+            return jsonify({"synced": reports, "errors": errors}), 200
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
     @app.route('/api/init-db', methods=['POST'])
     def init_db():
         """
@@ -485,6 +821,7 @@ def create_app(config_class=ProductionConfig):
                 db.drop_all()  # Drop all existing tables
                 app.logger.info("Creating all tables from models.")
                 db.create_all()  # Recreate all tables
+            UserStocks.invalidate_stock_cache()
             app.logger.info("Database initialized successfully.")
             return jsonify({"status": "success", "message": "Database initialized successfully."}), 200
         except Exception as e:
@@ -492,10 +829,101 @@ def create_app(config_class=ProductionConfig):
             return jsonify({"status": "error", "message": "Failed to initialize database."}), 500
 
     
+    ##########################################################
+    #
+    # CLI
+    #
+    ##########################################################
+
+    @app.cli.command('sync-history')
+    @click.argument('symbols', nargs=-1)
+    def sync_history_command(symbols):
+        """Sync stored daily price history for SYMBOLS (default: every held stock)."""
+        reports, errors = user_stock.sync_price_history(list(symbols) or user_stock.get_held_symbols())
+        for symbol, report in sorted(reports.items()):
+            click.echo(f"{symbol}: {report['new_rows']} new rows ({report['mode']})")
+        for symbol, error in sorted(errors.items()):
+            click.echo(f"{symbol}: {error}", err=True)
+
+    @app.cli.command('warm-cache')
+    @click.option('--chunk-size', default=WARMUP_CHUNK_SIZE, show_default=True, help='Rows per batch.')
+    @click.option('--rate', default=WARMUP_MAX_ROWS_PER_SECOND, show_default=True,
+                  help='Maximum rows written per second (0 for no limit).')
+    def warm_cache_command(chunk_size, rate):
+        """Fill the Redis stock cache from the stocks table."""
+        report = user_stock.warm_stock_cache(chunk_size=chunk_size, max_rows_per_second=rate)
+        click.echo(f"Warmed {report['rows']} stocks in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+
+    @app.cli.command('migrate-cache')
+    def migrate_cache_command():
+        """Convert stock and quote cache entries from the old hash format to binary records."""
+        counts = migrate_legacy_records(redis_client)
+        click.echo(f"Migrated {counts['stocks']} stock and {counts['quotes']} quote records "
+                   f"({counts['dropped']} unreadable entries dropped)")
+
+    @app.cli.command('reconcile-cache')
+    @click.option('--batch-size', default=RECONCILE_BATCH, show_default=True, help='Rows per step.')
+    def reconcile_cache_command(batch_size):
+        """Compare the Redis stock cache with the stocks table once and repair any drift."""
+        drift = CacheReconciler(app, batch_size=batch_size).run_pass()
+        click.echo(f"Repaired {drift['missing']} missing, {drift['stale']} stale and {drift['orphaned']} orphaned "
+                   f"records and {drift['index']} index entries")
+
+    @app.cli.command('provision-users')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+                  help='File format (default: from the file extension).')
+    @click.option('--chunk-size', default=PROVISION_CHUNK_SIZE, show_default=True, help='Users per batch.')
+    def provision_users_command(path, fmt, chunk_size):
+        """Create the users listed in a CSV or NDJSON file, reporting rows that were not created."""
+        fmt = fmt or user_file_format(path)
+        if fmt is None:
+            raise click.UsageError("Cannot tell the file format from its name; pass --format.")
+        counts = Counter()
+        with open(path, encoding='utf-8', newline='') as lines:
+            for report in Users.bulk_create_users(read_user_rows(lines, fmt), chunk_size=chunk_size):
+                counts[report['status']] += 1
+                if report['status'] != 'created':
+                    click.echo(f"line {report['line']}: {report['username']}: {report['error']}", err=True)
+        click.echo(f"Created {counts['created']} users ({counts['duplicate']} duplicates, {counts['invalid']} invalid)")
+
+    @app.cli.command('benchmark-logins')
+    @click.option('--logins', default=200, show_default=True, help='Password verifications per run.')
+    @click.option('--concurrency', default=16, show_default=True, help='Concurrent login callers.')
+    @click.option('--workers', '-w', multiple=True, type=int,
+                  help='Hashing processes to try (repeatable; 0 hashes inline). Default: the configured count.')
+    def benchmark_logins_command(logins, concurrency, workers):
+        """Measure login throughput and latency with the configured KDF cost, per hashing pool size."""
+        for count in workers or (password_hasher.workers,):
+            hasher = PasswordHasher(password_hasher.kdf, password_hasher.params, workers=count)
+            try:
+                result = benchmark_logins(hasher, logins, concurrency)
+            finally:
+                hasher.shutdown()
+            click.echo(f"{hasher.kdf} {hasher.params} workers={count}: {result['logins_per_second']} logins/s, "
+                       f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, max {result['max_ms']}ms")
+
     return app
 
 
-    
+def warm_cache(app: Flask) -> None:
+    """
+    Fills the Redis stock cache for an app, logging instead of raising on failure.
+
+    When several workers start together only the first one to take the warm-up lock
+    does the work.
+
+    Args:
+        app (Flask): The application whose database is read.
+    """
+    with app.app_context():
+        try:
+            if not redis_client.set(WARMUP_LOCK_KEY, 1, nx=True, ex=WARMUP_LOCK_TTL):
+                app.logger.info("Cache warm-up already running in another worker")
+                return
+            UserStocks.warm_stock_cache()
+        except Exception as e:
+            app.logger.error("Cache warm-up failed: %s", str(e))
 
 
 if __name__ == '__main__':
@@ -7,9 +7,21 @@ class ProductionConfig():
                                            # But we are doing unnecessarily complicated Redis
                                            # write-throughs
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', "DATABASE_URL=sqlite:////app/db/app.db")  # Production database URI from environment
+    PRICE_REFRESHER_ENABLED = os.getenv('PRICE_REFRESHER_ENABLED', 'false').lower() == 'true'  # Background price refresh
+    STOCK_CACHE_READS = os.getenv('STOCK_CACHE_READS', 'true').lower() == 'true'  # Serve portfolio reads from Redis
+    LOCAL_CACHE_ENABLED = os.getenv('LOCAL_CACHE_ENABLED', 'true').lower() == 'true'  # In-process cache in front of Redis
+    CACHE_WARMUP_ON_START = os.getenv('CACHE_WARMUP_ON_START', 'true').lower() == 'true'  # Fill Redis from SQL at startup
+    CACHE_RECONCILER_ENABLED = os.getenv('CACHE_RECONCILER_ENABLED', 'false').lower() == 'true'  # Background cache/DB repair
+    USER_CACHE_ENABLED = os.getenv('USER_CACHE_ENABLED', 'true').lower() == 'true'  # In-process user lookup cache
 
 class TestConfig():
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use in-memory database for tests
+    PRICE_REFRESHER_ENABLED = False
+    STOCK_CACHE_READS = False
+    LOCAL_CACHE_ENABLED = False
+    CACHE_WARMUP_ON_START = False
+    CACHE_RECONCILER_ENABLED = False
+    USER_CACHE_ENABLED = False
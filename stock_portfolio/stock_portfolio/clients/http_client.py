@@ -0,0 +1,140 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.metrics import LatencyStats
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 10))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))  # Keep-alive connections per host
+HTTP_MAX_HOSTS = int(os.environ.get('HTTP_MAX_HOSTS', 10))  # Hosts whose pools are kept open
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.2))  # Seconds; doubled per attempt
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class HttpClient:
+    """
+    A shared outbound HTTP client with keep-alive connection pools.
+
+    A single `requests.Session` keeps one urllib3 pool per host, so repeated calls to
+    the same upstream reuse TCP/TLS connections. Every request gets a connect and a
+    read timeout, idempotent requests are retried with jittered exponential backoff
+    on connection errors, timeouts and retryable statuses, and latency is recorded
+    per host. Callers of a quota-limited upstream pass `max_retries=0`, so one
+    request budget token is never spent on several calls.
+    """
+
+    def __init__(self,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT,
+                 pool_size: int = HTTP_POOL_SIZE,
+                 max_retries: int = HTTP_MAX_RETRIES,
+                 backoff_base: float = HTTP_BACKOFF_BASE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_MAX_HOSTS, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._host_stats: dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+
+    def host_stats(self, host: str) -> LatencyStats:
+        """
+        Returns the latency stats for a host, creating them on first use.
+
+        Args:
+            host (str): The host name (with port, if any).
+
+        Returns:
+            LatencyStats: The stats for that host.
+        """
+        with self._lock:
+            stats = self._host_stats.get(host)
+            if stats is None:
+                stats = self._host_stats[host] = LatencyStats()
+            return stats
+
+    def request(self, method: str, url: str, timeout=None, max_retries: Optional[int] = None,
+                **kwargs) -> requests.Response:
+        """
+        Sends a request through the pooled session.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL to request.
+            timeout (float | tuple, optional): Overrides the default (connect, read) timeout.
+            max_retries (int, optional): Overrides the number of retries for idempotent requests.
+            **kwargs: Passed through to `requests.Session.request`.
+
+        Returns:
+            requests.Response: The response. Retryable statuses are returned as-is once
+                               the retries are exhausted.
+
+        Raises:
+            requests.RequestException: If the request still fails after all retries.
+        """
+        method = method.upper()
+        stats = self.host_stats(urlsplit(url).netloc)
+        retries = self.max_retries if max_retries is None else max_retries
+        attempts = 1 + (retries if method in IDEMPOTENT_METHODS else 0)
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                stats.record((time.perf_counter() - start) * 1000, error=True)
+                if last_attempt:
+                    raise
+                logger.warning("%s %s failed (%s), retrying", method, url, type(e).__name__)
+            else:
+                retryable = response.status_code in RETRY_STATUSES
+                stats.record((time.perf_counter() - start) * 1000, error=retryable or response.status_code >= 500)
+                if not retryable or last_attempt:
+                    return response
+                logger.warning("%s %s returned %d, retrying", method, url, response.status_code)
+                response.close()
+            self._sleep_backoff(attempt)
+
+    def get(self, url: str, timeout=None, max_retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Sends a GET request. See `request`.
+        """
+        return self.request('GET', url, timeout=timeout, max_retries=max_retries, **kwargs)
+
+    def _sleep_backoff(self, attempt: int) -> None:
+        # Full jitter keeps workers that failed together from retrying together
+        time.sleep(random.uniform(0, self.backoff_base * (2 ** attempt)))
+
+    def stats(self) -> dict:
+        """
+        Returns latency stats for every host contacted so far.
+
+        Returns:
+            dict: A mapping of host to its latency snapshot.
+        """
+        with self._lock:
+            hosts = dict(self._host_stats)
+        return {host: stats.snapshot() for host, stats in hosts.items()}
+
+
+http_client = HttpClient()
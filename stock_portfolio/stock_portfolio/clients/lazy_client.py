@@ -0,0 +1,74 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+class LazyClient:
+    """
+    A stand-in for a network client that creates the real one on first use, once per process.
+
+    Importing a module that holds a LazyClient does no I/O; the factory runs the first
+    time an attribute (or item) is looked up, and every lookup after that is forwarded
+    to the same instance. A process forked after that (a pre-fork server worker, a
+    multiprocessing child) drops the inherited instance and builds its own, so
+    sockets and client background threads are never shared across processes.
+
+    The stand-in is used exactly like the client it wraps, and tests can still patch
+    the module attribute that holds it.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str):
+        self._factory = factory
+        self._name = name
+        self._client: Optional[Any] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def _instance(self) -> Any:
+        """
+        Returns this process's client, creating it on first use.
+
+        Returns:
+            Any: The client built by the factory.
+        """
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                logger.info("Creating %s client for process %d", self._name, os.getpid())
+                self._client = self._factory()
+                self._pid = os.getpid()
+            return self._client
+
+    def reset(self) -> None:
+        """
+        Forgets the current client, so the next use creates a new one.
+
+        The old client is not closed: after a fork its sockets still belong to the parent.
+        """
+        self._client = None
+        self._pid = 0
+        self._lock = threading.Lock()  # A lock held by another thread at fork time would never be released
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for names the stand-in does not have itself; its own state missing
+        # (e.g. while being copied) must not recurse into _instance()
+        if name in ("_factory", "_name", "_client", "_pid", "_lock"):
+            raise AttributeError(name)
+        return getattr(self._instance(), name)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self._instance()[key]
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name} ({'connected' if self._client is not None else 'not created'})>"
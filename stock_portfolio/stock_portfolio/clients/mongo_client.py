@@ -3,6 +3,7 @@ import os
 
 from pymongo import MongoClient
 
+from stock_portfolio.clients.lazy_client import LazyClient
 from stock_portfolio.utils.logger import configure_logger
 
 
@@ -12,8 +13,33 @@ configure_logger(logger)
 
 MONGO_HOST = os.environ.get('MONGO_HOST', 'localhost')
 MONGO_PORT = int(os.environ.get('MONGO_PORT', 27017))
+MONGO_DB = os.environ.get('MONGO_DB', 'stock_portfolio')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))  # Connections per server per process
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 2000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 5000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
 
-logger.info("Connecting to MongoDB at %s:%d", MONGO_HOST, MONGO_PORT)
-mongo_client = MongoClient(host=MONGO_HOST, port=MONGO_PORT)
-db = mongo_client['stock_portfolio']
-sessions_collection = db['sessions']
\ No newline at end of file
+
+def create_mongo_client() -> MongoClient:
+    """
+    Creates a MongoDB client. It connects, and starts its monitor threads, on the first operation.
+
+    Returns:
+        MongoClient: The client.
+    """
+    logger.info("Connecting to MongoDB at %s:%d", MONGO_HOST, MONGO_PORT)
+    return MongoClient(
+        host=MONGO_HOST,
+        port=MONGO_PORT,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connect=False,
+    )
+
+
+# Created on first use in each process; see LazyClient
+mongo_client = LazyClient(create_mongo_client, "MongoDB")
+db = LazyClient(lambda: mongo_client._instance()[MONGO_DB], "MongoDB database")
+sessions_collection = LazyClient(lambda: db._instance()['sessions'], "MongoDB sessions collection")
@@ -0,0 +1,483 @@
+import codecs
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+import json
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from dotenv import load_dotenv
+import requests
+
+from stock_portfolio.clients.http_client import http_client
+from stock_portfolio.utils.circuit_breaker import CircuitBreaker
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.metrics import LatencyStats
+from stock_portfolio.utils.upstream_scheduler import (
+    ALPHA_VANTAGE_PER_DAY,
+    ALPHA_VANTAGE_PER_MINUTE,
+    PRIORITY_INTERACTIVE,
+    UpstreamScheduler,
+    UpstreamThrottledError,
+    alpha_vantage_scheduler,
+)
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+load_dotenv()
+QUOTE_PROVIDER = os.getenv("QUOTE_PROVIDER", "alphavantage")  # Primary provider name
+QUOTE_HEDGE_PROVIDER = os.getenv("QUOTE_HEDGE_PROVIDER", "")  # Secondary provider name; empty disables hedging
+QUOTE_FILE_DIR = os.getenv("QUOTE_FILE_DIR", "quotes")  # Directory read by the "file" provider
+ALPHA_VANTAGE_URL = os.getenv("ALPHA_VANTAGE_URL", "https://www.alphavantage.co/query")
+ALPHA_VANTAGE_HEDGE_URL = os.getenv("ALPHA_VANTAGE_HEDGE_URL", ALPHA_VANTAGE_URL)
+ALPHA_VANTAGE_HEDGE_API_KEY = os.getenv("ALPHA_VANTAGE_HEDGE_API_KEY", os.getenv("API_KEY"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 20))  # Primary latencies needed before trusting its p95
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", 1.0))  # Seconds to wait before hedging until then
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", 8))
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes read from a streamed response at a time
+
+DailySeries = dict[str, dict[str, str]]
+DailyBar = tuple[str, dict[str, str]]
+_SERIES_KEY = '"Time Series (Daily)"'
+
+
+def parse_time_series_daily(symbol: str, payload: dict) -> DailySeries:
+    """
+    Extracts the daily bars from an Alpha Vantage TIME_SERIES_DAILY response.
+
+    Args:
+        symbol (str): The stock symbol the response is for.
+        payload (dict): The decoded JSON response.
+
+    Returns:
+        dict: The daily bars keyed by trading date (YYYY-MM-DD).
+
+    Raises:
+        UpstreamThrottledError: If the response is a rate-limit notice.
+        LookupError: If the response reports that the symbol does not exist.
+        ValueError: If the response format is invalid.
+    """
+    # Alpha Vantage reports rate limiting as a 200 with a "Note" or "Information" message
+    notice = payload.get("Note") or payload.get("Information")
+    if notice:
+        raise UpstreamThrottledError(f"Price API rate limit reached: {notice}")
+
+    if "Error Message" in payload:
+        raise LookupError(payload["Error Message"])
+
+    daily_data = payload.get("Time Series (Daily)")
+    if not daily_data:
+        raise ValueError(f"Invalid API response format for symbol '{symbol}'. Response: {payload}")
+    return daily_data
+
+
+class _JsonStream:
+    """A window over a JSON document arriving in chunks, from which single values are decoded."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+
+    def more(self) -> bool:
+        """Appends the next chunk, dropping what has been consumed. Returns False at the end of the document."""
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        return False
+
+    def peek(self) -> Optional[str]:
+        """Skips whitespace and returns the next character, or None at the end of the document."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return None
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Malformed daily series: expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decodes the JSON value at the current position."""
+        self.peek()
+        while True:
+            try:
+                value, self.pos = self._decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise ValueError("Malformed daily series: the response ended mid-value")
+
+
+def stream_time_series_daily(symbol: str, chunks: Iterable[bytes]) -> Iterator[DailyBar]:
+    """
+    Parses a TIME_SERIES_DAILY response incrementally, yielding one bar at a time.
+
+    Only the current bar is held in memory, so a full-history response never becomes
+    a dict of decades of bars, and a consumer that stops early (after the newest bar,
+    or at a high-water mark) stops reading the response. Bars are yielded in document
+    order, which for Alpha Vantage is newest first.
+
+    Args:
+        symbol (str): The stock symbol the response is for.
+        chunks (Iterable[bytes]): The response body, in chunks.
+
+    Yields:
+        tuple: The trading date (YYYY-MM-DD) and its bar.
+
+    Raises:
+        UpstreamThrottledError: If the response is a rate-limit notice.
+        LookupError: If the response reports that the symbol does not exist.
+        ValueError: If the response format is invalid.
+    """
+    stream = _JsonStream(chunks)
+    while True:
+        index = stream.buffer.find(_SERIES_KEY)
+        if index >= 0:
+            stream.pos = index + len(_SERIES_KEY)
+            break
+        if not stream.more():
+            # No series at all: a notice or error, small enough to parse whole
+            try:
+                payload = json.loads(stream.buffer) if stream.buffer.strip() else {}
+            except json.JSONDecodeError:
+                payload = {}
+            parse_time_series_daily(symbol, payload if isinstance(payload, dict) else {})
+            raise ValueError(f"Invalid API response format for symbol '{symbol}'.")
+
+    stream.expect(":")
+    stream.expect("{")
+    if stream.peek() == "}":
+        raise ValueError(f"Invalid API response format for symbol '{symbol}'. Response: empty series")
+    while True:
+        day = stream.value()
+        stream.expect(":")
+        bar = stream.value()
+        if not isinstance(day, str) or not isinstance(bar, dict):
+            raise ValueError(f"Malformed daily series for symbol '{symbol}'.")
+        yield day, bar
+        separator = stream.peek()
+        if separator == "}":
+            return
+        stream.expect(",")
+
+
+class QuoteProvider:
+    """
+    A source of daily OHLCV bars.
+
+    Implementations return bars in the Alpha Vantage shape (keyed by YYYY-MM-DD, with
+    "1. open" through "5. volume" fields) and signal failures with the same
+    exceptions, so callers do not care which provider answered. Providers implement
+    `fetch_daily`, `stream_daily` or both.
+    """
+
+    name = "provider"
+
+    def stream_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                     outputsize: str = "compact") -> Iterator[DailyBar]:
+        """
+        Fetches the daily series for a symbol one bar at a time, newest first.
+
+        Closing the iterator early releases the underlying response. The same
+        exceptions as `fetch_daily` are raised, when the iteration starts.
+
+        Args:
+            symbol (str): The stock symbol.
+            priority (int): The scheduling priority of the call, for providers with a request budget.
+            outputsize (str): "compact" for the latest 100 bars or "full" for the whole history.
+
+        Yields:
+            tuple: The trading date (YYYY-MM-DD) and its bar.
+        """
+        yield from sorted(self.fetch_daily(symbol, priority, outputsize).items(), reverse=True)
+
+    def fetch_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                    outputsize: str = "compact") -> DailySeries:
+        """
+        Fetches the daily series for a symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+            priority (int): The scheduling priority of the call, for providers with a request budget.
+            outputsize (str): "compact" for the latest 100 bars or "full" for the whole history.
+
+        Returns:
+            dict: The daily bars keyed by trading date (YYYY-MM-DD).
+
+        Raises:
+            ConnectionError: If the provider could not be reached.
+            LookupError: If the provider reports that the symbol does not exist.
+            ValueError: If the provider's response is invalid.
+        """
+        return dict(self.stream_daily(symbol, priority, outputsize))
+
+    def stats(self) -> dict:
+        """
+        Returns provider-specific counters.
+
+        Returns:
+            dict: At least the provider name.
+        """
+        return {"name": self.name}
+
+
+class AlphaVantageProvider(QuoteProvider):
+    """
+    Fetches daily bars from the Alpha Vantage TIME_SERIES_DAILY endpoint.
+
+    Calls are scheduled against a shared request budget and guarded by a circuit
+    breaker that trips on transport and HTTP errors. Each call spends exactly one
+    budget token: it is never retried by the HTTP client, and an HTTP 429 drains the
+    budget like a rate-limit notice instead of being retried.
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: str = ALPHA_VANTAGE_URL,
+                 scheduler: UpstreamScheduler = alpha_vantage_scheduler, name: str = "alphavantage"):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+        self.scheduler = scheduler
+        self.breaker = CircuitBreaker(name, failure_types=(requests.RequestException,))
+
+    def stream_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                     outputsize: str = "compact") -> Iterator[DailyBar]:
+        """
+        Streams the daily series for a symbol from the response body. See `QuoteProvider.stream_daily`.
+
+        Raises:
+            CircuitOpenError: If recent calls kept failing and the API is not being called.
+            QuotaExceededError: If the request budget did not allow the call in time.
+            UpstreamThrottledError: If the API answered with a rate-limit notice.
+        """
+        params = {"function": "TIME_SERIES_DAILY", "symbol": symbol, "outputsize": outputsize, "apikey": self.api_key}
+
+        def request() -> requests.Response:
+            response = http_client.get(self.base_url, params=params, stream=True, max_retries=0)
+            if response.status_code == 429:
+                response.close()
+                self.scheduler.report_throttled()
+                raise UpstreamThrottledError("Price API rate limit reached: HTTP 429")
+            try:
+                response.raise_for_status()  # Raise an exception for HTTP errors
+            except requests.RequestException:
+                response.close()
+                raise
+            return response
+
+        # Only transport and HTTP errors count against the breaker; an exhausted budget says nothing about the API
+        try:
+            with self.breaker.guard():
+                response = self.scheduler.run(request, priority=priority)
+        except requests.RequestException as e:
+            raise ConnectionError(f"Error fetching data from API: {str(e)}")
+
+        try:
+            yield from stream_time_series_daily(symbol, response.iter_content(STREAM_CHUNK_SIZE))
+        except UpstreamThrottledError:
+            self.scheduler.report_throttled()
+            raise
+        except requests.RequestException as e:
+            raise ConnectionError(f"Error reading data from API: {str(e)}")
+        finally:
+            response.close()
+
+    def stats(self) -> dict:
+        return {"name": self.name, "breaker": self.breaker.stats()}
+
+
+class FileQuoteProvider(QuoteProvider):
+    """
+    Serves daily bars from `{directory}/{SYMBOL}.json` files, for offline development and tests.
+
+    Each file holds a saved TIME_SERIES_DAILY response. A symbol without a file is
+    reported as unknown. `latency` adds an artificial delay to every call, which makes
+    the hedging behaviour observable without a network.
+    """
+
+    def __init__(self, directory: str = QUOTE_FILE_DIR, latency: float = 0.0, name: str = "file"):
+        self.name = name
+        self.directory = directory
+        self.latency = latency
+
+    def fetch_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                    outputsize: str = "compact") -> DailySeries:
+        """
+        Reads the daily series for a symbol. See `QuoteProvider.fetch_daily`.
+
+        A "compact" request returns only the latest 100 bars, as the API would.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        path = os.path.join(self.directory, f"{symbol.upper()}.json")
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            raise LookupError(f"No quote file for symbol '{symbol}'.")
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Unreadable quote file for symbol '{symbol}': {str(e)}")
+
+        daily_data = parse_time_series_daily(symbol, payload)
+        if outputsize == "compact":
+            daily_data = {day: daily_data[day] for day in sorted(daily_data, reverse=True)[:100]}
+        return daily_data
+
+
+class HedgedQuoteProvider(QuoteProvider):
+    """
+    Sends each request to a primary provider and, if it has not answered in time, to a secondary too.
+
+    The hedge delay is the primary's observed p95 latency (HEDGE_DEFAULT_DELAY until
+    HEDGE_MIN_SAMPLES successful calls have been seen), so roughly one request in
+    twenty is duplicated. A primary that fails early is hedged straight away. The first
+    successful answer wins; if both fail, the primary's error is raised. The losing
+    request is left to finish in the background.
+
+    Attributes:
+        latency (LatencyStats): Latency of the primary's successful calls.
+        hedged (int): Number of requests that were also sent to the secondary.
+        primary_wins (int): Number of requests answered by the primary.
+        secondary_wins (int): Number of requests answered by the secondary.
+    """
+
+    def __init__(self, primary: QuoteProvider, secondary: QuoteProvider, min_samples: int = HEDGE_MIN_SAMPLES,
+                 default_delay: float = HEDGE_DEFAULT_DELAY, workers: int = HEDGE_WORKERS):
+        self.name = f"{primary.name}+{secondary.name}"
+        self.primary = primary
+        self.secondary = secondary
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.latency = LatencyStats()
+        self.hedged = 0
+        self.primary_wins = 0
+        self.secondary_wins = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quote-hedge")
+        self._lock = threading.Lock()
+
+    def hedge_delay(self) -> float:
+        """
+        Returns how long to wait for the primary before hedging.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if self.latency.count < self.min_samples:
+            return self.default_delay
+        return self.latency.percentile(95) / 1000
+
+    def _call_primary(self, symbol: str, priority: int, outputsize: str) -> DailySeries:
+        start = time.perf_counter()
+        result = self.primary.fetch_daily(symbol, priority=priority, outputsize=outputsize)
+        # Recorded even when the secondary won, so the p95 is not biased towards fast calls
+        self.latency.record((time.perf_counter() - start) * 1000)
+        return result
+
+    def fetch_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                    outputsize: str = "compact") -> DailySeries:
+        """
+        Fetches the daily series for a symbol from whichever provider answers first. See `QuoteProvider.fetch_daily`.
+        """
+        primary = self._pool.submit(self._call_primary, symbol, priority, outputsize)
+        wait([primary], timeout=self.hedge_delay())
+        if primary.done() and primary.exception() is None:
+            with self._lock:
+                self.primary_wins += 1
+            return primary.result()
+
+        logger.info("Hedging %s request to %s after %s", symbol, self.secondary.name,
+                    "a failure" if primary.done() else "a slow response")
+        secondary = self._pool.submit(self.secondary.fetch_daily, symbol, priority=priority, outputsize=outputsize)
+        with self._lock:
+            self.hedged += 1
+        for future in as_completed([primary, secondary]):
+            if future.exception() is None:
+                with self._lock:
+                    if future is primary:
+                        self.primary_wins += 1
+                    else:
+                        self.secondary_wins += 1
+                return future.result()
+        raise primary.exception()
+
+    def stream_daily(self, symbol: str, priority: int = PRIORITY_INTERACTIVE,
+                     outputsize: str = "compact") -> Iterator[DailyBar]:
+        """
+        Streams the daily series for a symbol. See `QuoteProvider.stream_daily`.
+
+        Full-history requests are background backfills where tail latency does not
+        matter, so they stream from the primary alone instead of being buffered for hedging.
+        """
+        if outputsize == "full":
+            return self.primary.stream_daily(symbol, priority=priority, outputsize=outputsize)
+        return super().stream_daily(symbol, priority=priority, outputsize=outputsize)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {"hedged": self.hedged, "primary_wins": self.primary_wins,
+                        "secondary_wins": self.secondary_wins}
+        return {
+            "name": self.name,
+            "hedge_delay_ms": self.hedge_delay() * 1000,
+            **counters,
+            "primary": self.primary.stats(),
+            "secondary": self.secondary.stats(),
+        }
+
+
+def create_provider(name: str) -> QuoteProvider:
+    """
+    Creates a quote provider by name.
+
+    Args:
+        name (str): "alphavantage", "alphavantage-hedge" (a second endpoint or API key; with
+                    its own request budget only if the key differs from the primary's,
+                    since the quota belongs to the key) or "file".
+
+    Returns:
+        QuoteProvider: The provider.
+
+    Raises:
+        ValueError: If the name is not a known provider.
+    """
+    if name == "alphavantage":
+        return AlphaVantageProvider(os.getenv("API_KEY"), ALPHA_VANTAGE_URL)
+    if name == "alphavantage-hedge":
+        if ALPHA_VANTAGE_HEDGE_API_KEY == os.getenv("API_KEY"):
+            scheduler = alpha_vantage_scheduler  # Same key, same quota
+        else:
+            scheduler = UpstreamScheduler(name, ALPHA_VANTAGE_PER_MINUTE, ALPHA_VANTAGE_PER_DAY)
+        return AlphaVantageProvider(ALPHA_VANTAGE_HEDGE_API_KEY, ALPHA_VANTAGE_HEDGE_URL, scheduler, name=name)
+    if name == "file":
+        return FileQuoteProvider(QUOTE_FILE_DIR)
+    raise ValueError(f"Unknown quote provider '{name}'.")
+
+
+def build_quote_provider(primary: str = QUOTE_PROVIDER, secondary: str = QUOTE_HEDGE_PROVIDER) -> QuoteProvider:
+    """
+    Creates the configured provider, hedged with a secondary if one is configured.
+
+    Args:
+        primary (str): The primary provider name.
+        secondary (str): The secondary provider name, or "" for no hedging.
+
+    Returns:
+        QuoteProvider: The provider to fetch quotes from.
+    """
+    provider = create_provider(primary)
+    if secondary:
+        provider = HedgedQuoteProvider(provider, create_provider(secondary))
+    logger.info("Using quote provider %s", provider.name)
+    return provider
@@ -3,6 +3,7 @@ import os
 
 import redis
 
+from stock_portfolio.clients.lazy_client import LazyClient
 from stock_portfolio.utils.logger import configure_logger
 
 
@@ -13,6 +14,30 @@ configure_logger(logger)
 REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
 REDIS_PORT = os.environ.get('REDIS_PORT', 6379)
 REDIS_DB = os.environ.get('REDIS_DB', 0)
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))  # Connection pool size per process
+REDIS_CONNECT_TIMEOUT = float(os.environ.get('REDIS_CONNECT_TIMEOUT', 2))  # Seconds
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', 5))  # Seconds per command
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', 30))  # Seconds idle before a PING
 
-logger.info("Connecting to Redis at %s:%s", REDIS_HOST, REDIS_PORT)
-redis_client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
\ No newline at end of file
+
+def create_redis_client() -> redis.StrictRedis:
+    """
+    Creates a Redis client with its own connection pool. Connections are opened on first command.
+
+    Returns:
+        redis.StrictRedis: The client.
+    """
+    logger.info("Connecting to Redis at %s:%s", REDIS_HOST, REDIS_PORT)
+    return redis.StrictRedis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+    )
+
+
+# Created on first use in each process; see LazyClient
+redis_client = LazyClient(create_redis_client, "Redis")
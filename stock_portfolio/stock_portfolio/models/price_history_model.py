@@ -0,0 +1,142 @@
+from datetime import date
+import logging
+from typing import Any, Iterable, Iterator, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from stock_portfolio.db import db
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+HISTORY_INSERT_CHUNK = 500  # Rows per executemany batch
+
+
+class PriceHistory(db.Model):
+    __tablename__ = 'price_history'
+
+    symbol = db.Column(db.String(80), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    open = db.Column(db.Float, nullable=False)
+    high = db.Column(db.Float, nullable=False)
+    low = db.Column(db.Float, nullable=False)
+    close = db.Column(db.Float, nullable=False)
+    volume = db.Column(db.BigInteger, nullable=False, default=0)
+
+    # Covers `get_history`'s range scan (every OHLCV column, in date order) without touching the table
+    __table_args__ = (
+        db.Index('ix_price_history_symbol_date_ohlcv', 'symbol', 'date', 'open', 'high', 'low', 'close', 'volume'),
+    )
+
+    @classmethod
+    def rows_from_daily_series(cls, symbol: str, daily_data: dict[str, dict[str, str]]) -> List[dict[str, Any]]:
+        """
+        Converts an Alpha Vantage `Time Series (Daily)` mapping into table rows.
+
+        Args:
+            symbol (str): The stock symbol the series belongs to.
+            daily_data (dict): Bars keyed by YYYY-MM-DD, as returned by the API.
+
+        Returns:
+            List[dict]: One row per trading day.
+        """
+        return list(cls.rows_from_bars(symbol, daily_data.items()))
+
+    @staticmethod
+    def rows_from_bars(symbol: str, bars: Iterable[tuple[str, dict[str, str]]]) -> Iterator[dict[str, Any]]:
+        """
+        Converts streamed daily bars into table rows one at a time.
+
+        Args:
+            symbol (str): The stock symbol the bars belong to.
+            bars (Iterable[tuple]): (YYYY-MM-DD, bar) pairs, as streamed from a quote provider.
+
+        Yields:
+            dict: One row per trading day.
+        """
+        for day, bar in bars:
+            yield {
+                "symbol": symbol,
+                "date": date.fromisoformat(day),
+                "open": float(bar["1. open"]),
+                "high": float(bar["2. high"]),
+                "low": float(bar["3. low"]),
+                "close": float(bar["4. close"]),
+                "volume": int(bar.get("5. volume", 0)),
+            }
+
+    @classmethod
+    def bulk_upsert(cls, rows: Iterable[dict[str, Any]]) -> int:
+        """
+        Inserts or updates history rows in chunked `executemany` batches.
+
+        The caller owns the transaction; nothing is committed here.
+
+        Args:
+            rows (Iterable[dict]): Rows with symbol, date, open, high, low, close and volume.
+
+        Returns:
+            int: The number of rows written.
+        """
+        stmt = sqlite_insert(cls.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.symbol, cls.date],
+            set_={column: stmt.excluded[column] for column in ("open", "high", "low", "close", "volume")},
+        )
+        written = 0
+        chunk: List[dict[str, Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= HISTORY_INSERT_CHUNK:
+                db.session.execute(stmt, chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            db.session.execute(stmt, chunk)
+            written += len(chunk)
+        return written
+
+    @classmethod
+    def get_high_water_marks(cls, symbols: List[str]) -> dict[str, date]:
+        """
+        Returns the newest stored date for each symbol.
+
+        Args:
+            symbols (List[str]): The stock symbols.
+
+        Returns:
+            dict: The newest stored date per symbol; symbols with no history are omitted.
+        """
+        if not symbols:
+            return {}
+        query = select(cls.symbol, func.max(cls.date)).where(cls.symbol.in_(symbols)).group_by(cls.symbol)
+        return {symbol: newest for symbol, newest in db.session.execute(query)}
+
+    @classmethod
+    def get_history(cls, symbol: str, start: Optional[date] = None, end: Optional[date] = None) -> List[dict[str, Any]]:
+        """
+        Returns the stored daily bars for a symbol, oldest first.
+
+        Args:
+            symbol (str): The stock symbol.
+            start (date, optional): First date to include.
+            end (date, optional): Last date to include.
+
+        Returns:
+            List[dict]: The bars in the range.
+        """
+        query = select(cls.date, cls.open, cls.high, cls.low, cls.close, cls.volume).where(cls.symbol == symbol)
+        if start:
+            query = query.where(cls.date >= start)
+        if end:
+            query = query.where(cls.date <= end)
+        rows = db.session.execute(query.order_by(cls.date)).all()
+        return [
+            {"date": row.date.isoformat(), "open": row.open, "high": row.high, "low": row.low,
+             "close": row.close, "volume": row.volume}
+            for row in rows
+        ]
@@ -1,29 +1,52 @@
-import hashlib
+from dataclasses import dataclass
 import logging
 import os
+from typing import Iterable, Iterator, Optional
 
+from sqlalchemy import event, insert, inspect, select
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
 
 from stock_portfolio.db import db
+from stock_portfolio.utils.local_cache import LocalCache, publish_invalidation
 from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.password_hasher import password_hasher
+from stock_portfolio.utils.user_import import PROVISION_CHUNK_SIZE
 
 
 logger = logging.getLogger(__name__)
 configure_logger(logger)
 
 
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))  # Seconds a user record may be served without SQL
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+USER_CACHE_PREFIX = "user:"
+USER_CACHE_PENDING = "user_cache_pending"  # Session.info key for usernames to invalidate at commit
+
+# Usernames to user records, in front of the users table. Enabled by create_app (USER_CACHE_ENABLED).
+user_cache = LocalCache(ttl=USER_CACHE_TTL, max_entries=USER_CACHE_MAX_ENTRIES)
+
+
+@dataclass(frozen=True)
+class UserRecord:
+    """The columns of a user row needed to authenticate them."""
+    id: int
+    salt: str
+    password: str
+
+
 class Users(db.Model):
     __tablename__ = 'users'
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     salt = db.Column(db.String(32), nullable=False)  # 16-byte salt in hex
-    password = db.Column(db.String(64), nullable=False)  # SHA-256 hash in hex
+    password = db.Column(db.String(255), nullable=False)  # "kdf$params$key", or a legacy SHA-256 hash in hex
 
     @classmethod
     def _generate_hashed_password(cls, password: str) -> tuple[str, str]:
         """
-        Generates a salted, hashed password.
+        Generates a salted, hashed password with the configured KDF, on the hashing process pool.
 
         Args:
             password (str): The password to hash.
@@ -32,7 +55,7 @@ class Users(db.Model):
             tuple: A tuple containing the salt and hashed password.
         """
         salt = os.urandom(16).hex()
-        hashed_password = hashlib.sha256((password + salt).encode()).hexdigest()
+        hashed_password = password_hasher.hash(password, salt)
         return salt, hashed_password
 
     @classmethod
@@ -62,6 +85,162 @@ class Users(db.Model):
             logger.error("Database error: %s", str(e))
             raise
 
+    @classmethod
+    def bulk_create_users(cls, rows: Iterable[dict], chunk_size: int = PROVISION_CHUNK_SIZE) -> Iterator[dict]:
+        """
+        Creates users in chunks, reporting on every row.
+
+        Each chunk costs one query to find usernames that are already taken, one
+        parallel hashing pass over the worker processes for the rest, one `executemany`
+        insert and one commit. Re-running a file therefore only pays the KDF for the
+        users it has not created yet. Rows are read lazily, so the input can be streamed from a file.
+
+        Args:
+            rows (Iterable[dict]): Rows with `username` and `password`, and optionally
+                                   `line` (echoed in the report) and `error` (a parse error).
+            chunk_size (int): Rows per chunk.
+
+        Yields:
+            dict: One report per row, in input order, with `line`, `username` and a
+                  `status` of "created", "duplicate" or "invalid" (with an `error`).
+
+        Raises:
+            Exception: For any errors that occur during database operations; earlier
+                       chunks stay committed.
+        """
+        chunk: list[dict] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from cls._create_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from cls._create_chunk(chunk)
+
+    @classmethod
+    def _create_chunk(cls, rows: list[dict]) -> list[dict]:
+        """Creates one chunk of users for `bulk_create_users` and returns the row reports."""
+        reports: list[dict] = []
+        candidates: dict[str, tuple[dict, str]] = {}  # username -> (report, password)
+        for row in rows:
+            username, password = row.get("username"), row.get("password")
+            report = {"line": row.get("line"), "username": username}
+            reports.append(report)
+            if row.get("error"):
+                report.update(status="invalid", error=row["error"])
+            elif not isinstance(username, str) or not username or len(username) > 80:
+                report.update(status="invalid", error="Username must be 1 to 80 characters")
+            elif not isinstance(password, str) or not password:
+                report.update(status="invalid", error="Password is required")
+            elif username in candidates:
+                report.update(status="duplicate", error=f"User with username '{username}' appears earlier in the file")
+            else:
+                candidates[username] = (report, password)
+
+        # Existing users are dropped before hashing, so they never cost a KDF run
+        cls._drop_taken(candidates)
+        salts = {username: os.urandom(16).hex() for username in candidates}
+        hashes = dict(zip(candidates, password_hasher.hash_many(
+            [(password, salts[username]) for username, (_, password) in candidates.items()]
+        ))) if candidates else {}
+
+        # A user created concurrently between the pre-check and the insert fails the
+        # whole executemany; check again once and insert what is still free.
+        for attempt in range(2):
+            if attempt:
+                cls._drop_taken(candidates)
+            if not candidates:
+                break
+            try:
+                db.session.execute(insert(cls.__table__), [
+                    {"username": username, "salt": salts[username], "password": hashes[username]}
+                    for username in candidates
+                ])
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+                logger.warning("Users created concurrently with a bulk insert; checking the chunk again")
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Database error: %s", str(e))
+                raise
+
+        for report, _ in candidates.values():
+            report["status"] = "created"
+        logger.info("Bulk created %d of %d users", len(candidates), len(rows))
+        return reports
+
+    @classmethod
+    def _drop_taken(cls, candidates: dict[str, tuple[dict, str]]) -> None:
+        """Reports the candidates whose username already exists as duplicates and removes them."""
+        if not candidates:
+            return
+        taken = set(db.session.scalars(select(cls.username).where(cls.username.in_(list(candidates)))))
+        for username in taken:
+            report, _ = candidates.pop(username)
+            report.update(status="duplicate", error=f"User with username '{username}' already exists")
+
+    @classmethod
+    def _lookup(cls, username: str) -> UserRecord:
+        """
+        Returns a user's ID, salt and hash, from the user cache when it holds them.
+
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            UserRecord: The user's record.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        def load() -> Optional[UserRecord]:
+            user = cls.query.filter_by(username=username).first()
+            return UserRecord(user.id, user.salt, user.password) if user else None
+
+        record = user_cache.get_or_load(f"{USER_CACHE_PREFIX}{username}", load)
+        if record is None:
+            logger.info("User %s not found", username)
+            raise ValueError(f"User {username} not found")
+        return record
+
+    @classmethod
+    def authenticate(cls, username: str, password: str) -> Optional[int]:
+        """
+        Checks a user's password and returns their ID, with at most one user query.
+
+        A hash made with an older scheme or other KDF parameters is replaced with one
+        made with the current settings once the password has been verified.
+
+        Args:
+            username (str): The username of the user.
+            password (str): The password to check.
+
+        Returns:
+            int | None: The ID of the user if the password is correct, None otherwise.
+
+        Raises:
+            ValueError: If the user does not exist.
+        """
+        record = cls._lookup(username)
+        if not password_hasher.verify(password, record.salt, record.password):
+            return None
+
+        if password_hasher.needs_rehash(record.password):
+            try:
+                user = db.session.get(cls, record.id)
+                user.salt, user.password = cls._generate_hashed_password(password)
+                db.session.commit()
+                logger.info("Password hash upgraded for user: %s", username)
+            except Exception as e:
+                # The login itself succeeded; the upgrade is retried next time
+                db.session.rollback()
+                logger.warning("Failed to upgrade password hash for user %s: %s", username, str(e))
+        return record.id
+
     @classmethod
     def check_password(cls, username: str, password: str) -> bool:
         """
@@ -77,12 +256,7 @@ class Users(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
-        if not user:
-            logger.info("User %s not found", username)
-            raise ValueError(f"User {username} not found")
-        hashed_password = hashlib.sha256((password + user.salt).encode()).hexdigest()
-        return hashed_password == user.password
+        return cls.authenticate(username, password) is not None
 
     @classmethod
     def delete_user(cls, username: str) -> None:
@@ -117,11 +291,7 @@ class Users(db.Model):
         Raises:
             ValueError: If the user does not exist.
         """
-        user = cls.query.filter_by(username=username).first()
-        if not user:
-            logger.info("User %s not found", username)
-            raise ValueError(f"User {username} not found")
-        return user.id
+        return cls._lookup(username).id
 
     @classmethod
     def update_password(cls, username: str, new_password: str) -> None:
@@ -144,4 +314,54 @@ class Users(db.Model):
         user.salt = salt
         user.password = hashed_password
         db.session.commit()
-        logger.info("Password updated successfully for user: %s", username)
\ No newline at end of file
+        logger.info("Password updated successfully for user: %s", username)
+
+
+def invalidate_cached_user(mapper, connection, target) -> None:
+    """
+    Queue a user's cache entry to be dropped when the session commits.
+
+    Registered for updates and deletes of `Users` rows, so every write path (password
+    changes, hash upgrades, deletes) invalidates the entry, in every worker.
+
+    Args:
+        mapper (Mapper): The SQLAlchemy Mapper object (automatically passed by SQLAlchemy).
+        connection (Connection): The SQLAlchemy Connection object (automatically passed by SQLAlchemy).
+        target (Users): The instance of the Users model that was updated or deleted.
+    """
+    session = object_session(target)
+    if session is not None:
+        usernames = session.info.setdefault(USER_CACHE_PENDING, set())
+        usernames.add(target.username)
+        # A renamed user's old name must go too
+        usernames.update(inspect(target).attrs.username.history.deleted or ())
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_user_invalidations(session: Session) -> None:
+    """
+    Drops the committed users from the user cache and tells the other workers to do the same.
+
+    Args:
+        session (Session): The session that committed.
+    """
+    usernames = session.info.pop(USER_CACHE_PENDING, None)
+    if usernames:
+        publish_invalidation([f"{USER_CACHE_PREFIX}{username}" for username in usernames], cache=user_cache)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def discard_user_invalidations(session: Session, transaction) -> None:
+    """
+    Drops the user invalidations left over when a transaction ends without committing.
+
+    Args:
+        session (Session): The session whose transaction ended.
+        transaction (SessionTransaction): The transaction that ended.
+    """
+    if transaction.parent is None:
+        session.info.pop(USER_CACHE_PENDING, None)
+
+
+event.listen(Users, 'after_update', invalidate_cached_user)
+event.listen(Users, 'after_delete', invalidate_cached_user)
@@ -0,0 +1,321 @@
+import logging
+import os
+import threading
+import uuid
+import zlib
+from typing import Optional
+
+from flask import Flask
+import redis
+from redis.commands.core import Script
+from sqlalchemy import select
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.db import db
+from stock_portfolio.models.stock_model import (
+    LOCAL_STOCK_PREFIX, LOCAL_STOCKS_KEY, STOCK_CACHE_INDEX, STOCK_CACHE_SYMBOLS, UserStocks
+)
+from stock_portfolio.utils.local_cache import publish_invalidation
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.record_codec import decode_stock, encode_stock
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+RECONCILE_BATCH = int(os.getenv("RECONCILE_BATCH", 200))  # Rows (and SCAN hint) per step
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", 1.0))  # Seconds between steps
+RECONCILE_PASS_PAUSE = float(os.getenv("RECONCILE_PASS_PAUSE", 300))  # Seconds between full passes
+RECONCILE_LEASE_KEY = "stocks:reconcile:lease"
+
+# Replace (or delete, if ARGV[2] is empty) a stock record only if it still holds the value
+# the reconciler compared against, so a write-through that lands mid-repair always wins.
+# Non-string entries (legacy hashes) compare as absent.
+_COMPARE_AND_SET = Script(None, b"""
+local kind = redis.call('type', KEYS[1])['ok']
+local current = ''
+if kind == 'string' then
+    current = redis.call('get', KEYS[1])
+end
+if current ~= ARGV[1] then
+    return 0
+end
+if ARGV[2] == '' then
+    redis.call('del', KEYS[1])
+else
+    redis.call('set', KEYS[1], ARGV[2])
+end
+return 1
+""")
+
+# Extend the reconciler lease only if this worker still holds it
+_RENEW_LEASE = Script(None, b"""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+
+def checksum(record: Optional[bytes]) -> int:
+    """
+    Returns the checksum used to compare a cached record with its row.
+
+    Args:
+        record (bytes | None): An encoded stock record, or None if absent.
+
+    Returns:
+        int: The CRC-32 of the record (0 if absent).
+    """
+    return zlib.crc32(record) if record else 0
+
+
+class CacheReconciler:
+    """
+    A background worker that finds and repairs drift between Redis and the `stocks` table.
+
+    Each pass has two phases, both run in small steps so the work never competes with
+    request traffic:
+
+    - Table to cache: rows are read with keyset pagination (`id > last ORDER BY id LIMIT n`)
+      and their cached records, index membership and symbol mapping are fetched in one
+      pipeline. Records are compared by checksum; missing and stale records are repaired.
+    - Cache to table: `stock:*` keys are walked with `SCAN`, and records whose row no
+      longer exists (or is deleted) are removed.
+
+    Rows that look out of sync are read again in a fresh transaction before they are
+    repaired, and repairs use a compare-and-set script against the value that was
+    compared, so they never overwrite a fresher write-through.
+
+    Every worker process may run a reconciler, but the background thread only steps
+    while it holds a Redis lease (SET NX PX), renewed on every step, so one worker
+    reconciles at a time. If the holder dies another worker takes over once the lease
+    expires. Without Redis each worker reconciles on its own.
+
+    Attributes:
+        counts (dict[str, int]): Rows checked and drift found (missing, stale, orphaned,
+                                 index) since the worker started.
+        passes (int): Number of completed passes.
+        last_pass_drift (dict[str, int] | None): Drift found in the last completed pass.
+    """
+
+    def __init__(self, app: Flask, batch_size: int = RECONCILE_BATCH, interval: float = RECONCILE_INTERVAL,
+                 pass_pause: float = RECONCILE_PASS_PAUSE):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pass_pause = pass_pause
+        self.counts = {"checked": 0, "missing": 0, "stale": 0, "orphaned": 0, "index": 0}
+        self.passes = 0
+        self.last_pass_drift: Optional[dict[str, int]] = None
+        self._pass_drift = self._empty_drift()
+        self._last_id = 0
+        self._scan_cursor = 0
+        self._phase = "table"
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _empty_drift() -> dict[str, int]:
+        return {"missing": 0, "stale": 0, "orphaned": 0, "index": 0}
+
+    def start(self) -> None:
+        """
+        Starts the worker thread if it is not already running.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-reconciler", daemon=True)
+        self._thread.start()
+        logger.info("Cache reconciler started (batch %d, every %.1fs)", self.batch_size, self.interval)
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Signals the worker to stop and waits for it to exit.
+
+        Args:
+            timeout (float): Seconds to wait for the thread to finish.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            logger.info("Cache reconciler stopped")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self._acquire_lease():
+                self._stop.wait(self.pass_pause)
+                continue
+            try:
+                finished_pass = self.step()
+            except Exception as e:
+                logger.error("Cache reconciliation step failed: %s", str(e))
+                finished_pass = False
+            self._stop.wait(self.pass_pause if finished_pass else self.interval)
+
+    def _acquire_lease(self) -> bool:
+        """Takes or renews the cross-worker reconciler lease. Returns True if this worker should step."""
+        # Long enough to span the pause between passes, so the holder keeps it from pass to pass
+        lease_ms = int(max(self.pass_pause, self.interval, 1.0) * 2000)
+        try:
+            if redis_client.set(RECONCILE_LEASE_KEY, self._owner, nx=True, px=lease_ms):
+                return True
+            return bool(_RENEW_LEASE(keys=[RECONCILE_LEASE_KEY], args=[self._owner, lease_ms], client=redis_client))
+        except redis.RedisError as e:
+            logger.warning("Cache reconciler lease unavailable, reconciling in this worker: %s", str(e))
+            return True
+
+    def run_pass(self) -> dict[str, int]:
+        """
+        Runs steps back to back until a full pass completes.
+
+        Returns:
+            dict: The drift found in the pass.
+        """
+        while not self.step():
+            pass
+        return dict(self.last_pass_drift)
+
+    def step(self) -> bool:
+        """
+        Reconciles one batch.
+
+        Returns:
+            bool: True if this step completed a full pass.
+        """
+        with self.app.app_context():
+            if self._phase == "table":
+                if self._reconcile_rows():
+                    self._phase = "cache"
+                return False
+            if not self._reconcile_keys():
+                return False
+
+        with self._lock:
+            self.passes += 1
+            self.last_pass_drift = self._pass_drift
+            self._pass_drift = self._empty_drift()
+        self._phase, self._last_id, self._scan_cursor = "table", 0, 0
+        drift = sum(self.last_pass_drift.values())
+        (logger.warning if drift else logger.info)("Cache reconciliation pass %d found %d drifted entries: %s",
+                                                   self.passes, drift, self.last_pass_drift)
+        return True
+
+    def _record(self, kind: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[kind] += amount
+            if kind in self._pass_drift:
+                self._pass_drift[kind] += amount
+
+    @staticmethod
+    def _drift(row, record: Optional[bytes], in_index: bool, mapped_id: Optional[bytes]) -> tuple[Optional[bytes], bool]:
+        """Returns the record to write (None if the cached one matches) and whether the index needs repair."""
+        expected = encode_stock(row.id, row.symbol, row.price, row.quantity)
+        stale = checksum(record) != checksum(expected)
+        return (expected if stale else None), not in_index or mapped_id is None or int(mapped_id) != row.id
+
+    def _reconcile_rows(self) -> bool:
+        """Checks the next page of rows against the cache. Returns True once the table is exhausted."""
+        rows = db.session.execute(
+            select(UserStocks.id, UserStocks.symbol, UserStocks.price, UserStocks.quantity)
+            .where(UserStocks.id > self._last_id, UserStocks.deleted.isnot(True))
+            .order_by(UserStocks.id)
+            .limit(self.batch_size)
+        ).all()
+        if not rows:
+            return True
+        self._last_id = rows[-1].id
+        self._record("checked", len(rows))
+
+        ids = [row.id for row in rows]
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.mget([f"stock:{stock_id}" for stock_id in ids])
+        pipe.smismember(STOCK_CACHE_INDEX, ids)
+        pipe.hmget(STOCK_CACHE_SYMBOLS, [row.symbol for row in rows])
+        cached = {row.id: state for row, *state in zip(rows, *pipe.execute())}
+
+        suspects = [row.id for row in rows if any(self._drift(row, *cached[row.id]))]
+        if not suspects:
+            return False
+        # A write-through may have landed between the select and the MGET, leaving Redis newer
+        # than the rows read above; end that read transaction and compare against the rows as
+        # committed now, so a repair never moves the cache back to an older snapshot. Rows
+        # deleted meanwhile are left to the cache phase.
+        db.session.rollback()
+
+        repair = redis_client.pipeline(transaction=False)
+        repaired = []
+        fresh = db.session.execute(
+            select(UserStocks.id, UserStocks.symbol, UserStocks.price, UserStocks.quantity)
+            .where(UserStocks.id.in_(suspects), UserStocks.deleted.isnot(True))
+            .order_by(UserStocks.id)
+        ).all()
+        for row in fresh:
+            record, in_index, mapped_id = cached[row.id]
+            expected, index_drift = self._drift(row, record, in_index, mapped_id)
+            if expected is not None:
+                self._record("missing" if record is None else "stale")
+                _COMPARE_AND_SET(keys=[f"stock:{row.id}"], args=[record or b"", expected], client=repair)
+                repaired.append(row.symbol)
+            if index_drift:
+                self._record("index")
+                repair.sadd(STOCK_CACHE_INDEX, row.id)
+                repair.hset(STOCK_CACHE_SYMBOLS, row.symbol, row.id)
+                repaired.append(row.symbol)
+        if repaired:
+            publish_invalidation([LOCAL_STOCKS_KEY] + [LOCAL_STOCK_PREFIX + symbol for symbol in repaired], repair)
+            repair.execute()
+        return False
+
+    def _reconcile_keys(self) -> bool:
+        """Checks the next SCAN batch of cached records against the table. Returns True once the scan wraps."""
+        self._scan_cursor, keys = redis_client.scan(self._scan_cursor, match="stock:*", count=self.batch_size)
+        ids = {}
+        for key in keys:
+            suffix = key.decode().split(":", 1)[1]
+            if suffix.isdigit():
+                ids[int(suffix)] = key
+        if ids:
+            live = set(db.session.execute(
+                select(UserStocks.id).where(UserStocks.id.in_(list(ids)), UserStocks.deleted.isnot(True))
+            ).scalars())
+            orphans = [stock_id for stock_id in ids if stock_id not in live]
+            if orphans:
+                records = redis_client.mget([ids[stock_id] for stock_id in orphans])
+                stocks = [decode_stock(record) for record in records]
+                symbols = [stock["symbol"] for stock in stocks if stock]
+                mapped = dict(zip(symbols, redis_client.hmget(STOCK_CACHE_SYMBOLS, symbols))) if symbols else {}
+                repair = redis_client.pipeline(transaction=False)
+                invalidated = [LOCAL_STOCKS_KEY]
+                for stock_id, record, stock in zip(orphans, records, stocks):
+                    self._record("orphaned")
+                    _COMPARE_AND_SET(keys=[ids[stock_id]], args=[record or b"", b""], client=repair)
+                    repair.srem(STOCK_CACHE_INDEX, stock_id)
+                    if stock:
+                        invalidated.append(LOCAL_STOCK_PREFIX + stock["symbol"])
+                        # The symbol may already belong to a newer row
+                        if mapped.get(stock["symbol"]) is not None and int(mapped[stock["symbol"]]) == stock_id:
+                            repair.hdel(STOCK_CACHE_SYMBOLS, stock["symbol"])
+                publish_invalidation(invalidated, repair)
+                repair.execute()
+        return self._scan_cursor == 0
+
+    def stats(self) -> dict:
+        """
+        Returns the reconciler status.
+
+        Returns:
+            dict: Whether the worker is running, cumulative counts, completed passes and
+                  the drift found in the last pass.
+        """
+        with self._lock:
+            return {
+                "running": bool(self._thread and self._thread.is_alive()),
+                "counts": dict(self.counts),
+                "passes": self.passes,
+                "last_pass_drift": dict(self.last_pass_drift) if self.last_pass_drift else None,
+            }
@@ -0,0 +1,148 @@
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))  # Consecutive failures that trip the breaker
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))  # Seconds open before trial calls are let through
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", 1))  # Concurrent trial calls while half-open
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised when a call is refused because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing, and probes it before trusting it again.
+
+    The breaker starts closed. After `failure_threshold` consecutive failures it opens
+    and refuses calls with CircuitOpenError for `reset_timeout` seconds. It then goes
+    half-open: up to `half_open_calls` trial calls are let through at a time; one
+    success closes the breaker, a failure opens it again for another `reset_timeout`.
+
+    Only exceptions of the configured `failure_types` count as failures; anything else
+    (an unknown symbol, an exhausted request budget) says nothing about the upstream's
+    health and leaves the state unchanged.
+
+    State is kept per process.
+
+    Attributes:
+        state (str): "closed", "open" or "half_open".
+        trips (int): Number of times the breaker has opened.
+        rejected (int): Number of calls refused while open.
+    """
+
+    def __init__(self, name: str, failure_types: tuple = (ConnectionError,),
+                 failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS):
+        self.name = name
+        self.failure_types = failure_types
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.trips = 0
+        self.rejected = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Returns True if a call may go ahead now, without reserving a trial slot.
+
+        Returns:
+            bool: False while open, or while half-open with every trial slot taken.
+        """
+        with self._lock:
+            self._advance()
+            return self.state == CLOSED or (self.state == HALF_OPEN and self._trials < self.half_open_calls)
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Wraps one call to the upstream.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with every trial slot taken.
+        """
+        self._acquire()
+        try:
+            yield
+        except self.failure_types:
+            self._release(success=False)
+            raise
+        except BaseException:
+            self._release(success=None)
+            raise
+        self._release(success=True)
+
+    def _advance(self) -> None:
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._trials = 0
+            logger.info("Circuit breaker %s half-open, probing upstream", self.name)
+
+    def _acquire(self) -> None:
+        with self._lock:
+            self._advance()
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(f"{self.name} is unavailable; retrying in {retry_in:.0f}s.")
+
+    def _release(self, success: Optional[bool]) -> None:
+        with self._lock:
+            trial = self.state == HALF_OPEN
+            if trial:
+                self._trials = max(0, self._trials - 1)
+            if success is None:
+                return
+            if success:
+                if self.state != CLOSED:
+                    logger.info("Circuit breaker %s closed", self.name)
+                self.state = CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if trial or (self.state == CLOSED and self._failures >= self.failure_threshold):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning("Circuit breaker %s opened after %d consecutive failures",
+                               self.name, self._failures)
+
+    def stats(self) -> dict:
+        """
+        Returns the breaker state and counters.
+
+        Returns:
+            dict: The state, consecutive failures, number of trips and rejected calls.
+        """
+        with self._lock:
+            self._advance()
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+import redis
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.metrics import HitCounter
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", 5))  # Seconds an entry may be served without asking Redis
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", 10000))
+LOCAL_CACHE_MAX_BYTES = int(os.getenv("LOCAL_CACHE_MAX_BYTES", 16 * 1024 * 1024))  # Approximate memory cap
+INVALIDATION_CHANNEL = "cache:invalidate"
+INVALIDATE_ALL = "*"
+
+
+def approx_size(value: Any) -> int:
+    """
+    Estimates the memory held by a cached value.
+
+    Args:
+        value (Any): A value built from dicts, lists, tuples, dataclasses and scalars.
+
+    Returns:
+        int: The approximate size in bytes.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item) for item in value)
+    elif is_dataclass(value) and not isinstance(value, type):
+        size += sum(approx_size(getattr(value, field.name)) for field in fields(value))
+    return size
+
+
+class LocalCache:
+    """
+    A bounded, in-process LRU cache with per-entry TTLs that sits in front of Redis.
+
+    Entries are evicted least-recently-used first once either LOCAL_CACHE_MAX_ENTRIES or
+    LOCAL_CACHE_MAX_BYTES is exceeded, and expire after LOCAL_CACHE_TTL at the latest.
+    Writers publish the keys they change on the `cache:invalidate` Redis channel; every
+    process runs a listener thread that drops those keys from its own cache, so workers
+    see each other's writes without waiting for the TTL.
+
+    The cache is disabled until `enabled` is set (see the LOCAL_CACHE_ENABLED setting);
+    while disabled every lookup goes straight to the loader.
+    """
+
+    def __init__(self, ttl: float = LOCAL_CACHE_TTL, max_entries: int = LOCAL_CACHE_MAX_ENTRIES,
+                 max_bytes: int = LOCAL_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = False
+        self.counter = HitCounter()
+        self._entries: OrderedDict[str, tuple[Any, float, int]] = OrderedDict()  # key -> (value, expires, size)
+        self._bytes = 0
+        self._epoch = 0  # Bumped on every invalidation so loads that raced one are not cached
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listener_pid: Optional[int] = None
+        self._stop = threading.Event()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Looks up a key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Any | None: The cached value, or None if it is absent, expired or the cache is disabled.
+        """
+        if not self.enabled:
+            return None
+        self._ensure_listener()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.counter.record(True)
+                return entry[0]
+            if entry is not None:
+                self._drop(key)
+        self.counter.record(False)
+        return None
+
+    def get_or_load(self, key: str, loader: Callable[[], Optional[Any]], ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Returns the cached value for a key, loading and caching it on a miss.
+
+        A load that overlaps an invalidation is returned but not cached, since it may
+        have read the value the invalidation was about.
+
+        Args:
+            key (str): The cache key.
+            loader (Callable): Fetches the value from the next tier; None results are not cached.
+            ttl (float, optional): Override for the cache TTL.
+
+        Returns:
+            Any | None: The value.
+        """
+        value = self.get(key)
+        if value is not None or not self.enabled:
+            return value if value is not None else loader()
+        epoch = self._epoch
+        value = loader()
+        if value is not None:
+            self.set(key, value, ttl, epoch=epoch)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, epoch: Optional[int] = None) -> None:
+        """
+        Stores a value, evicting least-recently-used entries to stay within the caps.
+
+        Args:
+            key (str): The cache key.
+            value (Any): The value to store.
+            ttl (float, optional): Override for the cache TTL.
+            epoch (int, optional): Skip the write if an invalidation happened since this epoch.
+        """
+        if not self.enabled:
+            return
+        size = approx_size(value)
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + min(ttl if ttl is not None else self.ttl, self.ttl)
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, expires, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """
+        Drops keys from this process's cache. INVALIDATE_ALL clears everything.
+
+        Args:
+            keys (Iterable[str]): The keys to drop.
+        """
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if key == INVALIDATE_ALL:
+                    self._entries.clear()
+                    self._bytes = 0
+                    break
+                if key in self._entries:
+                    self._drop(key)
+
+    def clear(self) -> None:
+        """
+        Drops every entry.
+        """
+        self.invalidate([INVALIDATE_ALL])
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _ensure_listener(self) -> None:
+        # Checked per process: a listener started before a fork does not survive into the child
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._entries.clear()
+            self._bytes = 0
+            self._stop.clear()
+            self._listener = threading.Thread(target=self._listen, name="local-cache-invalidation", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        backoff = 0.5
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations sent before the subscription took effect were missed
+                self.clear()
+                backoff = 0.5
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self.invalidate(message["data"].decode().split("\n"))
+            except redis.RedisError as e:
+                logger.warning("Cache invalidation listener lost Redis, retrying in %.1fs: %s", backoff, str(e))
+                self.clear()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except redis.RedisError:
+                        pass
+
+    def stop(self, timeout: float = 2) -> None:
+        """
+        Stops the invalidation listener.
+
+        Args:
+            timeout (float): Seconds to wait for the thread to finish.
+        """
+        self._stop.set()
+        if self._listener:
+            self._listener.join(timeout)
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Hit and miss counts, the hit ratio, and the current entry count and size.
+        """
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        return {**self.counter.snapshot(), "enabled": self.enabled, "entries": entries, "bytes": size}
+
+
+def publish_invalidation(keys: Iterable[str], pipe=None, cache: Optional[LocalCache] = None) -> None:
+    """
+    Drops keys from the local cache and tells every other process to do the same.
+
+    Args:
+        keys (Iterable[str]): The keys that changed.
+        pipe (Pipeline, optional): A Redis pipeline to queue the publish on instead of
+                                   sending it immediately.
+        cache (LocalCache, optional): The cache holding the keys; defaults to `local_cache`.
+                                      Every process's caches listen on the same channel.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    cache = cache or local_cache
+    cache.invalidate(keys)
+    if not cache.enabled:
+        return
+    if pipe is not None:
+        pipe.publish(INVALIDATION_CHANNEL, "\n".join(keys))
+        return
+    try:
+        redis_client.publish(INVALIDATION_CHANNEL, "\n".join(keys))
+    except redis.RedisError as e:
+        logger.warning("Failed to publish cache invalidation for %d keys: %s", len(keys), str(e))
+
+
+local_cache = LocalCache()
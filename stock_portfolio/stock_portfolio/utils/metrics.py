@@ -0,0 +1,115 @@
+from collections import deque
+import threading
+
+
+class LatencyStats:
+    """
+    Thread-safe latency counters with percentiles over a window of recent samples.
+
+    Attributes:
+        count (int): Number of recorded operations.
+        errors (int): Number of recorded operations that failed.
+        total_ms (float): Sum of all recorded latencies in milliseconds.
+        max_ms (float): Largest recorded latency in milliseconds.
+    """
+
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float, error: bool = False) -> None:
+        """
+        Records one operation.
+
+        Args:
+            elapsed_ms (float): How long the operation took, in milliseconds.
+            error (bool): Whether the operation failed.
+        """
+        with self._lock:
+            self.count += 1
+            self.errors += int(error)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self._samples.append(elapsed_ms)
+
+    def percentile(self, pct: float) -> float:
+        """
+        Returns a percentile of the recent samples.
+
+        Args:
+            pct (float): The percentile to compute, between 0 and 100.
+
+        Returns:
+            float: The latency in milliseconds, or 0.0 if nothing has been recorded.
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current counters.
+
+        Returns:
+            dict: Count, errors, mean, max, p50 and p95 latency in milliseconds.
+        """
+        p50, p95 = self.percentile(50), self.percentile(95)
+        with self._lock:
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "p50_ms": round(p50, 3),
+                "p95_ms": round(p95, 3),
+            }
+
+
+class HitCounter:
+    """
+    Thread-safe hit and miss counters for one cache tier.
+
+    Attributes:
+        hits (int): Number of lookups answered by the tier.
+        misses (int): Number of lookups passed on to the next tier.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool) -> None:
+        """
+        Records one lookup.
+
+        Args:
+            hit (bool): Whether the lookup was answered by this tier.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current counters.
+
+        Returns:
+            dict: Hit and miss counts and the hit ratio.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
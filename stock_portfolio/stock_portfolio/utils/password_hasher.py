@@ -0,0 +1,266 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import hmac
+from itertools import repeat
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Optional
+
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.metrics import LatencyStats
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+PASSWORD_KDF = os.getenv("PASSWORD_KDF", "scrypt")  # "scrypt" or "pbkdf2_sha256" for new hashes
+SCRYPT_N = int(os.getenv("SCRYPT_N", 2 ** 14))  # scrypt CPU/memory cost; a power of two
+SCRYPT_R = int(os.getenv("SCRYPT_R", 8))  # scrypt block size
+SCRYPT_P = int(os.getenv("SCRYPT_P", 1))  # scrypt parallelism
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", 600_000))  # PBKDF2-HMAC-SHA256 rounds
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))  # Processes; 0 hashes inline
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 30))  # Seconds to wait for a worker
+
+LEGACY_KDF = "sha256"
+KDF_PARAMS = {
+    "scrypt": {"n": SCRYPT_N, "r": SCRYPT_R, "p": SCRYPT_P},
+    "pbkdf2_sha256": {"i": PBKDF2_ITERATIONS},
+}
+
+
+def derive(kdf: str, params: dict[str, int], password: str, salt: str) -> str:
+    """
+    Derives a password hash. Runs in a worker process, so it only takes plain values.
+
+    Args:
+        kdf (str): "scrypt", "pbkdf2_sha256" or "sha256" (the single-round legacy scheme).
+        params (dict): The KDF cost parameters.
+        password (str): The password.
+        salt (str): The user's salt, in hex.
+
+    Returns:
+        str: The derived key, in hex.
+
+    Raises:
+        ValueError: If the KDF is unknown.
+    """
+    if kdf == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        return hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), n=n, r=r, p=p,
+                              maxmem=128 * r * (n + p + 2) + (1 << 20), dklen=32).hex()
+    if kdf == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), params["i"]).hex()
+    if kdf == LEGACY_KDF:
+        return hashlib.sha256((password + salt).encode()).hexdigest()
+    raise ValueError(f"Unknown password KDF '{kdf}'")
+
+
+def parse_hash(stored: str) -> tuple[str, dict[str, int], str]:
+    """
+    Splits a stored hash into its KDF, parameters and derived key.
+
+    New hashes are stored as `kdf$name=value,...$key`; a bare 64-character hex digest
+    is a legacy single-round SHA-256 hash.
+
+    Args:
+        stored (str): The stored password hash.
+
+    Returns:
+        tuple: The KDF name, its parameters and the derived key in hex.
+
+    Raises:
+        ValueError: If the stored hash cannot be parsed.
+    """
+    if "$" not in stored:
+        return LEGACY_KDF, {}, stored
+    try:
+        kdf, params, key = stored.split("$")
+        return kdf, {name: int(value) for name, value in (pair.split("=") for pair in params.split(","))}, key
+    except ValueError:
+        raise ValueError("Malformed password hash")
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with a tunable KDF on a bounded process pool.
+
+    A KDF worth using costs tens of milliseconds of CPU per call, which would hold
+    the GIL on the request thread; here the work runs in up to `workers` processes
+    (0 hashes inline, for tools and tests). The KDF and its parameters are stored
+    in every hash, so the cost can be raised without invalidating existing users:
+    `needs_rehash` reports hashes made with other settings, to be upgraded at login.
+
+    The pool is created on first use, with the "spawn" start method, and again in a
+    process forked after that.
+
+    Attributes:
+        latency (LatencyStats): Time spent per hash, including the wait for a worker.
+    """
+
+    def __init__(self, kdf: str = PASSWORD_KDF, params: Optional[dict[str, int]] = None,
+                 workers: int = PASSWORD_HASH_WORKERS, timeout: float = PASSWORD_HASH_TIMEOUT):
+        if kdf not in KDF_PARAMS:
+            raise ValueError(f"Unknown password KDF '{kdf}'")
+        self.kdf = kdf
+        self.params = dict(params or KDF_PARAMS[kdf])
+        self.workers = workers
+        self.timeout = timeout
+        self.latency = LatencyStats()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid = 0
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _derive(self, kdf: str, params: dict[str, int], password: str, salt: str) -> str:
+        started = time.perf_counter()
+        error = False
+        try:
+            if self.workers <= 0:
+                return derive(kdf, params, password, salt)
+            try:
+                return self._executor().submit(derive, kdf, params, password, salt).result(timeout=self.timeout)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); start a fresh pool for the next call
+                with self._lock:
+                    self._pool = None
+                raise
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.latency.record((time.perf_counter() - started) * 1000, error=error)
+
+    def hash(self, password: str, salt: str) -> str:
+        """
+        Hashes a password with the configured KDF.
+
+        Args:
+            password (str): The password to hash.
+            salt (str): The user's salt, in hex.
+
+        Returns:
+            str: The hash to store, including the KDF and its parameters.
+        """
+        return self._format(self._derive(self.kdf, self.params, password, salt))
+
+    def hash_many(self, items: list[tuple[str, str]]) -> list[str]:
+        """
+        Hashes many passwords with the configured KDF, spread over every worker process.
+
+        Args:
+            items (list[tuple[str, str]]): (password, salt) pairs.
+
+        Returns:
+            list[str]: The hashes to store, in the order of `items`.
+        """
+        passwords, salts = zip(*items) if items else ((), ())
+        if self.workers <= 0:
+            keys = map(derive, repeat(self.kdf), repeat(self.params), passwords, salts)
+        else:
+            # Several hashes per task, so pickling and IPC stay small next to the KDF work
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            keys = self._executor().map(derive, repeat(self.kdf), repeat(self.params), passwords, salts,
+                                        chunksize=chunksize)
+        return [self._format(key) for key in keys]
+
+    def _format(self, key: str) -> str:
+        params = ",".join(f"{name}={value}" for name, value in self.params.items())
+        return f"{self.kdf}${params}${key}"
+
+    def verify(self, password: str, salt: str, stored: str) -> bool:
+        """
+        Checks a password against a stored hash, using the parameters it was made with.
+
+        Args:
+            password (str): The password to check.
+            salt (str): The user's salt, in hex.
+            stored (str): The stored hash, new or legacy.
+
+        Returns:
+            bool: True if the password matches.
+
+        Raises:
+            ValueError: If the stored hash cannot be parsed.
+        """
+        kdf, params, key = parse_hash(stored)
+        return hmac.compare_digest(self._derive(kdf, params, password, salt), key)
+
+    def needs_rehash(self, stored: str) -> bool:
+        """
+        Returns True if a stored hash was made with a different KDF or parameters than the configured ones.
+
+        Args:
+            stored (str): The stored hash.
+
+        Returns:
+            bool: Whether the hash should be replaced on the next successful login.
+        """
+        kdf, params, _ = parse_hash(stored)
+        return kdf != self.kdf or params != self.params
+
+    def shutdown(self) -> None:
+        """Stops the worker processes, if any were started."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """
+        Returns the hashing configuration and latency.
+
+        Returns:
+            dict: The KDF, its parameters, the worker count and hashing latency.
+        """
+        return {"kdf": self.kdf, "params": self.params, "workers": self.workers, "latency": self.latency.snapshot()}
+
+
+def benchmark_logins(hasher: PasswordHasher, logins: int, concurrency: int) -> dict:
+    """
+    Measures login verification throughput and latency for a hasher under concurrent load.
+
+    `concurrency` threads stand in for request threads, each verifying passwords
+    against a hash made with the hasher's settings.
+
+    Args:
+        hasher (PasswordHasher): The hasher to measure.
+        logins (int): The total number of verifications.
+        concurrency (int): The number of concurrent callers.
+
+    Returns:
+        dict: Logins per second and p50/p99/max latency in milliseconds.
+    """
+    salt = os.urandom(16).hex()
+    stored = hasher.hash("benchmark-password", salt)
+    samples = LatencyStats(window=logins)
+
+    def login(_: int) -> None:
+        started = time.perf_counter()
+        hasher.verify("benchmark-password", salt, stored)
+        samples.record((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as callers:
+        list(callers.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+    return {
+        "logins_per_second": round(logins / elapsed, 1),
+        "p50_ms": round(samples.percentile(50), 1),
+        "p99_ms": round(samples.percentile(99), 1),
+        "max_ms": round(samples.max_ms, 1),
+    }
+
+
+password_hasher = PasswordHasher()
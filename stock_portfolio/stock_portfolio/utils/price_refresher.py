@@ -0,0 +1,219 @@
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+import uuid
+
+from flask import Flask
+import redis
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.models.stock_model import UserStocks
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.quote_cache import quote_ttl
+from stock_portfolio.utils.upstream_scheduler import PRIORITY_BACKGROUND
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+PRICE_REFRESH_WINDOW = float(os.getenv("PRICE_REFRESH_WINDOW", 900))  # Seconds to cycle through every held symbol
+PRICE_REFRESH_BATCH = int(os.getenv("PRICE_REFRESH_BATCH", 5))  # Symbols refreshed per tick
+PRICE_REFRESH_LEASE_KEY = "prices:refresh:lease"
+PRICE_REFRESH_TIMES_KEY = "prices:refresh:times"  # Hash of symbol to the Unix time of its last refresh
+PRICE_REFRESH_ERRORS_KEY = "prices:refresh:errors"  # Hash of symbol to its most recent refresh error
+
+
+class PriceRefresher:
+    """
+    A background worker that keeps the prices of held symbols fresh.
+
+    Each cycle loads the held symbols from the `stocks` table and refreshes them in
+    small batches spread evenly over PRICE_REFRESH_WINDOW, so the upstream quota is
+    spent steadily instead of in bursts. Prices are fetched at background priority,
+    written to the database in one transaction per batch and cached long enough to
+    survive until the next cycle, so reads never have to wait on the upstream.
+
+    Every worker process runs a refresher, but a cycle only starts after taking a
+    Redis lease (SET NX PX) that lasts one refresh window, so the held symbols are
+    refreshed once per window across all workers rather than once per worker. The
+    lease is left to expire; if its holder dies, another worker takes over after one
+    window. Without Redis each worker refreshes on its own.
+
+    Refresh times and errors are recorded in Redis hashes, so every worker reports the
+    lag of the refreshes done by whichever worker held the lease.
+
+    Attributes:
+        last_refreshed (dict[str, float]): Unix time of this worker's last successful refresh per symbol,
+                                           reported when Redis cannot be reached.
+        last_errors (dict[str, str]): This worker's most recent refresh error per symbol.
+        skipped_cycles (int): Cycles left to another worker that held the lease.
+    """
+
+    def __init__(self, app: Flask, window: float = PRICE_REFRESH_WINDOW, batch_size: int = PRICE_REFRESH_BATCH):
+        self.app = app
+        self.window = window
+        self.batch_size = batch_size
+        self.last_refreshed: dict[str, float] = {}
+        self.last_errors: dict[str, str] = {}
+        self.skipped_cycles = 0
+        self._owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the worker thread if it is not already running.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-refresher", daemon=True)
+        self._thread.start()
+        logger.info("Price refresher started (window %.0fs, batch %d)", self.window, self.batch_size)
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Signals the worker to stop and waits for it to exit.
+
+        Args:
+            timeout (float): Seconds to wait for the thread to finish.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            logger.info("Price refresher stopped")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh_cycle()
+            except Exception as e:
+                logger.error("Price refresh cycle failed: %s", str(e))
+                self._stop.wait(self.window)
+
+    def refresh_cycle(self) -> None:
+        """
+        Refreshes every held symbol once, pacing the batches over the refresh window.
+
+        If another worker holds the refresh lease the cycle is skipped, after waiting
+        out the lease.
+        """
+        lease_seconds = max(self.window, 1.0)
+        if not self._acquire_lease(lease_seconds):
+            self.skipped_cycles += 1
+            self._stop.wait(lease_seconds)
+            return
+
+        with self.app.app_context():
+            symbols = UserStocks.get_held_symbols()
+        if not symbols:
+            self._stop.wait(self.window)
+            return
+
+        batches = [symbols[i:i + self.batch_size] for i in range(0, len(symbols), self.batch_size)]
+        pause = self.window / len(batches)
+        for batch in batches:
+            started = time.monotonic()
+            self.refresh(batch)
+            if self._stop.wait(max(0.0, pause - (time.monotonic() - started))):
+                return
+
+    def _acquire_lease(self, seconds: float) -> bool:
+        """Takes the cross-worker refresh lease for one window. Returns True if this worker should refresh."""
+        try:
+            return bool(redis_client.set(PRICE_REFRESH_LEASE_KEY, self._owner, nx=True, px=int(seconds * 1000)))
+        except redis.RedisError as e:
+            logger.warning("Price refresh lease unavailable, refreshing in this worker: %s", str(e))
+            return True
+
+    def refresh(self, symbols: List[str]) -> None:
+        """
+        Refreshes one batch of symbols, bypassing the quote cache.
+
+        Args:
+            symbols (List[str]): The symbols to refresh.
+        """
+        # Keep refreshed quotes until well after the next cycle has had a chance to replace them
+        cache_ttl = max(quote_ttl(), int(self.window * 2))
+        with self.app.app_context():
+            prices, errors = UserStocks.get_stock_prices(
+                symbols, priority=PRIORITY_BACKGROUND, use_cache=False, cache_ttl=cache_ttl
+            )
+        now = time.time()
+        with self._lock:
+            for symbol in prices:
+                self.last_refreshed[symbol] = now
+                self.last_errors.pop(symbol, None)
+            self.last_errors.update(errors)
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            if prices:
+                pipe.hset(PRICE_REFRESH_TIMES_KEY, mapping={symbol: now for symbol in prices})
+                pipe.hdel(PRICE_REFRESH_ERRORS_KEY, *prices)
+            if errors:
+                pipe.hset(PRICE_REFRESH_ERRORS_KEY, mapping=errors)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Failed to record price refresh status in Redis: %s", str(e))
+        if errors:
+            logger.warning("Failed to refresh %d of %d symbols", len(errors), len(symbols))
+
+    def _status(self, symbols: List[str]) -> tuple[dict[str, float], dict[str, str]]:
+        """Returns the last refresh time and error per symbol, as recorded by whichever worker refreshed it."""
+        if not symbols:
+            return {}, {}
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.hmget(PRICE_REFRESH_TIMES_KEY, symbols)
+            pipe.hmget(PRICE_REFRESH_ERRORS_KEY, symbols)
+            times, errors = pipe.execute()
+            return (
+                {symbol: float(value) for symbol, value in zip(symbols, times) if value is not None},
+                {symbol: value.decode() for symbol, value in zip(symbols, errors) if value is not None},
+            )
+        except redis.RedisError as e:
+            logger.warning("Failed to read price refresh status from Redis, reporting this worker's: %s", str(e))
+        with self._lock:
+            return (
+                {symbol: self.last_refreshed[symbol] for symbol in symbols if symbol in self.last_refreshed},
+                {symbol: self.last_errors[symbol] for symbol in symbols if symbol in self.last_errors},
+            )
+
+    def lag(self) -> dict[str, Optional[float]]:
+        """
+        Returns how long ago each held symbol was last refreshed, by any worker.
+
+        Returns:
+            dict: Seconds since the last successful refresh per symbol (None if never refreshed).
+        """
+        with self.app.app_context():
+            symbols = UserStocks.get_held_symbols()
+        return self._lag(symbols, self._status(symbols)[0])
+
+    @staticmethod
+    def _lag(symbols: List[str], refreshed: dict[str, float]) -> dict[str, Optional[float]]:
+        now = time.time()
+        return {symbol: round(now - refreshed[symbol], 3) if symbol in refreshed else None for symbol in symbols}
+
+    def stats(self) -> dict:
+        """
+        Returns the refresher status.
+
+        Returns:
+            dict: Whether the worker is running, per-symbol lag and recent errors of held
+                  symbols, and cycles skipped because another worker held the lease.
+        """
+        with self.app.app_context():
+            symbols = UserStocks.get_held_symbols()
+        refreshed, errors = self._status(symbols)
+        return {
+            "running": bool(self._thread and self._thread.is_alive()),
+            "window_seconds": self.window,
+            "lag_seconds": self._lag(symbols, refreshed),
+            "errors": errors,
+            "skipped_cycles": self.skipped_cycles,
+        }
@@ -0,0 +1,268 @@
+from dataclasses import dataclass
+from datetime import datetime, time as dtime, timedelta, timezone
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import redis
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.utils.local_cache import local_cache, publish_invalidation
+from stock_portfolio.utils.logger import configure_logger
+from stock_portfolio.utils.record_codec import decode_legacy_quote, decode_quote, encode_quote
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+    ZoneInfoNotFoundError = Exception
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+QUOTE_TTL_OPEN = int(os.getenv("QUOTE_TTL_OPEN", 60))  # Seconds a quote stays fresh while the market is open
+QUOTE_TTL_CLOSED_MAX = int(os.getenv("QUOTE_TTL_CLOSED_MAX", 12 * 3600))  # Upper bound on overnight/weekend TTL
+QUOTE_NEGATIVE_TTL = int(os.getenv("QUOTE_NEGATIVE_TTL", 300))  # Seconds to remember unknown symbols
+QUOTE_STALE_TTL = int(os.getenv("QUOTE_STALE_TTL", 24 * 3600))  # Seconds an expired quote may still be served
+
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+
+try:
+    MARKET_TZ = ZoneInfo("America/New_York")
+except (TypeError, ZoneInfoNotFoundError):
+    # Slim images may ship without tzdata; Eastern Standard Time is close enough for a TTL.
+    MARKET_TZ = timezone(timedelta(hours=-5))
+
+
+@dataclass
+class Quote:
+    """A cached closing price for a symbol, or a marker that the symbol is unknown upstream."""
+    symbol: str
+    price: float = 0.0
+    as_of: str = ""
+    fetched_at: float = 0.0
+    missing: bool = False
+    stale: bool = False  # Past its TTL, or served from the database because the upstream could not be reached
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the quote was fetched from the upstream API, or None if unknown."""
+        if not self.fetched_at:
+            return None
+        return max(0.0, time.time() - self.fetched_at)
+
+
+def is_market_open(now: Optional[datetime] = None) -> bool:
+    """
+    Returns True if US equity markets are in their regular session.
+
+    Args:
+        now (datetime, optional): The moment to check. Defaults to the current time.
+
+    Returns:
+        bool: True between 09:30 and 16:00 New York time on weekdays.
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(MARKET_TZ)
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+
+def seconds_until_open(now: Optional[datetime] = None) -> float:
+    """
+    Returns the number of seconds until the next regular session opens.
+
+    Args:
+        now (datetime, optional): The moment to measure from. Defaults to the current time.
+
+    Returns:
+        float: Seconds until the next 09:30 New York time on a weekday (0 if the market is open).
+    """
+    now = (now or datetime.now(timezone.utc)).astimezone(MARKET_TZ)
+    if is_market_open(now):
+        return 0.0
+    candidate = now.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    while candidate.weekday() >= 5:
+        candidate += timedelta(days=1)
+    return (candidate - now).total_seconds()
+
+
+def quote_ttl(now: Optional[datetime] = None) -> int:
+    """
+    Returns how long a freshly fetched quote may be served from the cache.
+
+    Quotes are short lived during the trading session and are kept until the next
+    open (capped at QUOTE_TTL_CLOSED_MAX) overnight and on weekends.
+
+    Args:
+        now (datetime, optional): The moment to compute the TTL for. Defaults to the current time.
+
+    Returns:
+        int: The TTL in seconds.
+    """
+    if is_market_open(now):
+        return QUOTE_TTL_OPEN
+    return int(max(QUOTE_TTL_OPEN, min(seconds_until_open(now), QUOTE_TTL_CLOSED_MAX)))
+
+
+class QuoteCache:
+    """
+    A read-through cache of closing prices stored in Redis.
+
+    Each symbol is stored under `quote:{symbol}` as a compact binary record (see
+    `record_codec`) holding the price, the as-of trading date and the time it was
+    fetched; entries still in the old hash format are read too. Redis errors are
+    logged and treated as cache misses so that the cache never takes the price path
+    down.
+    Quotes are kept for QUOTE_STALE_TTL beyond their TTL, and are returned marked
+    `stale` during that window so callers can serve them while they refresh.
+    Lookups are answered from the in-process `local_cache` first when it is enabled;
+    writes update it and publish an invalidation for the other workers.
+
+    Attributes:
+        hits (int): Number of Redis lookups answered from the cache.
+        misses (int): Number of Redis lookups that had to go upstream.
+        negative_hits (int): Number of Redis hits on a cached "unknown symbol" result.
+        stale_hits (int): Number of Redis hits on a quote past its TTL.
+    """
+
+    def __init__(self, prefix: str = "quote"):
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self._lock = threading.Lock()
+
+    def _key(self, symbol: str) -> str:
+        return f"{self.prefix}:{symbol}"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, symbol: str) -> Optional[Quote]:
+        """
+        Looks up a symbol in the cache.
+
+        Args:
+            symbol (str): The stock symbol.
+
+        Returns:
+            Quote | None: The cached quote (possibly a `missing` marker or `stale`), or None on a miss.
+        """
+        return local_cache.get_or_load(self._key(symbol), lambda: self._get_remote(symbol))
+
+    def _get_remote(self, symbol: str) -> Optional[Quote]:
+        key = self._key(symbol)
+        try:
+            try:
+                record, ttl_ms = self._read(key, "get")
+                fields = decode_quote(record)
+            except redis.ResponseError:
+                # WRONGTYPE: the entry predates the binary format and is still a hash
+                record, ttl_ms = self._read(key, "hgetall")
+                fields = decode_legacy_quote(record)
+        except redis.RedisError as e:
+            logger.warning("Quote cache read failed for %s: %s", symbol, str(e))
+            fields = None
+
+        if not fields:
+            self._count("misses")
+            return None
+
+        if fields["missing"]:
+            self._count("negative_hits")
+            return Quote(symbol=symbol, fetched_at=fields["fetched_at"], missing=True)
+
+        # Within the last QUOTE_STALE_TTL of its life the entry is past its real TTL
+        stale = 0 <= ttl_ms <= QUOTE_STALE_TTL * 1000
+        self._count("stale_hits" if stale else "hits")
+        return Quote(symbol=symbol, price=fields["price"], as_of=fields["as_of"], fetched_at=fields["fetched_at"],
+                     stale=stale)
+
+    @staticmethod
+    def _read(key: str, command: str) -> tuple:
+        pipe = redis_client.pipeline(transaction=False)
+        getattr(pipe, command)(key)
+        pipe.pttl(key)
+        return tuple(pipe.execute())
+
+    def set(self, symbol: str, price: float, as_of: str, ttl: Optional[int] = None) -> Quote:
+        """
+        Stores a freshly fetched quote.
+
+        Args:
+            symbol (str): The stock symbol.
+            price (float): The closing price.
+            as_of (str): The trading date the price belongs to (YYYY-MM-DD).
+            ttl (int, optional): Override for the market-hours aware TTL.
+
+        Returns:
+            Quote: The quote that was stored.
+        """
+        quote = Quote(symbol=symbol, price=price, as_of=as_of, fetched_at=time.time())
+        ttl = ttl if ttl is not None else quote_ttl()
+        self._write(symbol, encode_quote(price, as_of, quote.fetched_at), ttl + QUOTE_STALE_TTL)
+        local_cache.set(self._key(symbol), quote, ttl)
+        return quote
+
+    def set_missing(self, symbol: str) -> None:
+        """
+        Remembers that the upstream API does not know a symbol.
+
+        Args:
+            symbol (str): The stock symbol.
+        """
+        self._write(symbol, encode_quote(0.0, "", time.time(), missing=True), QUOTE_NEGATIVE_TTL)
+
+    def invalidate(self, symbol: str) -> None:
+        """
+        Drops a symbol from the cache.
+
+        Args:
+            symbol (str): The stock symbol.
+        """
+        try:
+            pipe = redis_client.pipeline()
+            pipe.delete(self._key(symbol))
+            publish_invalidation([self._key(symbol)], pipe)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Quote cache invalidation failed for %s: %s", symbol, str(e))
+
+    def _write(self, symbol: str, record: bytes, ttl: int) -> None:
+        key = self._key(symbol)
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(key, record, ex=ttl)
+            publish_invalidation([key], pipe)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Quote cache write failed for %s: %s", symbol, str(e))
+
+    def stats(self) -> dict:
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: Redis-tier hit, miss, negative-hit and stale-hit counts plus the hit ratio
+                  (stale hits count as hits, since they are served).
+        """
+        with self._lock:
+            lookups = self.hits + self.misses + self.negative_hits + self.stale_hits
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "stale_hits": self.stale_hits,
+                "hit_ratio": (self.hits + self.negative_hits + self.stale_hits) / lookups if lookups else 0.0,
+            }
+
+
+quote_cache = QuoteCache()
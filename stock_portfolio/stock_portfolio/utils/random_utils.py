@@ -1,6 +1,7 @@
 import logging
 import requests
 
+from stock_portfolio.clients.http_client import http_client
 from stock_portfolio.utils.logger import configure_logger
 
 logger = logging.getLogger(__name__)
@@ -24,7 +25,7 @@ def get_random() -> float:
         # Log the request to random.org
         logger.info("Fetching random number from %s", url)
 
-        response = requests.get(url, timeout=5)
+        response = http_client.get(url, timeout=5)
 
         # Check if the request was successful
         response.raise_for_status()
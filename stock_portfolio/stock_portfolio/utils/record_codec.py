@@ -0,0 +1,189 @@
+from datetime import date
+import logging
+import struct
+from typing import Any, Optional
+
+import redis
+
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+RECORD_VERSION = 1
+
+# version, flags, id, price, quantity, symbol length; followed by the UTF-8 symbol
+_STOCK = struct.Struct("<BBqdqB")
+# version, flags, price, fetched_at, as_of as a date ordinal (0 if unknown)
+_QUOTE = struct.Struct("<BBddI")
+
+_QUANTITY_NULL = 0x01
+_QUOTE_MISSING = 0x01
+
+
+def encode_stock(stock_id: int, symbol: str, price: float, quantity: Optional[int]) -> bytes:
+    """
+    Packs a stock row into its cached binary record.
+
+    Args:
+        stock_id (int): The primary key of the stock.
+        symbol (str): The stock symbol.
+        price (float): The stored price.
+        quantity (int | None): The quantity held.
+
+    Returns:
+        bytes: The record.
+    """
+    symbol_bytes = symbol.encode()
+    flags = _QUANTITY_NULL if quantity is None else 0
+    return _STOCK.pack(RECORD_VERSION, flags, stock_id, price, quantity or 0, len(symbol_bytes)) + symbol_bytes
+
+
+def decode_stock(record: bytes) -> Optional[dict[str, Any]]:
+    """
+    Unpacks a cached stock record.
+
+    Args:
+        record (bytes): The record, as stored by `encode_stock`.
+
+    Returns:
+        dict | None: The stock's id, symbol, price and quantity, or None if the record is
+                     empty or in an unknown format.
+    """
+    if not record or record[0] != RECORD_VERSION or len(record) < _STOCK.size:
+        return None
+    _, flags, stock_id, price, quantity, symbol_length = _STOCK.unpack_from(record)
+    return {
+        "id": stock_id,
+        "symbol": record[_STOCK.size:_STOCK.size + symbol_length].decode(),
+        "price": price,
+        "quantity": None if flags & _QUANTITY_NULL else quantity,
+    }
+
+
+def encode_quote(price: float, as_of: str, fetched_at: float, missing: bool = False) -> bytes:
+    """
+    Packs a quote into its cached binary record.
+
+    Args:
+        price (float): The closing price.
+        as_of (str): The trading date the price belongs to (YYYY-MM-DD), or "".
+        fetched_at (float): Unix time the quote was fetched.
+        missing (bool): Whether this is an "unknown symbol" marker.
+
+    Returns:
+        bytes: The record.
+    """
+    ordinal = date.fromisoformat(as_of).toordinal() if as_of else 0
+    return _QUOTE.pack(RECORD_VERSION, _QUOTE_MISSING if missing else 0, price, fetched_at, ordinal)
+
+
+def decode_quote(record: bytes) -> Optional[dict[str, Any]]:
+    """
+    Unpacks a cached quote record.
+
+    Args:
+        record (bytes): The record, as stored by `encode_quote`.
+
+    Returns:
+        dict | None: The price, as_of, fetched_at and missing fields, or None if the record
+                     is empty or in an unknown format.
+    """
+    if not record or record[0] != RECORD_VERSION or len(record) < _QUOTE.size:
+        return None
+    _, flags, price, fetched_at, ordinal = _QUOTE.unpack_from(record)
+    return {
+        "price": price,
+        "as_of": date.fromordinal(ordinal).isoformat() if ordinal else "",
+        "fetched_at": fetched_at,
+        "missing": bool(flags & _QUOTE_MISSING),
+    }
+
+
+def decode_legacy_stock(fields: dict[bytes, bytes]) -> Optional[dict[str, Any]]:
+    """
+    Reads a stock cached in the old hash format (every field stringified).
+
+    Args:
+        fields (dict): The raw HGETALL result.
+
+    Returns:
+        dict | None: The stock, or None if the hash is empty or incomplete.
+    """
+    values = {k.decode(): v.decode() for k, v in fields.items()}
+    if not all(field in values for field in ("id", "symbol", "price", "quantity")):
+        return None
+    return {
+        "id": int(values["id"]),
+        "symbol": values["symbol"],
+        "price": float(values["price"]),
+        "quantity": None if values["quantity"] == "None" else int(values["quantity"]),
+    }
+
+
+def decode_legacy_quote(fields: dict[bytes, bytes]) -> Optional[dict[str, Any]]:
+    """
+    Reads a quote cached in the old hash format.
+
+    Args:
+        fields (dict): The raw HGETALL result.
+
+    Returns:
+        dict | None: The quote fields, or None if the hash is empty or incomplete.
+    """
+    values = {k.decode(): v.decode() for k, v in fields.items()}
+    if values.get("missing") == "1":
+        return {"price": 0.0, "as_of": "", "fetched_at": float(values.get("fetched_at", 0)), "missing": True}
+    if "price" not in values:
+        return None
+    return {
+        "price": float(values["price"]),
+        "as_of": values.get("as_of", ""),
+        "fetched_at": float(values.get("fetched_at", 0)),
+        "missing": False,
+    }
+
+
+def migrate_legacy_records(client: redis.Redis, scan_count: int = 500) -> dict[str, int]:
+    """
+    Rewrites stock and quote entries still stored as hashes into binary records.
+
+    Keys are visited with SCAN, so the server is never blocked, and each key keeps its
+    remaining TTL. Entries that cannot be parsed are deleted; the caches refill them.
+    SET replaces the hash in place, so readers never see the key disappear.
+
+    Args:
+        client (redis.Redis): The Redis client to migrate.
+        scan_count (int): The SCAN batch size hint.
+
+    Returns:
+        dict: The number of stock and quote records migrated and of entries dropped.
+    """
+    counts = {"stocks": 0, "quotes": 0, "dropped": 0}
+    for pattern, decode, encode, counter in (
+        ("stock:*", decode_legacy_stock,
+         lambda v: encode_stock(v["id"], v["symbol"], v["price"], v["quantity"]), "stocks"),
+        ("quote:*", decode_legacy_quote,
+         lambda v: encode_quote(v["price"], v["as_of"], v["fetched_at"], v["missing"]), "quotes"),
+    ):
+        for key in client.scan_iter(match=pattern, count=scan_count, _type="hash"):
+            with client.pipeline() as pipe:
+                try:
+                    # A writer that replaces the key while we convert it wins
+                    pipe.watch(key)
+                    fields, ttl_ms = pipe.hgetall(key), pipe.pttl(key)
+                    values = decode(fields) if fields else None
+                    pipe.multi()
+                    if values is None:
+                        pipe.delete(key)
+                    else:
+                        pipe.set(key, encode(values), px=ttl_ms if ttl_ms > 0 else None)
+                    pipe.execute()
+                except (redis.WatchError, redis.ResponseError):
+                    continue
+            counts[counter if values is not None else "dropped"] += 1
+    logger.info("Migrated %d stock and %d quote cache records (%d dropped)",
+                counts["stocks"], counts["quotes"], counts["dropped"])
+    return counts
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+import secrets
+import threading
+from typing import Optional
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", 3600))  # Seconds of inactivity before a session token expires
+SESSION_TOKEN_BYTES = 32  # Random bytes per token
+
+
+class SessionStore:
+    """
+    Opaque session tokens stored in Redis, mapped to a user id and username.
+
+    Each token is stored under `session:{sha256(token)}` so the tokens themselves
+    never sit in Redis. The TTL slides: every successful lookup pushes expiry out by
+    another `ttl` seconds, in the same GETEX round trip that reads the user, so
+    authenticating a request is a single O(1) Redis call and no SQL.
+
+    Attributes:
+        hits (int): Number of lookups that found a live session.
+        misses (int): Number of lookups with an unknown or expired token.
+    """
+
+    def __init__(self, prefix: str = "session", ttl: int = SESSION_TTL):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, token: str) -> str:
+        return f"{self.prefix}:{hashlib.sha256(token.encode()).hexdigest()}"
+
+    def create(self, user_id: int, username: str) -> str:
+        """
+        Issues a new session token for a user.
+
+        Args:
+            user_id (int): The authenticated user's id.
+            username (str): The authenticated user's username.
+
+        Returns:
+            str: The token to hand to the client.
+        """
+        token = secrets.token_urlsafe(SESSION_TOKEN_BYTES)
+        redis_client.set(self._key(token), f"{user_id}:{username}", ex=self.ttl)
+        logger.info("Session created for user ID %d", user_id)
+        return token
+
+    def authenticate(self, token: str) -> Optional[tuple[int, str]]:
+        """
+        Returns the user for a session token and extends its expiry.
+
+        Args:
+            token (str): The token presented by the client.
+
+        Returns:
+            tuple | None: The user id and username, or None if the token is unknown or has expired.
+        """
+        value = redis_client.getex(self._key(token), ex=self.ttl) if token else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        user_id, _, username = value.decode().partition(":")  # The id never holds a colon; a username may
+        return int(user_id), username
+
+    def revoke(self, token: str) -> bool:
+        """
+        Ends a session.
+
+        Args:
+            token (str): The session token.
+
+        Returns:
+            bool: True if the token was live.
+        """
+        return bool(redis_client.delete(self._key(token)))
+
+    def stats(self) -> dict:
+        """
+        Returns the lookup counters.
+
+        Returns:
+            dict: Hit and miss counts and the session TTL.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+session_store = SessionStore()
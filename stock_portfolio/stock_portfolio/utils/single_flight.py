@@ -0,0 +1,193 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+import uuid
+
+import redis
+from redis.commands.core import Script
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", 10))  # Seconds a lock outlives a leader that stopped renewing it
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05  # Seconds between checks of a peer process's lock
+
+# Only delete the lock if we still own it, so an expired lock taken over by a peer is left alone
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Extend the lock only if we still own it
+_EXTEND_SCRIPT = Script(None, b"""
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+""")
+
+
+class _Call:
+    """An in-flight call that followers in the same process wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key so that only one of them does the work.
+
+    Inside a process, the first caller for a key becomes the leader and runs the
+    function; concurrent callers block until it finishes and share its result or
+    exception. Across processes, the leader takes a short-lived Redis lock; a leader
+    in another process that finds the lock taken waits for it to be released and then
+    asks `wait_for_peer` for the result the peer produced (typically a cache lookup).
+    The lock is renewed every third of `lock_ttl` while the work runs, however long
+    the upstream call (budget wait and read timeouts included) takes, so it only
+    expires early when its holder has died.
+
+    Attributes:
+        leader_calls (int): Number of calls that actually ran the function.
+        coalesced_local (int): Number of calls that shared a result from the same process.
+        coalesced_remote (int): Number of calls that shared a result from another process.
+    """
+
+    def __init__(self, prefix: str = "singleflight", lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL):
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.leader_calls = 0
+        self.coalesced_local = 0
+        self.coalesced_remote = 0
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], wait_for_peer: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Runs `fn` once for all concurrent callers of `key`.
+
+        Args:
+            key (str): The key identifying the work (e.g. a stock symbol).
+            fn (Callable): The function to run if this caller becomes the leader.
+            wait_for_peer (Callable, optional): Returns the result produced by another
+                process, or None if there is none. Without it, cross-process
+                coalescing is skipped.
+
+        Returns:
+            Any: The result of `fn` (or of the peer process's call).
+
+        Raises:
+            Exception: Whatever `fn` raised, re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.coalesced_local += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_leader(key, fn, wait_for_peer)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run_leader(self, key: str, fn: Callable[[], Any], wait_for_peer: Optional[Callable[[], Any]]) -> Any:
+        if wait_for_peer is None:
+            return self._run(fn)
+
+        lock_key = f"{self.prefix}:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except redis.RedisError as e:
+            logger.warning("Single-flight lock unavailable for %s, running locally: %s", key, str(e))
+            return self._run(fn)
+
+        if acquired:
+            done = threading.Event()
+            threading.Thread(target=self._keep_lock, args=(key, lock_key, token, done),
+                             name="single-flight-lock", daemon=True).start()
+            try:
+                return self._run(fn)
+            finally:
+                done.set()
+                try:
+                    redis_client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except redis.RedisError as e:
+                    logger.warning("Failed to release single-flight lock for %s: %s", key, str(e))
+
+        # Another process is doing the work; wait for it to finish, then reuse its result.
+        # The peer keeps the lock alive while it runs, and a dead peer's lock expires.
+        logger.debug("Waiting on peer process for %s", key)
+        while True:
+            time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+            try:
+                if not redis_client.exists(lock_key):
+                    break
+            except redis.RedisError:
+                break
+
+        result = wait_for_peer()
+        if result is not None:
+            with self._lock:
+                self.coalesced_remote += 1
+            return result
+        return self._run(fn)
+
+    def _keep_lock(self, key: str, lock_key: str, token: str, done: threading.Event) -> None:
+        """Renews the cross-process lock until the leader is done, or the lock is lost."""
+        while not done.wait(self.lock_ttl / 3):
+            try:
+                if not _EXTEND_SCRIPT(keys=[lock_key], args=[token, int(self.lock_ttl * 1000)], client=redis_client):
+                    logger.warning("Single-flight lock for %s expired while the call was running", key)
+                    return
+            except redis.RedisError as e:
+                logger.warning("Failed to renew single-flight lock for %s: %s", key, str(e))
+                return
+
+    def _run(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.leader_calls += 1
+        return fn()
+
+    def stats(self) -> dict:
+        """
+        Returns the coalescing counters.
+
+        Returns:
+            dict: Leader, locally coalesced and remotely coalesced call counts.
+        """
+        with self._lock:
+            return {
+                "leader_calls": self.leader_calls,
+                "coalesced_local": self.coalesced_local,
+                "coalesced_remote": self.coalesced_remote,
+            }
+
+
+price_flight = SingleFlight(prefix="singleflight:quote")
@@ -0,0 +1,236 @@
+from datetime import datetime, timezone
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import redis
+from redis.commands.core import Script
+
+from stock_portfolio.clients.redis_client import redis_client
+from stock_portfolio.utils.logger import configure_logger
+
+
+logger = logging.getLogger(__name__)
+configure_logger(logger)
+
+
+ALPHA_VANTAGE_PER_MINUTE = int(os.getenv("ALPHA_VANTAGE_PER_MINUTE", 5))
+ALPHA_VANTAGE_PER_DAY = int(os.getenv("ALPHA_VANTAGE_PER_DAY", 500))
+UPSTREAM_INTERACTIVE_WAIT = float(os.getenv("UPSTREAM_INTERACTIVE_WAIT", 5))  # Max seconds a user request waits for budget
+UPSTREAM_BACKGROUND_WAIT = float(os.getenv("UPSTREAM_BACKGROUND_WAIT", 120))  # Max seconds a background job waits
+UPSTREAM_THROTTLE_COOLDOWN = float(os.getenv("UPSTREAM_THROTTLE_COOLDOWN", 60))  # Pause after an upstream throttle notice
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Atomically refill the per-minute bucket and take a token, honouring the daily cap and
+# any throttle cooldown. Returns {granted, retry_after_ms}.
+_TAKE_SCRIPT = Script(None, b"""
+local cooldown = redis.call('pttl', KEYS[3])
+if cooldown > 0 then
+    return {0, cooldown}
+end
+
+local day_limit = tonumber(ARGV[3])
+local used_today = tonumber(redis.call('get', KEYS[2]) or '0')
+if used_today >= day_limit then
+    local reset = redis.call('pttl', KEYS[2])
+    if reset < 0 then reset = 60000 end
+    return {0, reset}
+end
+
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2]) / 1000.0  -- tokens per millisecond
+local t = redis.call('time')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+if tokens < 1 then
+    redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+    redis.call('pexpire', KEYS[1], 120000)
+    return {0, math.ceil((1 - tokens) / rate)}
+end
+
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens - 1), 'ts', now)
+redis.call('pexpire', KEYS[1], 120000)
+if redis.call('incr', KEYS[2]) == 1 then
+    redis.call('expire', KEYS[2], 90000)
+end
+return {1, 0}
+""")
+
+
+class QuotaExceededError(ConnectionError):
+    """Raised when the upstream request budget does not allow a call in time."""
+
+
+class UpstreamThrottledError(ConnectionError):
+    """Raised when the upstream API answered with a rate-limit notice instead of data."""
+
+
+class _LocalBucket:
+    """In-process fallback for the shared budget when Redis is unavailable."""
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.ts = time.monotonic()
+        self.per_day = per_day
+        self.day = None
+        self.used_today = 0
+        self.cooldown_until = 0.0
+
+    def take(self) -> tuple[bool, float]:
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            return False, self.cooldown_until - now
+        today = datetime.now(timezone.utc).date()
+        if today != self.day:
+            self.day, self.used_today = today, 0
+        if self.used_today >= self.per_day:
+            return False, 60.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens < 1:
+            return False, (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        self.used_today += 1
+        return True, 0.0
+
+    def throttle(self, cooldown: float) -> None:
+        self.tokens = 0.0
+        self.cooldown_until = time.monotonic() + cooldown
+
+
+class UpstreamScheduler:
+    """
+    Gates calls to a rate-limited upstream API behind a shared request budget.
+
+    The budget is a per-minute token bucket plus a daily cap, kept in Redis so that
+    every worker process draws from the same allowance (with an in-process bucket as a
+    fallback if Redis is down). Waiting callers are served in priority order, so
+    interactive requests go ahead of background refreshes. When the upstream reports
+    that it is throttling us, the budget is drained and paused for a cooldown.
+
+    Attributes:
+        granted (int): Number of calls allowed through.
+        rejected (int): Number of calls that gave up waiting for budget.
+        throttled (int): Number of upstream throttle notices reported.
+    """
+
+    def __init__(self, name: str, per_minute: int, per_day: int):
+        self.name = name
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.granted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self._local = _LocalBucket(per_minute, per_day)
+        self._waiting: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _keys(self) -> list[str]:
+        today = datetime.now(timezone.utc).strftime("%Y%m%d")
+        return [f"upstream:{self.name}:bucket", f"upstream:{self.name}:day:{today}", f"upstream:{self.name}:cooldown"]
+
+    def _take(self) -> tuple[bool, float]:
+        try:
+            granted, retry_ms = _TAKE_SCRIPT(
+                keys=self._keys(), args=[self.per_minute, self.per_minute / 60.0, self.per_day],
+                client=redis_client,
+            )
+            return bool(int(granted)), int(retry_ms) / 1000.0
+        except redis.RedisError as e:
+            logger.warning("Shared %s budget unavailable, using local budget: %s", self.name, str(e))
+            return self._local.take()
+
+    def run(self, fn: Callable[[], Any], priority: int = PRIORITY_INTERACTIVE, max_wait: Optional[float] = None) -> Any:
+        """
+        Runs `fn` once the budget allows it.
+
+        Args:
+            fn (Callable): The upstream call to make.
+            priority (int): Lower values are served first (PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND).
+            max_wait (float, optional): Seconds to wait for budget before giving up. Defaults to
+                UPSTREAM_INTERACTIVE_WAIT or UPSTREAM_BACKGROUND_WAIT depending on priority.
+
+        Returns:
+            Any: The result of `fn`.
+
+        Raises:
+            QuotaExceededError: If no budget became available within `max_wait`.
+        """
+        if max_wait is None:
+            max_wait = UPSTREAM_INTERACTIVE_WAIT if priority <= PRIORITY_INTERACTIVE else UPSTREAM_BACKGROUND_WAIT
+        deadline = time.monotonic() + max_wait
+        ticket = (priority, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    retry_after = None
+                    # Only the highest-priority waiter competes for the shared budget
+                    if self._waiting[0] == ticket:
+                        granted, retry_after = self._take()
+                        if granted:
+                            self.granted += 1
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise QuotaExceededError(f"{self.name} request budget exhausted; try again later.")
+                    self._cond.wait(min(retry_after, remaining) if retry_after is not None else remaining)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+        return fn()
+
+    def report_throttled(self, cooldown: float = UPSTREAM_THROTTLE_COOLDOWN) -> None:
+        """
+        Drains the budget after the upstream reported that we are over its limit.
+
+        Args:
+            cooldown (float): Seconds during which no further calls are allowed.
+        """
+        logger.warning("%s reported throttling; pausing upstream calls for %.0fs", self.name, cooldown)
+        with self._cond:
+            self.throttled += 1
+            self._local.throttle(cooldown)
+        bucket_key, _, cooldown_key = self._keys()
+        try:
+            pipe = redis_client.pipeline()
+            pipe.set(cooldown_key, 1, px=int(cooldown * 1000))
+            pipe.hset(bucket_key, "tokens", 0)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning("Failed to share %s throttle state: %s", self.name, str(e))
+
+    def stats(self) -> dict:
+        """
+        Returns the scheduler counters.
+
+        Returns:
+            dict: Granted, rejected and throttled counts and the number of waiting callers.
+        """
+        with self._cond:
+            return {
+                "granted": self.granted,
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+                "waiting": len(self._waiting),
+            }
+
+
+alpha_vantage_scheduler = UpstreamScheduler("alphavantage", ALPHA_VANTAGE_PER_MINUTE, ALPHA_VANTAGE_PER_DAY)
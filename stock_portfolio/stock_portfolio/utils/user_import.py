@@ -0,0 +1,74 @@
+import csv
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+
+PROVISION_CHUNK_SIZE = int(os.getenv("PROVISION_CHUNK_SIZE", 1000))  # Users hashed and inserted per batch
+
+USER_FILE_FORMATS = {
+    ".csv": "csv",
+    "text/csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def user_file_format(name: Optional[str]) -> Optional[str]:
+    """
+    Works out the format of a user file from its name or content type.
+
+    Args:
+        name (str | None): A file name, or a MIME type (parameters are ignored).
+
+    Returns:
+        str | None: "csv", "ndjson", or None if the format is not recognised.
+    """
+    if not name:
+        return None
+    name = name.split(";")[0].strip().lower()
+    return USER_FILE_FORMATS.get(name) or USER_FILE_FORMATS.get(os.path.splitext(name)[1])
+
+
+def read_user_rows(lines: Iterable[str], fmt: str) -> Iterator[dict]:
+    """
+    Parses a user file one row at a time, so files of any size are read in constant memory.
+
+    CSV files need a header row with `username` and `password` columns; NDJSON files
+    hold one `{"username": ..., "password": ...}` object per line. Rows that cannot be
+    parsed are yielded with an `error` instead of being dropped, so they appear in the
+    provisioning report.
+
+    Args:
+        lines (Iterable[str]): The file's lines (a text file opened with newline="" for CSV).
+        fmt (str): "csv" or "ndjson".
+
+    Yields:
+        dict: The row's line number, `username` and `password`, and `error` if it is malformed.
+
+    Raises:
+        ValueError: If the format is unknown or a CSV file lacks the required columns.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or not {"username", "password"} <= set(reader.fieldnames):
+            raise ValueError("CSV user files need a header row with 'username' and 'password' columns")
+        for row in reader:
+            yield {"line": reader.line_num, "username": row["username"], "password": row["password"]}
+    elif fmt == "ndjson":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield {"line": number, "error": "Malformed JSON"}
+                continue
+            if not isinstance(row, dict):
+                yield {"line": number, "error": "Expected a JSON object"}
+                continue
+            yield {"line": number, "username": row.get("username"), "password": row.get("password")}
+    else:
+        raise ValueError(f"Unsupported user file format '{fmt}'")
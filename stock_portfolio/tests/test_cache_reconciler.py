@@ -0,0 +1,178 @@
+import pytest
+import redis
+from sqlalchemy import update
+
+from stock_portfolio.db import db
+from stock_portfolio.models.stock_model import STOCK_CACHE_INDEX, STOCK_CACHE_SYMBOLS, UserStocks
+from stock_portfolio.utils import cache_reconciler as reconciler_module
+from stock_portfolio.utils.cache_reconciler import RECONCILE_LEASE_KEY, CacheReconciler, checksum
+from stock_portfolio.utils.record_codec import encode_stock
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', mock_redis)
+    mocker.patch.object(reconciler_module, "redis_client", mock_redis)
+    mock_redis.scan.return_value = (0, [])
+    return mock_redis
+
+
+@pytest.fixture
+def stocks(session, mock_redis):
+    for symbol in ["AAPL", "IBM", "MSFT"]:
+        UserStocks.add_stock(symbol)
+    return {stock.symbol: stock for stock in UserStocks.query.all()}
+
+
+@pytest.fixture
+def reconciler(app):
+    return CacheReconciler(app, batch_size=2)
+
+
+def record_for(stock):
+    return encode_stock(stock.id, stock.symbol, stock.price, stock.quantity)
+
+
+def compare_and_set_calls(pipe):
+    """Returns (key, expected, new) for each compare-and-set queued on a pipeline."""
+    return [(call.args[2], call.args[3], call.args[4]) for call in pipe.evalsha.call_args_list]
+
+
+def test_checksum_treats_absent_as_zero():
+    """Test that a missing record never matches a real one."""
+    assert checksum(None) == 0
+    assert checksum(b"record") != 0
+
+
+def test_consistent_cache_needs_no_repair(reconciler, stocks, mock_redis):
+    """Test that a pass over an in-sync cache reports no drift and writes nothing."""
+    pipe = mock_redis.pipeline.return_value
+    ordered = sorted(stocks.values(), key=lambda s: s.id)
+    pipe.execute.side_effect = [
+        [[record_for(s) for s in ordered[:2]], [1, 1], [str(s.id).encode() for s in ordered[:2]]],
+        [[record_for(ordered[2])], [1], [str(ordered[2].id).encode()]],
+    ]
+
+    drift = reconciler.run_pass()
+
+    assert drift == {"missing": 0, "stale": 0, "orphaned": 0, "index": 0}
+    assert reconciler.stats()["counts"]["checked"] == 3
+    assert reconciler.stats()["passes"] == 1
+    pipe.evalsha.assert_not_called()
+
+
+def test_missing_and_stale_records_are_repaired(reconciler, stocks, mock_redis):
+    """Test that missing and stale records are rewritten with a compare-and-set against what was read."""
+    pipe = mock_redis.pipeline.return_value
+    aapl, ibm = stocks["AAPL"], stocks["IBM"]
+    stale = encode_stock(ibm.id, ibm.symbol, ibm.price, 99)
+    pipe.execute.side_effect = [
+        [[None, stale], [1, 1], [str(aapl.id).encode(), str(ibm.id).encode()]],
+        [],
+    ]
+
+    reconciler.step()
+
+    assert compare_and_set_calls(pipe) == [
+        (f"stock:{aapl.id}", b"", record_for(aapl)),
+        (f"stock:{ibm.id}", stale, record_for(ibm)),
+    ]
+    assert reconciler.counts["missing"] == 1
+    assert reconciler.counts["stale"] == 1
+
+
+def test_write_through_after_select_is_not_overwritten(reconciler, stocks, mock_redis):
+    """Test that a record written between the row select and the MGET is compared against the row as committed."""
+    pipe = mock_redis.pipeline.return_value
+    aapl, ibm = stocks["AAPL"], stocks["IBM"]
+
+    def write_through_lands():
+        db.session.execute(update(UserStocks).where(UserStocks.id == ibm.id).values(quantity=7))
+        db.session.commit()
+        newer = encode_stock(ibm.id, ibm.symbol, ibm.price, 7)
+        return [[record_for(aapl), newer], [1, 1], [str(aapl.id).encode(), str(ibm.id).encode()]]
+
+    pipe.execute.side_effect = write_through_lands
+
+    reconciler.step()
+
+    pipe.evalsha.assert_not_called()
+    assert reconciler.counts["stale"] == 0
+
+
+def test_lease_gates_background_steps(reconciler, mock_redis):
+    """Test that the background worker only steps while it holds or renews the lease."""
+    mock_redis.set.return_value = True
+    assert reconciler._acquire_lease() is True
+    assert mock_redis.set.call_args.args[:2] == (RECONCILE_LEASE_KEY, reconciler._owner)
+    assert mock_redis.set.call_args.kwargs["nx"] is True
+
+    mock_redis.set.return_value = None
+    mock_redis.evalsha.return_value = 0  # Held by another worker
+    assert reconciler._acquire_lease() is False
+
+    mock_redis.set.side_effect = redis.ConnectionError("down")
+    assert reconciler._acquire_lease() is True
+
+
+def test_index_drift_is_repaired(reconciler, stocks, mock_redis):
+    """Test that rows absent from the index or symbol map are added back."""
+    pipe = mock_redis.pipeline.return_value
+    aapl, ibm = stocks["AAPL"], stocks["IBM"]
+    pipe.execute.side_effect = [
+        [[record_for(aapl), record_for(ibm)], [0, 1], [str(aapl.id).encode(), None]],
+        [],
+    ]
+
+    reconciler.step()
+
+    pipe.sadd.assert_any_call(STOCK_CACHE_INDEX, aapl.id)
+    pipe.hset.assert_any_call(STOCK_CACHE_SYMBOLS, "IBM", ibm.id)
+    assert reconciler.counts["index"] == 2
+    pipe.evalsha.assert_not_called()
+
+
+def test_orphaned_records_are_removed(reconciler, stocks, mock_redis):
+    """Test that cached records without a live row are deleted along with their index entries."""
+    pipe = mock_redis.pipeline.return_value
+    ghost = encode_stock(999, "GHOST", 1.0, 0)
+    reconciler._phase = "cache"
+    mock_redis.scan.return_value = (0, [f"stock:{stocks['AAPL'].id}".encode(), b"stock:999"])
+    mock_redis.mget.return_value = [ghost]
+    mock_redis.hmget.return_value = [b"999"]
+
+    assert reconciler.step() is True
+
+    assert compare_and_set_calls(pipe) == [(b"stock:999", ghost, b"")]
+    pipe.srem.assert_called_once_with(STOCK_CACHE_INDEX, 999)
+    pipe.hdel.assert_called_once_with(STOCK_CACHE_SYMBOLS, "GHOST")
+    assert reconciler.stats()["last_pass_drift"]["orphaned"] == 1
+
+
+def test_orphan_keeps_symbol_owned_by_newer_row(reconciler, stocks, mock_redis):
+    """Test that removing an orphan does not drop a symbol mapping that now points elsewhere."""
+    pipe = mock_redis.pipeline.return_value
+    reconciler._phase = "cache"
+    mock_redis.scan.return_value = (0, [b"stock:999"])
+    mock_redis.mget.return_value = [encode_stock(999, "AAPL", 1.0, 0)]
+    mock_redis.hmget.return_value = [str(stocks["AAPL"].id).encode()]
+
+    reconciler.step()
+
+    pipe.hdel.assert_not_called()
+
+
+def test_steps_are_incremental(reconciler, stocks, mock_redis):
+    """Test that each step handles one batch and resumes after the last id it saw."""
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [[None, None], [1, 1], [None, None]]
+
+    assert reconciler.step() is False
+    first = reconciler._last_id
+    pipe.execute.return_value = [[None], [1], [None]]
+    assert reconciler.step() is False
+
+    assert reconciler._last_id > first
+    assert reconciler.counts["checked"] == 3
+    assert reconciler.passes == 0
@@ -0,0 +1,79 @@
+import pytest
+
+from stock_portfolio.utils import circuit_breaker as breaker_module
+from stock_portfolio.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(mocker):
+    now = [1000.0]
+    mocker.patch.object(breaker_module.time, "monotonic", side_effect=lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("upstream", failure_types=(ConnectionError,), failure_threshold=2, reset_timeout=30)
+
+
+def fail(breaker, error=ConnectionError("down")):
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+
+def test_opens_after_consecutive_failures(breaker):
+    """Test that the breaker trips after the threshold and then refuses calls."""
+    fail(breaker)
+    assert breaker.state == "closed"
+    fail(breaker)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError, match="upstream is unavailable"):
+        with breaker.guard():
+            pass
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["trips"] == 1
+
+
+def test_success_resets_failure_count(breaker):
+    """Test that only consecutive failures count towards tripping."""
+    fail(breaker)
+    with breaker.guard():
+        pass
+    fail(breaker)
+
+    assert breaker.state == "closed"
+
+
+def test_other_errors_do_not_count(breaker):
+    """Test that errors outside failure_types leave the breaker alone."""
+    for _ in range(3):
+        fail(breaker, LookupError("unknown symbol"))
+
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_closes_on_success(breaker, clock):
+    """Test that a successful trial after the reset timeout closes the breaker."""
+    fail(breaker)
+    fail(breaker)
+    clock[0] += 30
+
+    assert breaker.allow()
+    with breaker.guard():
+        assert not breaker.allow()  # The only trial slot is taken
+    assert breaker.state == "closed"
+
+
+def test_half_open_trial_failure_reopens(breaker, clock):
+    """Test that a failed trial opens the breaker for another reset timeout."""
+    fail(breaker)
+    fail(breaker)
+    clock[0] += 30
+
+    fail(breaker)
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["trips"] == 2
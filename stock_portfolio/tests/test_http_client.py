@@ -0,0 +1,86 @@
+import pytest
+import requests
+
+from stock_portfolio.clients.http_client import HttpClient
+
+
+@pytest.fixture
+def client(mocker):
+    client = HttpClient(connect_timeout=1, read_timeout=2, max_retries=2, backoff_base=0)
+    mocker.patch.object(client, "_sleep_backoff")
+    return client
+
+
+def make_response(mocker, status_code):
+    response = mocker.Mock()
+    response.status_code = status_code
+    return response
+
+
+def test_get_uses_default_timeouts(client, mocker):
+    """Test that requests carry the configured connect and read timeouts."""
+    mock_request = mocker.patch.object(client.session, "request", return_value=make_response(mocker, 200))
+
+    client.get("https://example.com/quote")
+
+    mock_request.assert_called_once_with("GET", "https://example.com/quote", timeout=(1, 2))
+
+
+def test_get_retries_connection_errors(client, mocker):
+    """Test that idempotent requests are retried after connection errors."""
+    ok = make_response(mocker, 200)
+    mock_request = mocker.patch.object(
+        client.session, "request", side_effect=[requests.ConnectionError("reset"), ok]
+    )
+
+    assert client.get("https://example.com/quote") is ok
+    assert mock_request.call_count == 2
+    assert client.stats()["example.com"]["errors"] == 1
+
+
+def test_get_gives_up_after_max_retries(client, mocker):
+    """Test that the last timeout is raised once the retries are exhausted."""
+    mock_request = mocker.patch.object(client.session, "request", side_effect=requests.Timeout)
+
+    with pytest.raises(requests.Timeout):
+        client.get("https://example.com/quote")
+    assert mock_request.call_count == 3
+
+
+def test_retryable_status_is_retried(client, mocker):
+    """Test that 503 responses are retried and the final response returned."""
+    busy, ok = make_response(mocker, 503), make_response(mocker, 200)
+    mocker.patch.object(client.session, "request", side_effect=[busy, ok])
+
+    assert client.get("https://example.com/quote") is ok
+
+
+def test_retries_can_be_turned_off_per_request(client, mocker):
+    """Test that max_retries=0 makes exactly one attempt, returning a retryable status as-is."""
+    throttled = make_response(mocker, 429)
+    mock_request = mocker.patch.object(client.session, "request", return_value=throttled)
+
+    assert client.get("https://example.com/quote", max_retries=0) is throttled
+    assert mock_request.call_count == 1
+
+
+def test_post_is_not_retried(client, mocker):
+    """Test that non-idempotent requests are never retried."""
+    mock_request = mocker.patch.object(client.session, "request", side_effect=requests.ConnectionError("reset"))
+
+    with pytest.raises(requests.ConnectionError):
+        client.request("POST", "https://example.com/orders")
+    assert mock_request.call_count == 1
+
+
+def test_stats_are_per_host(client, mocker):
+    """Test that latency is tracked separately for each host."""
+    mocker.patch.object(client.session, "request", return_value=make_response(mocker, 200))
+
+    client.get("https://a.example.com/")
+    client.get("https://a.example.com/")
+    client.get("https://b.example.com/")
+
+    stats = client.stats()
+    assert stats["a.example.com"]["count"] == 2
+    assert stats["b.example.com"]["count"] == 1
@@ -0,0 +1,56 @@
+import os
+
+import fakeredis
+
+from stock_portfolio.clients.lazy_client import LazyClient
+
+
+def test_client_is_created_on_first_use(mocker):
+    """Test that the factory runs on the first lookup only, and lookups reach the client."""
+    factory = mocker.MagicMock()
+    client = LazyClient(factory, "test")
+    factory.assert_not_called()
+
+    client.ping()
+    client.ping()
+    assert client["sessions"] is factory.return_value.__getitem__.return_value
+
+    factory.assert_called_once()
+    assert factory.return_value.ping.call_count == 2
+
+
+def test_new_process_gets_its_own_client(mocker):
+    """Test that a client created before a fork is not reused in the child."""
+    factory = mocker.Mock(side_effect=[mocker.Mock(name="parent"), mocker.Mock(name="child")])
+    client = LazyClient(factory, "test")
+    parent = client._instance()
+
+    mocker.patch.object(os, "getpid", return_value=os.getpid() + 1)
+
+    assert client._instance() is not parent
+    assert factory.call_count == 2
+
+
+def test_reset_forgets_client(mocker):
+    """Test that a reset client is created again on next use, without closing the old one."""
+    factory = mocker.Mock()
+    client = LazyClient(factory, "test")
+    old = client._instance()
+
+    client.reset()
+    assert "not created" in repr(client)
+    client._instance()
+
+    old.close.assert_not_called()
+    assert factory.call_count == 2
+
+
+def test_redis_commands_pass_through():
+    """Test that client commands sharing a name with the stand-in's own methods reach a real client."""
+    server = fakeredis.FakeServer()
+    client = LazyClient(lambda: fakeredis.FakeStrictRedis(server=server), "Redis")
+
+    client.set("stock:1", b"record")
+
+    assert client.get("stock:1") == b"record"
+    assert client.get("stock:2") is None
@@ -0,0 +1,153 @@
+import os
+
+import pytest
+import redis
+
+from stock_portfolio.utils import local_cache as local_cache_module
+from stock_portfolio.utils.local_cache import INVALIDATION_CHANNEL, LocalCache, approx_size, publish_invalidation
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch.object(local_cache_module, "redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture
+def cache():
+    cache = LocalCache(ttl=60, max_entries=3, max_bytes=1024 * 1024)
+    cache.enabled = True
+    cache._listener_pid = os.getpid()  # Do not start the invalidation listener
+    return cache
+
+
+##########################################################
+# Reads and writes
+##########################################################
+
+def test_disabled_cache_passes_through():
+    """Test that a disabled cache stores nothing and always calls the loader."""
+    cache = LocalCache()
+    cache.set("k", 1)
+
+    assert cache.get("k") is None
+    assert cache.get_or_load("k", lambda: 2) == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_get_or_load_caches_value(cache):
+    """Test that a loaded value is served from the cache afterwards."""
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return "value"
+
+    assert cache.get_or_load("k", loader) == "value"
+    assert cache.get_or_load("k", loader) == "value"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_by_entries(cache):
+    """Test that the least recently used entry is evicted once the entry cap is reached."""
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("d", 4)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["entries"] == 3
+
+
+def test_eviction_by_memory_cap():
+    """Test that entries are evicted to keep the cache under its memory cap."""
+    value = "x" * 400
+    cache = LocalCache(ttl=60, max_entries=100, max_bytes=approx_size(value) * 2)
+    cache.enabled = True
+    cache._listener_pid = os.getpid()
+
+    for key in "abc":
+        cache.set(key, value)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get("a") is None
+
+
+def test_entries_expire(cache, mocker):
+    """Test that entries are not served past their TTL."""
+    now = [1000.0]
+    mocker.patch.object(local_cache_module.time, "monotonic", side_effect=lambda: now[0])
+    cache.set("k", 1, ttl=5)
+
+    now[0] += 4
+    assert cache.get("k") == 1
+    now[0] += 2
+    assert cache.get("k") is None
+
+
+def test_load_racing_an_invalidation_is_not_cached(cache):
+    """Test that a value loaded while the key was invalidated is returned but not cached."""
+    def loader():
+        cache.invalidate(["k"])  # Another writer changed the key mid-load
+        return "old"
+
+    assert cache.get_or_load("k", loader) == "old"
+    assert cache.get("k") is None
+
+
+##########################################################
+# Invalidation
+##########################################################
+
+def test_publish_invalidation_drops_local_keys_and_queues_publish(mock_redis, mocker):
+    """Test that invalidations are applied locally and published on the shared channel."""
+    cache = LocalCache(ttl=60)
+    cache.enabled = True
+    cache._listener_pid = os.getpid()
+    mocker.patch.object(local_cache_module, "local_cache", cache)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    pipe = mocker.MagicMock()
+
+    publish_invalidation(["a", "b"], pipe)
+
+    assert cache.get("a") is None and cache.get("b") is None
+    pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, "a\nb")
+
+
+def test_listener_applies_published_invalidations(cache, mock_redis):
+    """Test that the listener thread drops keys named in channel messages."""
+    pubsub = mock_redis.pubsub.return_value
+
+    def deliver(timeout):
+        # Seeded after subscribing, which clears the cache
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache._stop.set()
+        return {"type": "message", "data": b"a"}
+
+    pubsub.get_message.side_effect = deliver
+    cache._listen()
+
+    pubsub.subscribe.assert_called_once_with(INVALIDATION_CHANNEL)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+def test_listener_clears_cache_when_redis_is_lost(cache, mock_redis):
+    """Test that losing the subscription drops every entry, since invalidations may be missed."""
+    cache.set("a", 1)
+
+    def fail(channel):
+        cache._stop.set()
+        raise redis.ConnectionError("down")
+
+    mock_redis.pubsub.return_value.subscribe.side_effect = fail
+    cache._listen()
+
+    assert cache.get("a") is None
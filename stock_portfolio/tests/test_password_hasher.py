@@ -0,0 +1,76 @@
+import pytest
+
+from stock_portfolio.utils.password_hasher import PasswordHasher, benchmark_logins, parse_hash
+
+SALT = "ab" * 16
+
+
+@pytest.fixture
+def scrypt_hasher():
+    return PasswordHasher("scrypt", {"n": 1024, "r": 8, "p": 1}, workers=0)
+
+
+def test_hash_stores_kdf_and_params(scrypt_hasher):
+    """Test that a hash records the KDF and parameters it was made with."""
+    stored = scrypt_hasher.hash("secret", SALT)
+
+    kdf, params, key = parse_hash(stored)
+    assert kdf == "scrypt"
+    assert params == {"n": 1024, "r": 8, "p": 1}
+    assert len(key) == 64
+
+
+def test_verify_uses_stored_params(scrypt_hasher):
+    """Test that a hash still verifies after the configured cost changes, and is then flagged for rehashing."""
+    stored = scrypt_hasher.hash("secret", SALT)
+    stronger = PasswordHasher("scrypt", {"n": 2048, "r": 8, "p": 1}, workers=0)
+
+    assert stronger.verify("secret", SALT, stored) is True
+    assert stronger.verify("wrong", SALT, stored) is False
+    assert stronger.needs_rehash(stored) is True
+    assert scrypt_hasher.needs_rehash(stored) is False
+
+
+def test_pbkdf2_and_legacy_hashes():
+    """Test PBKDF2 hashes and bare legacy SHA-256 digests."""
+    pbkdf2 = PasswordHasher("pbkdf2_sha256", {"i": 1000}, workers=0)
+    stored = pbkdf2.hash("secret", SALT)
+    legacy = "aa16d933576a62ef0f2af74eb2761340ea3c3f4412c455f5c792ac42edf4081b"
+
+    assert stored.startswith("pbkdf2_sha256$i=1000$")
+    assert pbkdf2.verify("secret", SALT, stored) is True
+    assert parse_hash(legacy) == ("sha256", {}, legacy)
+    assert pbkdf2.verify("secret", SALT, legacy) is True
+    assert pbkdf2.needs_rehash(legacy) is True
+
+
+def test_unknown_or_malformed_hashes_are_rejected(scrypt_hasher):
+    """Test that unknown KDFs and unparseable hashes raise ValueError."""
+    with pytest.raises(ValueError, match="Unknown password KDF 'md5'"):
+        PasswordHasher("md5")
+    with pytest.raises(ValueError, match="Unknown password KDF 'md5'"):
+        scrypt_hasher.verify("secret", SALT, "md5$x=1$abcd")
+    with pytest.raises(ValueError, match="Malformed password hash"):
+        scrypt_hasher.verify("secret", SALT, "scrypt$n=1024$ab$cd")
+
+
+def test_process_pool_hashing(scrypt_hasher):
+    """Test that hashes made in worker processes match inline ones and are timed."""
+    pooled = PasswordHasher("scrypt", {"n": 1024, "r": 8, "p": 1}, workers=1)
+    try:
+        assert pooled.hash("secret", SALT) == scrypt_hasher.hash("secret", SALT)
+        assert pooled.verify("secret", SALT, scrypt_hasher.hash("secret", SALT)) is True
+        assert pooled.hash_many([("a", SALT), ("b", SALT)]) == [scrypt_hasher.hash("a", SALT),
+                                                               scrypt_hasher.hash("b", SALT)]
+    finally:
+        pooled.shutdown()
+
+    assert pooled.stats()["latency"]["count"] == 2
+
+
+def test_benchmark_logins(scrypt_hasher):
+    """Test that the benchmark reports throughput and latency percentiles."""
+    result = benchmark_logins(scrypt_hasher, logins=8, concurrency=2)
+
+    assert result["logins_per_second"] > 0
+    assert 0 < result["p50_ms"] <= result["p99_ms"] <= result["max_ms"]
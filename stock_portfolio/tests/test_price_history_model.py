@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from stock_portfolio.db import db
+from stock_portfolio.models.price_history_model import PriceHistory
+
+
+@pytest.fixture
+def daily_data():
+    return {
+        "2024-03-06": {"1. open": "150.0", "2. high": "152.0", "3. low": "149.0", "4. close": "151.0", "5. volume": "1000"},
+        "2024-03-05": {"1. open": "148.0", "2. high": "150.5", "3. low": "147.0", "4. close": "150.0", "5. volume": "900"},
+        "2024-03-04": {"1. open": "147.0", "2. high": "148.5", "3. low": "146.0", "4. close": "148.0", "5. volume": "800"},
+    }
+
+
+def test_rows_from_daily_series(daily_data):
+    """Test converting an Alpha Vantage series into OHLCV rows."""
+    rows = PriceHistory.rows_from_daily_series("AAPL", daily_data)
+
+    assert rows[0] == {"symbol": "AAPL", "date": date(2024, 3, 6), "open": 150.0, "high": 152.0,
+                       "low": 149.0, "close": 151.0, "volume": 1000}
+    assert len(rows) == 3
+
+
+def test_bulk_upsert_and_range_query(session, daily_data):
+    """Test that history is stored in bulk and read back oldest first within a range."""
+    written = PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", daily_data))
+    session.commit()
+
+    assert written == 3
+    history = PriceHistory.get_history("AAPL", start=date(2024, 3, 5))
+    assert [bar["date"] for bar in history] == ["2024-03-05", "2024-03-06"]
+    assert history[-1]["close"] == 151.0
+
+
+def test_bulk_upsert_overwrites_existing_days(session, daily_data):
+    """Test that re-ingesting a day updates it instead of failing on the primary key."""
+    PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", daily_data))
+    daily_data["2024-03-06"]["4. close"] = "155.0"
+    PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", {"2024-03-06": daily_data["2024-03-06"]}))
+    session.commit()
+
+    assert PriceHistory.query.count() == 3
+    assert PriceHistory.get_history("AAPL", start=date(2024, 3, 6))[0]["close"] == 155.0
+
+
+def test_history_range_scan_is_covered_by_index(session):
+    """Test that the query behind get_history is answered from the covering index alone, in date order."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        PriceHistory.get_history("AAPL", start=date(2024, 3, 5), end=date(2024, 3, 6))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    statement, parameters = statements[-1]
+
+    plan = " ".join(row[-1] for row in session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+
+    assert "USING COVERING INDEX ix_price_history_symbol_date_ohlcv" in plan
+    assert "TEMP B-TREE" not in plan
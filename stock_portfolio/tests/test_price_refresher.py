@@ -0,0 +1,128 @@
+import fakeredis
+import pytest
+import redis
+
+from stock_portfolio.models.stock_model import UserStocks
+from stock_portfolio.utils import price_refresher as price_refresher_module
+from stock_portfolio.utils.price_refresher import PRICE_REFRESH_LEASE_KEY, PriceRefresher
+from stock_portfolio.utils.upstream_scheduler import PRIORITY_BACKGROUND
+
+
+@pytest.fixture(autouse=True)
+def mock_redis_client(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', mock_redis)
+    return mock_redis
+
+
+@pytest.fixture(autouse=True)
+def shared_redis(mocker):
+    """The Redis the refreshers of every worker share, for the lease and the refresh status."""
+    fake = fakeredis.FakeStrictRedis()
+    mocker.patch.object(price_refresher_module, "redis_client", fake)
+    return fake
+
+
+@pytest.fixture
+def refresher(app):
+    return PriceRefresher(app, window=0, batch_size=2)
+
+
+@pytest.fixture
+def held_stocks(session):
+    for symbol in ["AAPL", "IBM", "MSFT"]:
+        UserStocks.add_stock(symbol)
+        UserStocks.up_stock_quantity(symbol, 1)
+
+
+def test_refresh_cycle_refreshes_all_held_symbols_in_batches(refresher, held_stocks, mocker):
+    """Test that a cycle refreshes every held symbol in background-priority batches."""
+    mock_prices = mocker.patch.object(UserStocks, "get_stock_prices", side_effect=lambda symbols, **kwargs: (
+        {symbol: 1.0 for symbol in symbols}, {}
+    ))
+
+    refresher.refresh_cycle()
+
+    assert [call.args[0] for call in mock_prices.call_args_list] == [["AAPL", "IBM"], ["MSFT"]]
+    kwargs = mock_prices.call_args.kwargs
+    assert kwargs["priority"] == PRIORITY_BACKGROUND
+    assert kwargs["use_cache"] is False
+    assert set(refresher.lag()) == {"AAPL", "IBM", "MSFT"}
+    assert all(lag is not None for lag in refresher.lag().values())
+
+
+def test_refresh_cycle_takes_lease_for_one_window(app, held_stocks, shared_redis, mocker):
+    """Test that a cycle runs only after taking the cross-worker lease for the refresh window."""
+    refresher = PriceRefresher(app, window=30, batch_size=5)
+    mocker.patch.object(refresher._stop, "wait", return_value=False)
+    mock_prices = mocker.patch.object(UserStocks, "get_stock_prices", return_value=({}, {}))
+
+    refresher.refresh_cycle()
+
+    assert shared_redis.get(PRICE_REFRESH_LEASE_KEY) == refresher._owner.encode()
+    assert 29000 < shared_redis.pttl(PRICE_REFRESH_LEASE_KEY) <= 30000
+    mock_prices.assert_called_once()
+
+
+def test_refresh_cycle_skipped_while_another_worker_holds_lease(refresher, held_stocks, shared_redis, mocker):
+    """Test that a worker without the lease leaves the cycle to the worker that has it."""
+    shared_redis.set(PRICE_REFRESH_LEASE_KEY, "other-worker", px=30000)
+    mock_prices = mocker.patch.object(UserStocks, "get_stock_prices")
+    mocker.patch.object(refresher._stop, "wait", return_value=False)
+
+    refresher.refresh_cycle()
+
+    mock_prices.assert_not_called()
+    assert refresher.stats()["skipped_cycles"] == 1
+
+
+def test_refresh_cycle_runs_locally_without_redis(refresher, held_stocks, mocker):
+    """Test that a Redis outage does not stop prices from being refreshed or reported."""
+    mocker.patch.object(price_refresher_module, "redis_client", mocker.MagicMock(
+        set=mocker.MagicMock(side_effect=redis.ConnectionError("down")),
+        pipeline=mocker.MagicMock(side_effect=redis.ConnectionError("down")),
+    ))
+    mock_prices = mocker.patch.object(UserStocks, "get_stock_prices", side_effect=lambda symbols, **kwargs: (
+        {symbol: 1.0 for symbol in symbols}, {}
+    ))
+
+    refresher.refresh_cycle()
+
+    assert mock_prices.call_count == 2
+    assert all(lag is not None for lag in refresher.lag().values())
+
+
+def test_refresh_records_errors_and_lag(refresher, held_stocks, mocker):
+    """Test that failed symbols report their error and no refresh time."""
+    mocker.patch.object(UserStocks, "get_stock_prices", return_value=({"AAPL": 1.0}, {"IBM": "timed out"}))
+
+    refresher.refresh(["AAPL", "IBM"])
+
+    stats = refresher.stats()
+    assert stats["errors"] == {"IBM": "timed out"}
+    assert stats["lag_seconds"]["IBM"] is None
+    assert stats["lag_seconds"]["AAPL"] >= 0
+
+
+def test_status_is_shared_across_workers(app, held_stocks, mocker):
+    """Test that a worker that did not refresh reports the lag and errors of the worker that did."""
+    mocker.patch.object(UserStocks, "get_stock_prices", return_value=({"AAPL": 1.0}, {"IBM": "timed out"}))
+    holder, other = PriceRefresher(app, window=0), PriceRefresher(app, window=0)
+
+    holder.refresh(["AAPL", "IBM"])
+
+    stats = other.stats()
+    assert stats["errors"] == {"IBM": "timed out"}
+    assert stats["lag_seconds"]["AAPL"] >= 0
+    assert stats["lag_seconds"]["IBM"] is None
+    assert stats["lag_seconds"]["MSFT"] is None
+
+
+def test_start_and_stop(refresher, mocker):
+    """Test that the worker thread starts and stops cleanly."""
+    mocker.patch.object(refresher, "refresh_cycle", side_effect=lambda: refresher._stop.wait(1))
+
+    refresher.start()
+    assert refresher.stats()["running"]
+    refresher.stop()
+    assert not refresher._thread.is_alive()
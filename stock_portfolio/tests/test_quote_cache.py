@@ -0,0 +1,149 @@
+from datetime import datetime
+
+import pytest
+import redis
+
+from stock_portfolio.utils import quote_cache as quote_cache_module
+from stock_portfolio.utils.quote_cache import (
+    MARKET_TZ,
+    QUOTE_NEGATIVE_TTL,
+    QUOTE_STALE_TTL,
+    QUOTE_TTL_OPEN,
+    QuoteCache,
+    is_market_open,
+    quote_ttl,
+)
+from stock_portfolio.utils.record_codec import decode_quote, encode_quote
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch.object(quote_cache_module, "redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture
+def cache():
+    return QuoteCache()
+
+
+##########################################################
+# TTL
+##########################################################
+
+def test_market_open_on_weekday_session():
+    """Test that a weekday afternoon in New York is inside the session."""
+    assert is_market_open(datetime(2024, 3, 6, 11, 0, tzinfo=MARKET_TZ))
+
+
+def test_market_closed_on_weekend():
+    """Test that Saturdays are outside the session."""
+    assert not is_market_open(datetime(2024, 3, 9, 11, 0, tzinfo=MARKET_TZ))
+
+
+def test_quote_ttl_short_during_session():
+    """Test that quotes fetched during the session use the short TTL."""
+    assert quote_ttl(datetime(2024, 3, 6, 11, 0, tzinfo=MARKET_TZ)) == QUOTE_TTL_OPEN
+
+
+def test_quote_ttl_long_over_weekend():
+    """Test that quotes fetched on a weekend are kept far longer than during the session."""
+    assert quote_ttl(datetime(2024, 3, 9, 11, 0, tzinfo=MARKET_TZ)) > QUOTE_TTL_OPEN * 10
+
+
+##########################################################
+# Cache reads and writes
+##########################################################
+
+def fresh_ttl_ms():
+    return (QUOTE_STALE_TTL + QUOTE_TTL_OPEN) * 1000
+
+
+def test_get_miss(cache, mock_redis):
+    """Test that an absent key counts as a miss."""
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.return_value = [None, -2]
+
+    assert cache.get("AAPL") is None
+    assert cache.stats()["misses"] == 1
+    pipe.get.assert_called_once_with("quote:AAPL")
+    pipe.pttl.assert_called_once_with("quote:AAPL")
+
+
+def test_get_hit(cache, mock_redis):
+    """Test that a stored quote is decoded and counted as a hit."""
+    mock_redis.pipeline.return_value.execute.return_value = [encode_quote(150.25, "2024-03-06", 1.0), fresh_ttl_ms()]
+
+    quote = cache.get("AAPL")
+
+    assert quote.price == 150.25
+    assert quote.as_of == "2024-03-06"
+    assert not quote.missing
+    assert not quote.stale
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_past_ttl_is_stale(cache, mock_redis):
+    """Test that a quote in its stale window is still returned, marked stale."""
+    mock_redis.pipeline.return_value.execute.return_value = [encode_quote(150.25, "2024-03-06", 1.0), 60_000]
+
+    quote = cache.get("AAPL")
+
+    assert quote.price == 150.25
+    assert quote.stale
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_set_keeps_quote_for_stale_window(cache, mock_redis):
+    """Test that quotes are stored for their TTL plus the stale window."""
+    pipe = mock_redis.pipeline.return_value
+
+    cache.set("AAPL", 150.25, "2024-03-06", ttl=60)
+
+    assert pipe.set.call_args.kwargs["ex"] == 60 + QUOTE_STALE_TTL
+
+
+def test_get_negative_hit(cache, mock_redis):
+    """Test that an unknown-symbol marker is returned as a missing quote."""
+    mock_redis.pipeline.return_value.execute.return_value = [encode_quote(0.0, "", 1.0, missing=True), 300_000]
+
+    quote = cache.get("ZZZZ")
+
+    assert quote.missing
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_get_legacy_hash_entry(cache, mock_redis):
+    """Test that quotes still stored in the old hash format are read."""
+    mock_redis.pipeline.return_value.execute.side_effect = [
+        redis.ResponseError("WRONGTYPE"),
+        [{b"price": b"150.25", b"as_of": b"2024-03-06", b"fetched_at": b"1.0"}, -1],
+    ]
+
+    quote = cache.get("AAPL")
+
+    assert quote.price == 150.25
+    assert quote.as_of == "2024-03-06"
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_redis_error_is_a_miss(cache, mock_redis):
+    """Test that Redis failures degrade to a cache miss."""
+    mock_redis.pipeline.return_value.execute.side_effect = redis.ConnectionError("down")
+
+    assert cache.get("AAPL") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_set_missing_uses_negative_ttl(cache, mock_redis):
+    """Test that unknown symbols are cached with the short negative TTL."""
+    pipe = mock_redis.pipeline.return_value
+
+    cache.set_missing("ZZZZ")
+
+    key, record = pipe.set.call_args.args
+    assert key == "quote:ZZZZ"
+    assert pipe.set.call_args.kwargs["ex"] == QUOTE_NEGATIVE_TTL
+    assert decode_quote(record)["missing"]
+    pipe.execute.assert_called_once()
@@ -0,0 +1,265 @@
+import json
+
+import pytest
+
+from stock_portfolio.clients import quote_providers
+from stock_portfolio.clients.quote_providers import (
+    AlphaVantageProvider,
+    FileQuoteProvider,
+    HedgedQuoteProvider,
+    QuoteProvider,
+    build_quote_provider,
+    create_provider,
+    parse_time_series_daily,
+    stream_time_series_daily,
+)
+from stock_portfolio.utils.upstream_scheduler import UpstreamThrottledError, alpha_vantage_scheduler
+
+
+def daily_bar(close):
+    return {"1. open": close, "2. high": close, "3. low": close, "4. close": close, "5. volume": "1000"}
+
+
+def chunked(payload, size):
+    """Splits a JSON payload into byte chunks of `size`, cutting through keys and values."""
+    data = json.dumps(payload).encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def write_series(directory, symbol, closes):
+    payload = {"Time Series (Daily)": {day: daily_bar(close) for day, close in closes.items()}}
+    (directory / f"{symbol}.json").write_text(json.dumps(payload))
+
+
+class FailingProvider(QuoteProvider):
+    name = "failing"
+
+    def __init__(self, error):
+        self.error = error
+
+    def fetch_daily(self, symbol, priority=0, outputsize="compact"):
+        raise self.error
+
+
+@pytest.fixture
+def quote_dir(tmp_path):
+    write_series(tmp_path, "AAPL", {"2024-03-05": "149.00", "2024-03-06": "150.25"})
+    return tmp_path
+
+
+##########################################################
+# Parsing
+##########################################################
+
+def test_parse_rate_limit_notice():
+    """Test that a 200 carrying a rate-limit note is reported as throttling."""
+    with pytest.raises(UpstreamThrottledError, match="rate limit"):
+        parse_time_series_daily("AAPL", {"Note": "Thank you for using Alpha Vantage!"})
+
+
+def test_parse_unknown_symbol():
+    """Test that an 'Error Message' response is reported as an unknown symbol."""
+    with pytest.raises(LookupError, match="Invalid API call"):
+        parse_time_series_daily("ZZZZ", {"Error Message": "Invalid API call."})
+
+
+def test_parse_invalid_payload():
+    """Test that a response without a series is rejected."""
+    with pytest.raises(ValueError, match="Invalid API response format"):
+        parse_time_series_daily("AAPL", {})
+
+
+def test_stream_yields_bars_across_chunk_boundaries():
+    """Test that bars split anywhere across chunks, including inside a UTF-8 sequence, are parsed."""
+    payload = {
+        "Meta Data": {"1. Information": "Daily Prices – é"},
+        "Time Series (Daily)": {"2024-03-06": daily_bar("150.25"), "2024-03-05": daily_bar("149.00")},
+    }
+
+    for size in (1, 7, 4096):
+        bars = list(stream_time_series_daily("AAPL", chunked(payload, size)))
+        assert bars == [("2024-03-06", daily_bar("150.25")), ("2024-03-05", daily_bar("149.00"))]
+
+
+def test_stream_stops_reading_when_consumer_stops():
+    """Test that only the chunks needed for the bars consumed are read."""
+    payload = {"Time Series (Daily)": {f"2024-01-{day:02d}": daily_bar("1.0") for day in range(28, 0, -1)}}
+    chunks = chunked(payload, 16)
+    read = []
+
+    def source():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk
+
+    bars = stream_time_series_daily("AAPL", source())
+    assert next(bars)[0] == "2024-01-28"
+    bars.close()
+
+    assert len(read) < len(chunks) // 4
+
+
+@pytest.mark.parametrize("payload, error", [
+    ({"Note": "Thank you for using Alpha Vantage!"}, UpstreamThrottledError),
+    ({"Error Message": "Invalid API call."}, LookupError),
+    ({"Time Series (Daily)": {}}, ValueError),
+])
+def test_stream_reports_notices_and_errors(payload, error):
+    """Test that a streamed response without bars raises the same errors as the parser."""
+    with pytest.raises(error):
+        list(stream_time_series_daily("AAPL", chunked(payload, 5)))
+
+
+@pytest.mark.parametrize("body", [b"", b"<html>busy</html>", b'{"Time Series (Daily)": {"2024-03-06": {"4. cl'])
+def test_stream_rejects_malformed_body(body):
+    """Test that empty, non-JSON and truncated bodies are rejected as invalid."""
+    with pytest.raises(ValueError):
+        list(stream_time_series_daily("AAPL", [body]))
+
+
+##########################################################
+# Providers
+##########################################################
+
+def test_alpha_vantage_provider_requests_series(mocker):
+    """Test that the Alpha Vantage provider sends the query as parameters and returns the bars."""
+    mock_get = mocker.patch("stock_portfolio.clients.quote_providers.http_client.get")
+    mock_get.return_value.iter_content.return_value = chunked({"Time Series (Daily)": {"2024-03-06": daily_bar("150.25")}}, 32)
+    scheduler = mocker.MagicMock()
+    scheduler.run.side_effect = lambda fn, priority: fn()
+
+    series = AlphaVantageProvider("key", "https://example.test/query", scheduler).fetch_daily("AAPL", outputsize="full")
+
+    assert series["2024-03-06"]["4. close"] == "150.25"
+    params = mock_get.call_args.kwargs["params"]
+    assert params["symbol"] == "AAPL"
+    assert params["outputsize"] == "full"
+    assert params["apikey"] == "key"
+    assert mock_get.call_args.kwargs["stream"] is True
+    assert mock_get.call_args.kwargs["max_retries"] == 0  # One budget token, one upstream call
+    mock_get.return_value.close.assert_called_once()
+
+
+def test_alpha_vantage_provider_reports_throttling(mocker):
+    """Test that a rate-limit notice drains the provider's request budget."""
+    mock_get = mocker.patch("stock_portfolio.clients.quote_providers.http_client.get")
+    mock_get.return_value.iter_content.return_value = chunked({"Information": "rate limit"}, 32)
+    scheduler = mocker.MagicMock()
+    scheduler.run.side_effect = lambda fn, priority: fn()
+
+    with pytest.raises(UpstreamThrottledError):
+        AlphaVantageProvider("key", scheduler=scheduler).fetch_daily("AAPL")
+    scheduler.report_throttled.assert_called_once()
+
+
+def test_alpha_vantage_provider_reports_http_429(mocker):
+    """Test that an HTTP 429 drains the request budget instead of being retried or tripping the breaker."""
+    mock_get = mocker.patch("stock_portfolio.clients.quote_providers.http_client.get")
+    mock_get.return_value.status_code = 429
+    scheduler = mocker.MagicMock()
+    scheduler.run.side_effect = lambda fn, priority: fn()
+    provider = AlphaVantageProvider("key", scheduler=scheduler)
+
+    with pytest.raises(UpstreamThrottledError, match="429"):
+        provider.fetch_daily("AAPL")
+    mock_get.assert_called_once()
+    scheduler.report_throttled.assert_called_once()
+    assert provider.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_file_provider_reads_saved_series(quote_dir):
+    """Test that the file provider serves a saved response."""
+    series = FileQuoteProvider(str(quote_dir)).fetch_daily("aapl")
+
+    assert series["2024-03-06"]["4. close"] == "150.25"
+
+
+def test_file_provider_compact_returns_latest_bars(tmp_path):
+    """Test that a compact request is trimmed to the latest 100 bars."""
+    write_series(tmp_path, "AAPL", {f"2024-01-01T{i:03d}": "1.0" for i in range(150)})
+
+    series = FileQuoteProvider(str(tmp_path)).fetch_daily("AAPL")
+
+    assert len(series) == 100
+    assert max(series) == "2024-01-01T149"
+
+
+def test_file_provider_unknown_symbol(tmp_path):
+    """Test that a symbol without a file is reported as unknown."""
+    with pytest.raises(LookupError, match="No quote file"):
+        FileQuoteProvider(str(tmp_path)).fetch_daily("ZZZZ")
+
+
+##########################################################
+# Hedging
+##########################################################
+
+def test_fast_primary_is_not_hedged(quote_dir, mocker):
+    """Test that a primary answering within the hedge delay is used alone."""
+    secondary = mocker.MagicMock(spec=QuoteProvider)
+    provider = HedgedQuoteProvider(FileQuoteProvider(str(quote_dir)), secondary, default_delay=5)
+
+    assert "2024-03-06" in provider.fetch_daily("AAPL")
+    secondary.fetch_daily.assert_not_called()
+    assert provider.stats()["primary_wins"] == 1
+    assert provider.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged(quote_dir):
+    """Test that the secondary's answer is taken when the primary is slower than the hedge delay."""
+    slow = FileQuoteProvider(str(quote_dir), latency=1.0, name="slow")
+    provider = HedgedQuoteProvider(slow, FileQuoteProvider(str(quote_dir)), default_delay=0.05)
+
+    assert "2024-03-06" in provider.fetch_daily("AAPL")
+    assert provider.stats()["hedged"] == 1
+    assert provider.stats()["secondary_wins"] == 1
+
+
+def test_failed_primary_is_hedged_immediately(quote_dir):
+    """Test that a primary failure sends the request to the secondary without waiting."""
+    provider = HedgedQuoteProvider(FailingProvider(ConnectionError("down")), FileQuoteProvider(str(quote_dir)),
+                                   default_delay=5)
+
+    assert "2024-03-06" in provider.fetch_daily("AAPL")
+    assert provider.stats()["secondary_wins"] == 1
+
+
+def test_primary_error_raised_when_both_fail():
+    """Test that the primary's error is raised if neither provider answers."""
+    provider = HedgedQuoteProvider(FailingProvider(ConnectionError("primary down")),
+                                   FailingProvider(ConnectionError("secondary down")), default_delay=0)
+
+    with pytest.raises(ConnectionError, match="primary down"):
+        provider.fetch_daily("AAPL")
+
+
+def test_hedge_delay_tracks_primary_p95(quote_dir):
+    """Test that the hedge delay switches from the default to the primary's p95 once enough samples exist."""
+    provider = HedgedQuoteProvider(FileQuoteProvider(str(quote_dir)), FileQuoteProvider(str(quote_dir)),
+                                   min_samples=3, default_delay=9)
+    assert provider.hedge_delay() == 9
+
+    for ms in (10, 20, 400):
+        provider.latency.record(ms)
+
+    assert provider.hedge_delay() == pytest.approx(0.4)
+
+
+def test_build_quote_provider(tmp_path):
+    """Test that configuring a secondary provider enables hedging and unknown names are rejected."""
+    assert isinstance(build_quote_provider("file", ""), FileQuoteProvider)
+    assert build_quote_provider("file", "file").name == "file+file"
+    with pytest.raises(ValueError, match="Unknown quote provider 'nope'"):
+        build_quote_provider("nope", "")
+
+
+def test_alpha_vantage_hedge_shares_budget_of_same_key(monkeypatch):
+    """Test that a hedge on the primary's API key spends the primary's budget, and another key gets its own."""
+    monkeypatch.setenv("API_KEY", "primary-key")
+    monkeypatch.setattr(quote_providers, "ALPHA_VANTAGE_HEDGE_API_KEY", "primary-key")
+    assert create_provider("alphavantage-hedge").scheduler is alpha_vantage_scheduler
+
+    monkeypatch.setattr(quote_providers, "ALPHA_VANTAGE_HEDGE_API_KEY", "hedge-key")
+    hedge = create_provider("alphavantage-hedge")
+    assert hedge.scheduler is not alpha_vantage_scheduler
+    assert hedge.scheduler.name == "alphavantage-hedge"
@@ -1,7 +1,7 @@
 import pytest
 import requests
 
-from stock_portfolio.utils.random_utils import get_random
+from stock_portfolio.utils.random_utils import get_random, http_client
 
 
 RANDOM_NUMBER = 0.42
@@ -9,12 +9,12 @@ RANDOM_NUMBER = 0.42
 
 @pytest.fixture
 def mock_random_org(mocker):
-    # Patch the requests.get call
-    # requests.get returns an object, which we have replaced with a mock object
+    # Patch the shared HTTP client's get call
+    # http_client.get returns an object, which we have replaced with a mock object
     mock_response = mocker.Mock()
     # We are giving that object a text attribute
     mock_response.text = f"{RANDOM_NUMBER}"
-    mocker.patch("requests.get", return_value=mock_response)
+    mocker.patch("stock_portfolio.utils.random_utils.http_client.get", return_value=mock_response)
     return mock_response
 
 def test_get_random(mock_random_org):
@@ -25,12 +25,12 @@ def test_get_random(mock_random_org):
     assert result == RANDOM_NUMBER, f"Expected random number {RANDOM_NUMBER}, but got {result}"
 
     # Ensure that the correct URL was called
-    requests.get.assert_called_once_with("https://www.random.org/decimal-fractions/?num=1&dec=2&col=1&format=plain&rnd=new", timeout=5)
+    http_client.get.assert_called_once_with("https://www.random.org/decimal-fractions/?num=1&dec=2&col=1&format=plain&rnd=new", timeout=5)
 
 def test_get_random_request_failure(mocker):
     """Test handling of a request failure when calling random.org."""
     # Simulate a request failure
-    mocker.patch("requests.get", side_effect=requests.exceptions.RequestException("Connection error"))
+    mocker.patch("stock_portfolio.utils.random_utils.http_client.get", side_effect=requests.exceptions.RequestException("Connection error"))
 
     with pytest.raises(RuntimeError, match="Request to random.org failed: Connection error"):
         get_random()
@@ -38,7 +38,7 @@ def test_get_random_request_failure(mocker):
 def test_get_random_timeout(mocker):
     """Test handling of a timeout when calling random.org."""
     # Simulate a timeout
-    mocker.patch("requests.get", side_effect=requests.exceptions.Timeout)
+    mocker.patch("stock_portfolio.utils.random_utils.http_client.get", side_effect=requests.exceptions.Timeout)
 
     with pytest.raises(RuntimeError, match="Request to random.org timed out."):
         get_random()
@@ -0,0 +1,77 @@
+import pytest
+
+from stock_portfolio.utils.record_codec import (
+    decode_legacy_quote,
+    decode_legacy_stock,
+    decode_quote,
+    decode_stock,
+    encode_quote,
+    encode_stock,
+    migrate_legacy_records,
+)
+
+
+##########################################################
+# Round trips
+##########################################################
+
+def test_stock_round_trip():
+    """Test that a stock survives encoding, including a null quantity."""
+    assert decode_stock(encode_stock(7, "AAPL", 150.25, 10)) == {"id": 7, "symbol": "AAPL", "price": 150.25, "quantity": 10}
+    assert decode_stock(encode_stock(8, "MSFT", 1.0, None))["quantity"] is None
+
+
+def test_quote_round_trip():
+    """Test that a quote and an unknown-symbol marker survive encoding."""
+    assert decode_quote(encode_quote(150.25, "2024-03-06", 1.5)) == {
+        "price": 150.25, "as_of": "2024-03-06", "fetched_at": 1.5, "missing": False,
+    }
+    assert decode_quote(encode_quote(0.0, "", 1.5, missing=True))["missing"]
+
+
+def test_record_sizes_are_fixed():
+    """Test that records use the fixed layout: 27 bytes plus the symbol for stocks, 22 for quotes."""
+    assert len(encode_stock(7, "AAPL", 150.25, 10)) == 27 + 4
+    assert len(encode_quote(150.25, "2024-03-06", 1.5)) == 22
+
+
+@pytest.mark.parametrize("record", [None, b"", b"\x02" + bytes(40), b"\x01\x00"])
+def test_unknown_or_truncated_records_are_rejected(record):
+    """Test that empty, truncated and future-version records decode to None."""
+    assert decode_stock(record) is None
+    assert decode_quote(record) is None
+
+
+##########################################################
+# Legacy format
+##########################################################
+
+def test_decode_legacy_entries():
+    """Test that old hash entries are read back into the same shape as binary records."""
+    assert decode_legacy_stock({b"id": b"7", b"symbol": b"AAPL", b"price": b"1.5", b"quantity": b"None"}) == {
+        "id": 7, "symbol": "AAPL", "price": 1.5, "quantity": None,
+    }
+    assert decode_legacy_quote({b"missing": b"1", b"fetched_at": b"2.0"})["missing"]
+    assert decode_legacy_stock({b"id": b"7"}) is None
+
+
+def test_migrate_legacy_records(mocker):
+    """Test that hash entries are rewritten as binary records keeping their TTL."""
+    client = mocker.MagicMock()
+    client.scan_iter.side_effect = [[b"stock:7"], [b"quote:AAPL"]]
+    pipe = client.pipeline.return_value.__enter__.return_value
+    pipe.hgetall.side_effect = [
+        {b"id": b"7", b"symbol": b"AAPL", b"price": b"1.5", b"quantity": b"3"},
+        {b"price": b"150.25", b"as_of": b"2024-03-06", b"fetched_at": b"1.0"},
+    ]
+    pipe.pttl.side_effect = [-1, 5000]
+
+    counts = migrate_legacy_records(client)
+
+    assert counts == {"stocks": 1, "quotes": 1, "dropped": 0}
+    (stock_key, stock_record), stock_kwargs = pipe.set.call_args_list[0]
+    (quote_key, quote_record), quote_kwargs = pipe.set.call_args_list[1]
+    assert stock_key == b"stock:7" and decode_stock(stock_record)["quantity"] == 3
+    assert stock_kwargs["px"] is None
+    assert quote_key == b"quote:AAPL" and decode_quote(quote_record)["price"] == 150.25
+    assert quote_kwargs["px"] == 5000
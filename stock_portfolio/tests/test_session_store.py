@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+from stock_portfolio.utils import session_store as session_store_module
+from stock_portfolio.utils.session_store import SessionStore
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch.object(session_store_module, "redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture
+def store():
+    return SessionStore(ttl=600)
+
+
+def test_create_stores_hashed_token(store, mock_redis):
+    """Test that a new token maps to the user under its hash, with the session TTL."""
+    token = store.create(42, "alice")
+
+    key = f"session:{hashlib.sha256(token.encode()).hexdigest()}"
+    mock_redis.set.assert_called_once_with(key, "42:alice", ex=600)
+    assert token not in key
+
+
+def test_authenticate_slides_expiry(store, mock_redis):
+    """Test that a lookup reads the user and extends the TTL in one call."""
+    mock_redis.getex.return_value = b"42:al:ice"
+
+    assert store.authenticate("token") == (42, "al:ice")
+    mock_redis.getex.assert_called_once_with(f"session:{hashlib.sha256(b'token').hexdigest()}", ex=600)
+    assert store.stats()["hits"] == 1
+
+
+def test_authenticate_unknown_token(store, mock_redis):
+    """Test that unknown, expired and empty tokens are rejected."""
+    mock_redis.getex.return_value = None
+
+    assert store.authenticate("expired") is None
+    assert store.authenticate("") is None
+    assert mock_redis.getex.call_count == 1
+    assert store.stats()["misses"] == 2
+
+
+def test_revoke(store, mock_redis):
+    """Test that revoking deletes the session and reports whether it was live."""
+    mock_redis.delete.return_value = 1
+
+    assert store.revoke("token") is True
+    mock_redis.delete.assert_called_once_with(f"session:{hashlib.sha256(b'token').hexdigest()}")
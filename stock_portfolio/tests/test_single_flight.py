@@ -0,0 +1,102 @@
+import threading
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from stock_portfolio.utils import single_flight as single_flight_module
+from stock_portfolio.utils.single_flight import SingleFlight
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mock_redis.set.return_value = True
+    mocker.patch.object(single_flight_module, "redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture
+def flight():
+    return SingleFlight(prefix="test", lock_ttl=1)
+
+
+def test_concurrent_calls_are_coalesced(flight, mock_redis):
+    """Test that concurrent callers for one key share a single call."""
+    calls = []
+    release = threading.Event()
+
+    def slow_fetch():
+        calls.append(1)
+        release.wait(timeout=5)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("AAPL", slow_fetch, wait_for_peer=lambda: None)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    # Wait for the followers to register behind the leader before releasing it
+    while flight.stats()["coalesced_local"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [42] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"leader_calls": 1, "coalesced_local": 4, "coalesced_remote": 0}
+    mock_redis.eval.assert_called_once()  # Lock released by the leader
+
+
+def test_errors_are_shared_and_not_cached(flight, mock_redis):
+    """Test that the leader's exception is raised and the next call runs again."""
+    def failing_fetch():
+        raise ConnectionError("upstream down")
+
+    with pytest.raises(ConnectionError, match="upstream down"):
+        flight.do("AAPL", failing_fetch)
+
+    assert flight.do("AAPL", lambda: 7) == 7
+    assert flight.stats()["leader_calls"] == 2
+
+
+def test_waits_for_peer_process(flight, mock_redis):
+    """Test that a caller whose lock is held elsewhere reuses the peer's result."""
+    mock_redis.set.return_value = None
+    mock_redis.exists.return_value = 0
+    fetch_calls = []
+
+    result = flight.do("AAPL", lambda: fetch_calls.append(1), wait_for_peer=lambda: (150.25, "2024-03-06"))
+
+    assert result == (150.25, "2024-03-06")
+    assert fetch_calls == []
+    assert flight.stats()["coalesced_remote"] == 1
+
+
+def test_lock_is_renewed_while_leader_runs(mocker):
+    """Test that a call outlasting the lock TTL keeps the lock, so peers do not run it again."""
+    fake = fakeredis.FakeStrictRedis()
+    mocker.patch.object(single_flight_module, "redis_client", fake)
+    flight = SingleFlight(prefix="test", lock_ttl=0.3)
+    held = []
+
+    def slow_fetch():
+        time.sleep(0.5)
+        held.append(fake.exists("test:AAPL"))
+        return 42
+
+    assert flight.do("AAPL", slow_fetch, wait_for_peer=lambda: None) == 42
+    assert held == [1]
+    assert not fake.exists("test:AAPL")  # Released once the leader finished
+
+
+def test_runs_locally_when_redis_unavailable(flight, mock_redis):
+    """Test that a Redis outage falls back to in-process coalescing only."""
+    mock_redis.set.side_effect = redis.ConnectionError("down")
+
+    assert flight.do("AAPL", lambda: 3, wait_for_peer=lambda: None) == 3
+    assert flight.stats()["leader_calls"] == 1
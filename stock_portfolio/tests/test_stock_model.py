@@ -1,6 +1,20 @@
 from dataclasses import asdict
+from datetime import date, timedelta
+import json
+import fakeredis
 import pytest
+import redis
+import requests
+from sqlalchemy import update
+from stock_portfolio.clients.quote_providers import AlphaVantageProvider
+from stock_portfolio.db import db
+from stock_portfolio.models.price_history_model import PriceHistory
 from stock_portfolio.models.stock_model import UserStocks
+from stock_portfolio.utils.circuit_breaker import CircuitBreaker
+from stock_portfolio.utils.quote_cache import Quote
+from stock_portfolio.utils.record_codec import decode_stock, encode_stock
+from stock_portfolio.utils.upstream_scheduler import QuotaExceededError
+import threading
 from unittest.mock import MagicMock
 from app import create_app
 
@@ -12,7 +26,19 @@ def mock_redis_client(mocker):
     mock_redis = MagicMock()
     # Ensure the patch points to the correct location
     mocker.patch('stock_portfolio.models.stock_model.redis_client', mock_redis)
+    mocker.patch('stock_portfolio.utils.single_flight.redis_client', mock_redis)
+    mocker.patch('stock_portfolio.utils.upstream_scheduler.redis_client', mock_redis)
+    mock_redis.evalsha.return_value = [1, 0]  # Upstream budget always available
     return mock_redis
+
+
+def stock_record_writes(mock_redis):
+    """Returns the key and decoded record of every pipelined `stock:{id}` write."""
+    return [
+        (call.args[0], decode_stock(call.args[1]))
+        for call in mock_redis.pipeline.return_value.set.call_args_list
+        if call.args[0].startswith("stock:")
+    ]
 ######################################################
 #
 #    Add and delete
@@ -97,6 +123,54 @@ def test_decrease_stock_invalid_quantity(session):
         UserStocks.dec_stock_quantity("AAPL", -5)  # Negative quantity
 
 
+def test_trade_returns_new_quantity_and_writes_through(session, mock_redis_client):
+    """Test that buys and sells return the new quantity and refresh the Redis copy."""
+    UserStocks.add_stock("AAPL")
+    assert UserStocks.up_stock_quantity("AAPL", 10) == 10
+    assert UserStocks.dec_stock_quantity("AAPL", 4) == 6
+
+    stock = UserStocks.query.one()
+    cache_key, record = stock_record_writes(mock_redis_client)[-1]
+    assert cache_key == f"stock:{stock.id}"
+    assert record == {"id": stock.id, "symbol": "AAPL", "price": stock.price, "quantity": 6}
+
+
+def test_cache_write_through_waits_for_commit(session, mock_redis_client):
+    """Test that ORM changes reach Redis in one pipeline on commit and never on rollback."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    mock_redis_client.reset_mock()
+    pipe = mock_redis_client.pipeline.return_value
+
+    for stock in UserStocks.query.all():
+        stock.quantity = 3
+    db.session.flush()
+    pipe.execute.assert_not_called()
+    db.session.rollback()
+    db.session.commit()
+    pipe.execute.assert_not_called()
+
+    for stock in UserStocks.query.all():
+        stock.quantity = 4
+    db.session.commit()
+    pipe.execute.assert_called_once()
+    writes = stock_record_writes(mock_redis_client)
+    assert len(writes) == 2
+    assert {record["quantity"] for _, record in writes} == {4}
+
+
+def test_decrease_stock_cannot_oversell(session):
+    """Test that a sell of the full position succeeds once and then fails without going negative."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.up_stock_quantity("AAPL", 10)
+
+    assert UserStocks.dec_stock_quantity("AAPL", 10) == 0
+    with pytest.raises(ValueError, match="Insufficient stock quantity for 'AAPL'."):
+        UserStocks.dec_stock_quantity("AAPL", 10)
+
+    assert UserStocks.query.one().quantity == 0
+
+
 def test_decrease_stock_invalid_symbol(app):
     """Test increasing quantity for a non-existent stock."""
     with app.app_context():
@@ -149,4 +223,597 @@ def test_view_portfolio_full_details(session, mocker):
     portfolio = UserStocks.get_user_stocks()
     assert len(portfolio) == 1
     stock_symbol = portfolio[0]
-    assert stock_symbol == "AAPL"
\ No newline at end of file
+    assert stock_symbol == "AAPL"
+
+######################################################
+#
+#    Stock cache reads
+#
+######################################################
+
+@pytest.fixture
+def cache_reads(app):
+    app.config["STOCK_CACHE_READS"] = True
+    yield
+    app.config["STOCK_CACHE_READS"] = False
+
+
+def test_get_user_stocks_served_from_cache(session, cache_reads, mock_redis_client):
+    """Test that a complete cache index answers portfolio reads without SQL."""
+    mock_redis_client.pipeline.return_value.execute.return_value = [1, [encode_stock(1, "AAPL", 150.0, 10)]]
+
+    assert UserStocks.get_user_stocks() == ["AAPL"]  # Not in the (empty) database
+
+
+def test_get_user_stocks_rebuilds_cache_on_miss(session, cache_reads, mocker):
+    """Test that an incomplete index falls back to SQL and rebuilds the cache."""
+    fake_redis = fakeredis.FakeStrictRedis()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', fake_redis)
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    fake_redis.delete("stocks:index:complete")
+
+    assert UserStocks.get_user_stocks() == ["AAPL", "MSFT"]
+    assert 0 < fake_redis.ttl("stocks:index:complete") <= 3600
+    assert len(fake_redis.smembers("stocks:index")) == 2
+    assert UserStocks._cached_stocks() is not None
+
+
+def test_cache_rebuild_keeps_newer_writes_and_deletes(session, cache_reads, mocker):
+    """Test that a rebuild neither overwrites a newer write-through nor restores a row deleted after the query."""
+    fake_redis = fakeredis.FakeStrictRedis()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', fake_redis)
+    for symbol in ("AAPL", "IBM", "MSFT"):
+        UserStocks.add_stock(symbol)
+    aapl, ibm = (UserStocks.query.filter_by(symbol=symbol).one() for symbol in ("AAPL", "IBM"))
+    fake_redis.delete("stocks:index:complete")
+    real_pipeline = fake_redis.pipeline
+
+    def pipeline(*args, **kwargs):
+        # Both writes commit after the rebuild's query and before its cache writes
+        if not session.info.get("written"):
+            session.info["written"] = True
+            aapl.quantity = 5
+            session.delete(ibm)
+            session.commit()
+        return real_pipeline(*args, **kwargs)
+
+    mocker.patch.object(fake_redis, "pipeline", side_effect=pipeline)
+
+    UserStocks._load_stocks()
+
+    assert decode_stock(fake_redis.get(f"stock:{aapl.id}"))["quantity"] == 5
+    assert not fake_redis.exists(f"stock:{ibm.id}")
+    assert str(ibm.id).encode() not in fake_redis.smembers("stocks:index")
+    assert fake_redis.hget("stocks:by_symbol", "IBM") is None
+
+
+def test_get_stock_fill_keeps_newer_writes_and_deletes(session, cache_reads, mocker):
+    """Test that a miss fill neither overwrites a newer write-through nor restores a row deleted after the read."""
+    fake_redis = fakeredis.FakeStrictRedis()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', fake_redis)
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("IBM")
+    aapl, ibm = (UserStocks.query.filter_by(symbol=symbol).one() for symbol in ("AAPL", "IBM"))
+    fake_redis.flushall()
+    real_load = UserStocks._load_stock
+
+    def load_then_write(symbol):
+        stock = real_load(symbol)  # Read before the write below commits
+        if symbol == "AAPL":
+            aapl.quantity = 5
+        else:
+            session.delete(ibm)
+        session.commit()
+        return stock
+
+    mocker.patch.object(UserStocks, "_load_stock", side_effect=load_then_write)
+
+    UserStocks._read_stock("AAPL")
+    UserStocks._read_stock("IBM")
+
+    assert decode_stock(fake_redis.get(f"stock:{aapl.id}"))["quantity"] == 5
+    assert not fake_redis.exists(f"stock:{ibm.id}")
+    assert fake_redis.smembers("stocks:index") == {str(aapl.id).encode()}
+    assert fake_redis.hgetall("stocks:by_symbol") == {b"AAPL": str(aapl.id).encode()}
+
+
+def test_get_stock_uses_complete_index_for_unknown_symbols(session, cache_reads, mock_redis_client):
+    """Test that a symbol missing from a complete index is reported without SQL, and a hit is decoded."""
+    UserStocks.add_stock("AAPL")
+    mock_redis_client.pipeline.return_value.execute.return_value = [1, None]
+    assert UserStocks.get_stock("AAPL") is None
+
+    mock_redis_client.pipeline.return_value.execute.return_value = [1, b"7"]
+    mock_redis_client.get.return_value = encode_stock(7, "AAPL", 1.5, 3)
+    assert UserStocks.get_stock("AAPL") == {"id": 7, "symbol": "AAPL", "price": 1.5, "quantity": 3}
+    mock_redis_client.get.assert_called_once_with("stock:7")
+
+
+def test_get_stock_reads_legacy_hash_records(session, cache_reads, mock_redis_client):
+    """Test that stock entries still stored as hashes are decoded."""
+    mock_redis_client.pipeline.return_value.execute.return_value = [1, b"7"]
+    mock_redis_client.get.side_effect = redis.ResponseError("WRONGTYPE")
+    mock_redis_client.hgetall.return_value = {b"id": b"7", b"symbol": b"AAPL", b"price": b"1.5", b"quantity": b"3"}
+
+    assert UserStocks.get_stock("AAPL") == {"id": 7, "symbol": "AAPL", "price": 1.5, "quantity": 3}
+
+
+def test_invalidate_stock_cache_drops_symbol_map(session, cache_reads, mocker):
+    """Test that after invalidation a symbol no longer resolves through the old map to a stale record."""
+    fake_redis = fakeredis.FakeStrictRedis()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', fake_redis)
+    fake_redis.set("stock:1", encode_stock(1, "AAPL", 150.0, 10))
+    fake_redis.sadd("stocks:index", 1)
+    fake_redis.hset("stocks:by_symbol", "AAPL", 1)
+    fake_redis.set("stocks:index:complete", 1)
+
+    UserStocks.invalidate_stock_cache()
+
+    assert fake_redis.keys("stock*") == []
+    assert UserStocks.get_stock("AAPL") is None  # Read from the (empty) table
+
+
+def test_get_user_stocks_ignores_cache_when_disabled(session, mock_redis_client):
+    """Test that reads go straight to SQL when STOCK_CACHE_READS is off."""
+    UserStocks.add_stock("AAPL")
+    mock_redis_client.reset_mock()
+
+    assert UserStocks.get_user_stocks() == ["AAPL"]
+    mock_redis_client.pipeline.assert_not_called()
+
+
+def test_warm_stock_cache_writes_conditionally_in_chunks(session, mock_redis_client, mocker):
+    """Test that warm-up streams rows in chunks, never overwrites entries and marks the index complete."""
+    for symbol in ("AAPL", "MSFT", "IBM"):
+        UserStocks.add_stock(symbol)
+    mock_redis_client.reset_mock()
+    pipe = mock_redis_client.pipeline.return_value
+    mock_sleep = mocker.patch('stock_portfolio.models.stock_model._sleep')
+    pipe.execute.side_effect = [[], [], [set(), {}], []]  # Two chunks, then the prune's read and write
+
+    report = UserStocks.warm_stock_cache(chunk_size=2, max_rows_per_second=1)
+
+    assert report["rows"] == 3
+    assert pipe.execute.call_count == 4  # One pipelined batch per chunk, plus the prune
+    record_writes = [call for call in pipe.set.call_args_list if call.args[0].startswith("stock:")]
+    assert len(record_writes) == 3
+    assert all(call.kwargs == {"nx": True} for call in record_writes)
+    assert pipe.hsetnx.call_count == 3
+    assert mock_sleep.call_count == 2  # Paced to one row per second
+    pipe.set.assert_called_with("stocks:index:complete", 1, ex=3600)
+
+
+def test_warm_stock_cache_prunes_rows_deleted_during_warmup(session, mocker):
+    """Test that a stock deleted mid warm-up is not left in the index that is then marked complete."""
+    fake_redis = fakeredis.FakeStrictRedis()
+    mocker.patch('stock_portfolio.models.stock_model.redis_client', fake_redis)
+    for symbol in ("AAPL", "MSFT"):
+        UserStocks.add_stock(symbol)
+    aapl = UserStocks.query.filter_by(symbol="AAPL").one()
+    real_execute = fake_redis.pipeline
+
+    def pipeline(*args, **kwargs):
+        # The row goes away after the warm-up has read it but before its batch is written
+        pipe = real_execute(*args, **kwargs)
+        if not session.info.get("deleted"):
+            session.info["deleted"] = True
+            session.delete(aapl)
+            session.commit()
+        return pipe
+
+    mocker.patch.object(fake_redis, "pipeline", side_effect=pipeline)
+
+    UserStocks.warm_stock_cache(chunk_size=10, max_rows_per_second=0)
+
+    msft = UserStocks.query.filter_by(symbol="MSFT").one()
+    assert fake_redis.exists("stocks:index:complete")
+    assert fake_redis.smembers("stocks:index") == {str(msft.id).encode()}
+    assert fake_redis.hgetall("stocks:by_symbol") == {b"MSFT": str(msft.id).encode()}
+    assert not fake_redis.exists(f"stock:{aapl.id}")
+
+
+######################################################
+#
+#    Quote cache
+#
+######################################################
+
+@pytest.fixture(autouse=True)
+def breaker(mocker):
+    provider = AlphaVantageProvider("test-key")
+    provider.breaker = CircuitBreaker("alphavantage", failure_types=(requests.RequestException,), failure_threshold=1,
+                                      reset_timeout=60)
+    mocker.patch('stock_portfolio.models.stock_model.quote_provider', provider)
+    return provider.breaker
+
+
+@pytest.fixture
+def mock_quote_cache(mocker):
+    mock_cache = MagicMock()
+    mock_cache.set.side_effect = lambda symbol, price, as_of, ttl=None: Quote(symbol, price, as_of, fetched_at=1.0)
+    mocker.patch('stock_portfolio.models.stock_model.quote_cache', mock_cache)
+    return mock_cache
+
+
+def daily_bar(close):
+    return {"1. open": close, "2. high": close, "3. low": close, "4. close": close, "5. volume": "1000"}
+
+
+def response_chunks(payload):
+    return [json.dumps(payload).encode()]
+
+
+@pytest.fixture
+def mock_daily_response(mocker):
+    mock_response = MagicMock()
+    mock_response.iter_content.return_value = response_chunks({
+        "Time Series (Daily)": {  # Newest first, as Alpha Vantage sends it
+            "2024-03-06": daily_bar("150.25"),
+            "2024-03-05": daily_bar("149.00"),
+        }
+    })
+    return mocker.patch('stock_portfolio.clients.quote_providers.http_client.get', return_value=mock_response)
+
+
+def test_get_stock_price_cache_hit_skips_api(session, mock_quote_cache, mock_daily_response):
+    """Test that a cached quote is returned without calling the API."""
+    mock_quote_cache.get.return_value = MagicMock(missing=False, stale=False, price=151.0, age=3.0)
+
+    assert UserStocks.get_stock_price("AAPL") == 151.0
+    mock_daily_response.assert_not_called()
+
+
+def test_get_stock_price_cache_miss_fetches_and_stores(session, mock_quote_cache, mock_daily_response):
+    """Test that a miss fetches the latest close, caches it and updates the stock row."""
+    mock_quote_cache.get.return_value = None
+    UserStocks.add_stock("AAPL")
+
+    assert UserStocks.get_stock_price("AAPL") == 150.25
+    mock_quote_cache.set.assert_called_once_with("AAPL", 150.25, "2024-03-06", ttl=None)
+    assert UserStocks.query.one().price == 150.25
+    assert [bar["close"] for bar in PriceHistory.get_history("AAPL")] == [149.0, 150.25]
+
+
+def test_get_stock_price_unknown_symbol_is_negatively_cached(session, mock_quote_cache, mock_daily_response):
+    """Test that an upstream 'Error Message' is cached as an unknown symbol."""
+    mock_quote_cache.get.return_value = None
+    mock_daily_response.return_value.iter_content.return_value = response_chunks({"Error Message": "Invalid API call."})
+
+    with pytest.raises(ValueError, match="Stock symbol 'ZZZZ' was not recognised by the price API."):
+        UserStocks.get_stock_price("ZZZZ")
+    mock_quote_cache.set_missing.assert_called_once_with("ZZZZ")
+
+
+def test_get_stock_prices_batches_misses(session, mock_quote_cache, mocker):
+    """Test that a batch serves cached symbols, fetches the rest and stores them together."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    mock_quote_cache.get.side_effect = lambda symbol: MagicMock(missing=False, stale=False, price=10.0) if symbol == "IBM" else None
+    mock_fetch = mocker.patch.object(
+        UserStocks, '_stream_daily_series',
+        side_effect=lambda symbol, priority: iter([("2024-03-06", daily_bar({"AAPL": "150.25", "MSFT": "400.0"}[symbol]))])
+    )
+
+    prices, errors = UserStocks.get_stock_prices(["AAPL", "MSFT", "IBM", "AAPL"])
+
+    assert prices == {"AAPL": 150.25, "MSFT": 400.0, "IBM": 10.0}
+    assert errors == {}
+    assert mock_fetch.call_count == 2
+    assert {stock.symbol: stock.price for stock in UserStocks.query.all()} == {"AAPL": 150.25, "MSFT": 400.0}
+    assert PriceHistory.query.count() == 2
+
+
+def test_get_stock_prices_stops_parsing_at_stored_history(session, mock_quote_cache, mocker):
+    """Test that a fetch stops reading the series once it reaches the stored history."""
+    mock_quote_cache.get.return_value = None
+    UserStocks.add_stock("AAPL")
+    PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", {"2024-03-05": daily_bar("149.00")}))
+    session.commit()
+    parsed = []
+
+    def stream(symbol, priority):
+        for day, close in [("2024-03-06", "150.25"), ("2024-03-05", "149.00"), ("2024-03-04", "148.00")]:
+            parsed.append(day)
+            yield day, daily_bar(close)
+
+    mocker.patch.object(UserStocks, '_stream_daily_series', side_effect=stream)
+
+    prices, errors = UserStocks.get_stock_prices(["AAPL"])
+
+    assert prices == {"AAPL": 150.25}
+    assert parsed == ["2024-03-06", "2024-03-05"]
+    assert [bar["close"] for bar in PriceHistory.get_history("AAPL")] == [149.0, 150.25]
+
+
+def test_get_stock_prices_reports_per_symbol_errors(session, mock_quote_cache, mocker):
+    """Test that failures for one symbol do not fail the whole batch."""
+    mock_quote_cache.get.return_value = None
+
+    def fetch(symbol, priority):
+        if symbol == "ZZZZ":
+            raise LookupError("Invalid API call.")
+        raise ConnectionError("Error fetching data from API: timeout")
+
+    mocker.patch.object(UserStocks, '_stream_daily_series', side_effect=fetch)
+
+    prices, errors = UserStocks.get_stock_prices(["ZZZZ", "AAPL"])
+
+    assert prices == {}
+    assert errors["ZZZZ"] == "Stock symbol 'ZZZZ' was not recognised by the price API."
+    assert "timeout" in errors["AAPL"]
+    mock_quote_cache.set_missing.assert_called_once_with("ZZZZ")
+
+
+def test_get_stock_price_throttle_serves_last_known_price(session, mock_quote_cache, mock_daily_response, mocker):
+    """Test that an upstream rate-limit notice drains the budget and falls back to the stored price."""
+    mock_quote_cache.get.return_value = None
+    mock_daily_response.return_value.iter_content.return_value = response_chunks({"Note": "Thank you for using Alpha Vantage!"})
+    mock_throttled = mocker.patch('stock_portfolio.utils.upstream_scheduler.alpha_vantage_scheduler.report_throttled')
+    UserStocks.add_stock("AAPL")
+    UserStocks.query.one().price = 149.0
+
+    quote = UserStocks.get_stock_quote("AAPL")
+    assert quote.price == 149.0
+    assert quote.stale
+    mock_throttled.assert_called_once()
+
+
+def test_get_stock_price_quota_exhausted_without_stored_price(session, mock_quote_cache, mocker):
+    """Test that running out of budget with nothing stored raises a clean QuotaExceededError."""
+    mock_quote_cache.get.return_value = None
+    mocker.patch(
+        'stock_portfolio.utils.upstream_scheduler.alpha_vantage_scheduler.run',
+        side_effect=QuotaExceededError("alphavantage request budget exhausted; try again later.")
+    )
+
+    with pytest.raises(QuotaExceededError, match="budget exhausted"):
+        UserStocks.get_stock_price("AAPL")
+
+
+def test_get_stock_quote_serves_stale_quote_and_revalidates(session, mock_quote_cache, mocker):
+    """Test that a quote past its TTL is returned at once while a background refresh starts."""
+    mock_quote_cache.get.return_value = Quote("AAPL", 149.0, "2024-03-05", fetched_at=1.0, stale=True)
+    mock_revalidate = mocker.patch.object(UserStocks, '_revalidate_quote')
+
+    quote = UserStocks.get_stock_quote("AAPL")
+
+    assert quote.price == 149.0
+    assert quote.stale
+    assert quote.age > 0
+    mock_revalidate.assert_called_once_with("AAPL")
+
+
+def test_revalidate_quote_runs_once_per_symbol(session, mocker):
+    """Test that concurrent revalidations of a symbol share one background refresh."""
+    release = threading.Event()
+    mock_fetch = mocker.patch.object(
+        UserStocks, '_fetch_and_store', side_effect=lambda symbol: release.wait(5) and (Quote(symbol, 150.25), None)
+    )
+
+    refresh = UserStocks._revalidate_quote("AAPL")
+    assert UserStocks._revalidate_quote("AAPL") is None
+    release.set()
+
+    assert refresh.result(timeout=5)[0].price == 150.25
+    assert mock_fetch.call_count == 1
+
+
+def test_get_stock_quote_slow_upstream_serves_stored_price(session, mock_quote_cache, mocker):
+    """Test that a held symbol waits only briefly for the API before its stored price is served."""
+    mock_quote_cache.get.return_value = None
+    mocker.patch('stock_portfolio.models.stock_model.QUOTE_FALLBACK_WAIT', 0.05)
+    release = threading.Event()
+    mocker.patch.object(UserStocks, '_fetch_and_store',
+                        side_effect=lambda symbol: release.wait(5) and (Quote(symbol, 150.25), None))
+    UserStocks.add_stock("AAPL")
+    UserStocks.query.one().price = 149.0
+
+    quote = UserStocks.get_stock_quote("AAPL")
+    release.set()
+
+    assert quote.price == 149.0
+    assert quote.stale
+
+
+def test_open_breaker_stops_upstream_calls(session, mock_quote_cache, mock_daily_response, breaker):
+    """Test that repeated upstream failures trip the breaker and later lookups skip the API."""
+    mock_quote_cache.get.return_value = None
+    mock_daily_response.side_effect = requests.ConnectionError("connection refused")
+    UserStocks.add_stock("AAPL")
+    UserStocks.query.one().price = 149.0
+
+    with pytest.raises(ConnectionError, match="Error fetching data from API"):
+        UserStocks.get_stock_price("MSFT")
+    assert breaker.state == "open"
+    mock_daily_response.reset_mock()
+
+    with pytest.raises(ConnectionError, match="alphavantage is unavailable"):
+        UserStocks.get_stock_price("MSFT")
+    quote = UserStocks.get_stock_quote("AAPL")
+
+    assert quote.price == 149.0
+    assert quote.stale
+    mock_daily_response.assert_not_called()
+
+
+def test_get_held_symbols(session):
+    """Test that only stocks with a positive quantity are reported as held."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    UserStocks.up_stock_quantity("MSFT", 5)
+
+    assert UserStocks.get_held_symbols() == ["MSFT"]
+
+
+def test_apply_trades_atomic(session, mock_redis_client):
+    """Test that a valid batch is applied in order and the touched stocks are written through once."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    UserStocks.up_stock_quantity("AAPL", 5)
+    mock_redis_client.reset_mock()
+
+    results, committed = UserStocks.apply_trades([
+        {"symbol": "AAPL", "side": "buy", "quantity": 10},
+        {"symbol": "AAPL", "side": "sell", "quantity": 12},  # Covered by the buy above
+        {"symbol": "MSFT", "side": "buy", "quantity": 7},
+    ])
+
+    assert committed
+    assert [r["status"] for r in results] == ["applied"] * 3
+    assert [r["quantity_after"] for r in results] == [15, 3, 7]
+    assert {s.symbol: s.quantity for s in UserStocks.query.all()} == {"AAPL": 3, "MSFT": 7}
+    mock_redis_client.pipeline.return_value.execute.assert_called_once()
+    assert len(stock_record_writes(mock_redis_client)) == 2
+
+
+def test_apply_trades_atomic_rejects_whole_batch(session):
+    """Test that one failing order leaves every holding untouched in atomic mode."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.up_stock_quantity("AAPL", 5)
+
+    results, committed = UserStocks.apply_trades([
+        {"symbol": "AAPL", "side": "buy", "quantity": 10},
+        {"symbol": "AAPL", "side": "sell", "quantity": 50},
+        {"symbol": "XYZ", "side": "buy", "quantity": 1},
+        {"symbol": "AAPL", "side": "hold", "quantity": 1},
+    ])
+
+    assert not committed
+    assert [r["status"] for r in results] == ["skipped", "failed", "failed", "failed"]
+    assert results[1]["error"] == "Insufficient stock quantity for 'AAPL'."
+    assert results[2]["error"] == "Stock with symbol 'XYZ' not found."
+    assert UserStocks.query.one().quantity == 5
+
+
+def test_apply_trades_best_effort(session):
+    """Test that failing orders are skipped and the rest applied in best-effort mode."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.up_stock_quantity("AAPL", 5)
+
+    results, committed = UserStocks.apply_trades([
+        {"symbol": "AAPL", "side": "sell", "quantity": 50},
+        {"symbol": "AAPL", "side": "sell", "quantity": 0},
+        {"symbol": "AAPL", "side": "sell", "quantity": 2},
+    ], atomic=False)
+
+    assert committed
+    assert [r["status"] for r in results] == ["failed", "failed", "applied"]
+    assert results[2]["quantity_after"] == 3
+    assert UserStocks.query.one().quantity == 3
+
+
+def test_apply_trades_detects_concurrent_sell(session, mocker):
+    """Test that the batch is rolled back if a holding shrank after the snapshot was taken."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.up_stock_quantity("AAPL", 5)
+    original_execute = db.session.execute
+
+    def sell_everything_first(stmt, *args, **kwargs):
+        if args and isinstance(args[0], list):  # The batched UPDATE
+            original_execute(update(UserStocks).where(UserStocks.symbol == "AAPL").values(quantity=0))
+        return original_execute(stmt, *args, **kwargs)
+
+    patched = mocker.patch.object(db.session, "execute", side_effect=sell_everything_first)
+    with pytest.raises(ValueError, match="Holdings changed"):
+        UserStocks.apply_trades([{"symbol": "AAPL", "side": "sell", "quantity": 5}])
+    mocker.stop(patched)
+
+    assert UserStocks.query.one().quantity == 5
+
+
+def test_get_portfolio_valuation(session):
+    """Test valuing held positions with market values, weights and the total."""
+    UserStocks.add_stock("AAPL")
+    UserStocks.add_stock("MSFT")
+    UserStocks.add_stock("IBM")
+    UserStocks.up_stock_quantity("AAPL", 10)
+    UserStocks.up_stock_quantity("MSFT", 5)
+    for stock in UserStocks.query.all():
+        stock.price = {"AAPL": 150.0, "MSFT": 300.0, "IBM": 100.0}[stock.symbol]
+    session.commit()
+
+    valuation = UserStocks.get_portfolio_valuation()
+
+    positions = dict(zip(valuation["symbols"], zip(valuation["market_values"], valuation["weights"])))
+    assert positions == {"AAPL": (1500.0, 0.5), "MSFT": (1500.0, 0.5)}
+    assert valuation["total_value"] == 3000.0
+    assert valuation["position_count"] == 2
+
+
+def test_get_portfolio_valuation_empty(session):
+    """Test valuing an empty portfolio."""
+    valuation = UserStocks.get_portfolio_valuation()
+
+    assert valuation["symbols"] == []
+    assert valuation["total_value"] == 0.0
+    assert valuation["position_count"] == 0
+
+
+def test_sync_price_history_compact_after_high_water_mark(session, mock_quote_cache, mocker):
+    """Test that a recently synced symbol is fetched compact and only newer bars are stored."""
+    today = date.today()
+    old_day, new_day = (today - timedelta(days=2)).isoformat(), (today - timedelta(days=1)).isoformat()
+    PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", {old_day: daily_bar("149.00")}))
+    session.commit()
+    mock_fetch = mocker.patch.object(
+        UserStocks, '_fetch_daily_series',
+        return_value={old_day: daily_bar("148.00"), new_day: daily_bar("150.25")}
+    )
+
+    reports, errors = UserStocks.sync_price_history(["AAPL"])
+
+    assert errors == {}
+    assert reports["AAPL"] == {"mode": "compact", "high_water_mark": old_day, "new_rows": 1}
+    assert mock_fetch.call_args.args[2] == "compact"
+    assert [bar["close"] for bar in PriceHistory.get_history("AAPL")] == [149.0, 150.25]
+
+
+def test_sync_price_history_backfills_full_series(session, mock_quote_cache, mocker):
+    """Test that a symbol with no history is backfilled by streaming the full series."""
+    mock_stream = mocker.patch.object(
+        UserStocks, '_stream_daily_series',
+        return_value=iter([("2024-03-06", daily_bar("150.25")), ("2001-01-02", daily_bar("10.00"))])
+    )
+
+    reports, _ = UserStocks.sync_price_history(["AAPL"])
+
+    assert reports["AAPL"]["mode"] == "full"
+    assert reports["AAPL"]["new_rows"] == 2
+    assert mock_stream.call_args.args[2] == "full"
+    assert [bar["close"] for bar in PriceHistory.get_history("AAPL")] == [10.0, 150.25]
+
+
+def test_sync_price_history_stream_stops_at_high_water_mark(session, mock_quote_cache, mocker):
+    """Test that a full backfill stops reading at the stored high-water mark."""
+    PriceHistory.bulk_upsert(PriceHistory.rows_from_daily_series("AAPL", {"2001-01-02": daily_bar("10.00")}))
+    session.commit()
+    older = MagicMock(side_effect=AssertionError("read past the high-water mark"))
+
+    def stream(symbol, priority, outputsize):
+        yield "2024-03-06", daily_bar("150.25")
+        yield "2001-01-02", daily_bar("10.00")
+        older()
+
+    mocker.patch.object(UserStocks, '_stream_daily_series', side_effect=stream)
+
+    reports, errors = UserStocks.sync_price_history(["AAPL"])
+
+    assert errors == {}
+    assert reports["AAPL"] == {"mode": "full", "high_water_mark": "2001-01-02", "new_rows": 1}
+    older.assert_not_called()
+
+
+def test_sync_price_history_failed_stream_is_rolled_back(session, mock_quote_cache, mocker):
+    """Test that a backfill failing part-way leaves no partial history behind."""
+    def stream(symbol, priority, outputsize):
+        yield "2024-03-06", daily_bar("150.25")
+        raise ConnectionError("connection reset")
+
+    mocker.patch.object(UserStocks, '_stream_daily_series', side_effect=stream)
+
+    reports, errors = UserStocks.sync_price_history(["AAPL"])
+
+    assert reports == {}
+    assert errors == {"AAPL": "connection reset"}
+    assert PriceHistory.get_history("AAPL") == []
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+import redis
+
+from stock_portfolio.utils import upstream_scheduler as scheduler_module
+from stock_portfolio.utils.upstream_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    QuotaExceededError,
+    UpstreamScheduler,
+)
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    mock_redis = mocker.MagicMock()
+    mocker.patch.object(scheduler_module, "redis_client", mock_redis)
+    return mock_redis
+
+
+@pytest.fixture
+def scheduler():
+    return UpstreamScheduler("test", per_minute=5, per_day=100)
+
+
+def test_run_when_budget_available(scheduler, mock_redis):
+    """Test that a call runs immediately when the shared bucket grants a token."""
+    mock_redis.evalsha.return_value = [1, 0]
+
+    assert scheduler.run(lambda: "data") == "data"
+    assert scheduler.stats()["granted"] == 1
+
+
+def test_run_gives_up_when_budget_exhausted(scheduler, mock_redis):
+    """Test that a call fails cleanly once it has waited max_wait for budget."""
+    mock_redis.evalsha.return_value = [0, 10]
+
+    with pytest.raises(QuotaExceededError, match="test request budget exhausted"):
+        scheduler.run(lambda: "data", max_wait=0.05)
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_run_falls_back_to_local_budget(scheduler, mock_redis):
+    """Test that a Redis outage uses the in-process bucket with the same limits."""
+    mock_redis.evalsha.side_effect = redis.ConnectionError("down")
+
+    for _ in range(5):
+        scheduler.run(lambda: None)
+    with pytest.raises(QuotaExceededError):
+        scheduler.run(lambda: None, max_wait=0.05)
+
+
+def test_interactive_requests_go_first(scheduler, mock_redis):
+    """Test that a waiting interactive call is served before an earlier background call."""
+    budget = {"tokens": 0}
+    budget_lock = threading.Lock()
+
+    def take(*args, **kwargs):
+        with budget_lock:
+            if budget["tokens"] > 0:
+                budget["tokens"] -= 1
+                return [1, 0]
+        return [0, 10]
+
+    mock_redis.evalsha.side_effect = take
+    order = []
+    background = threading.Thread(
+        target=lambda: scheduler.run(lambda: order.append("background"), priority=PRIORITY_BACKGROUND, max_wait=2)
+    )
+    interactive = threading.Thread(
+        target=lambda: scheduler.run(lambda: order.append("interactive"), priority=PRIORITY_INTERACTIVE, max_wait=2)
+    )
+    background.start()
+    while scheduler.stats()["waiting"] < 1:
+        time.sleep(0.005)
+    interactive.start()
+    while scheduler.stats()["waiting"] < 2:
+        time.sleep(0.005)
+    with budget_lock:
+        budget["tokens"] = 2
+    background.join()
+    interactive.join()
+
+    assert order == ["interactive", "background"]
+
+
+def test_report_throttled_pauses_budget(scheduler, mock_redis):
+    """Test that a throttle notice sets the shared cooldown and drains the bucket."""
+    pipe = mock_redis.pipeline.return_value
+
+    scheduler.report_throttled(cooldown=30)
+
+    pipe.set.assert_called_once_with("upstream:test:cooldown", 1, px=30000)
+    pipe.hset.assert_called_once_with("upstream:test:bucket", "tokens", 0)
+    assert scheduler.stats()["throttled"] == 1
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+
+from stock_portfolio.utils.user_import import read_user_rows, user_file_format
+
+
+def test_user_file_format():
+    """Test that formats are recognised from file names and content types."""
+    assert user_file_format("users.CSV") == "csv"
+    assert user_file_format("text/csv; charset=utf-8") == "csv"
+    assert user_file_format("users.jsonl") == "ndjson"
+    assert user_file_format("application/x-ndjson") == "ndjson"
+    assert user_file_format("users.xlsx") is None
+    assert user_file_format(None) is None
+
+
+def test_read_csv_rows():
+    """Test that CSV rows are read with their line numbers."""
+    lines = io.StringIO("username,password\nalice,pw1\n\"bob\",\"p,w\"\n", newline="")
+
+    assert list(read_user_rows(lines, "csv")) == [
+        {"line": 2, "username": "alice", "password": "pw1"},
+        {"line": 3, "username": "bob", "password": "p,w"},
+    ]
+
+
+def test_read_csv_requires_header():
+    """Test that a CSV file without the required columns is rejected."""
+    with pytest.raises(ValueError, match="header row"):
+        list(read_user_rows(io.StringIO("alice,pw1\n"), "csv"))
+
+
+def test_read_ndjson_reports_malformed_lines():
+    """Test that malformed NDJSON lines are reported rather than dropped, and blank lines skipped."""
+    lines = ['{"username": "alice", "password": "pw1"}\n', "\n", "{oops\n", "[1, 2]\n"]
+
+    assert list(read_user_rows(lines, "ndjson")) == [
+        {"line": 1, "username": "alice", "password": "pw1"},
+        {"line": 3, "error": "Malformed JSON"},
+        {"line": 4, "error": "Expected a JSON object"},
+    ]
@@ -1,6 +1,36 @@
+import hashlib
+import os
+
 import pytest
 
+from stock_portfolio.models import user_model
 from stock_portfolio.models.user_model import Users
+from stock_portfolio.utils import local_cache as local_cache_module
+from stock_portfolio.utils.local_cache import INVALIDATION_CHANNEL, LocalCache
+from stock_portfolio.utils.password_hasher import PasswordHasher
+
+
+@pytest.fixture(autouse=True)
+def hasher(mocker):
+    """Hashes inline with a low scrypt cost, so tests neither start worker processes nor burn CPU."""
+    hasher = PasswordHasher("scrypt", {"n": 1024, "r": 8, "p": 1}, workers=0)
+    mocker.patch.object(user_model, "password_hasher", hasher)
+    return hasher
+
+
+@pytest.fixture
+def mock_redis(mocker):
+    return mocker.patch.object(local_cache_module, "redis_client")
+
+
+@pytest.fixture
+def user_cache(mocker, mock_redis):
+    """An enabled user cache that publishes invalidations to a mock Redis."""
+    cache = LocalCache(ttl=60)
+    cache.enabled = True
+    cache._listener_pid = os.getpid()  # Do not start the invalidation listener
+    mocker.patch.object(user_model, "user_cache", cache)
+    return cache
 
 
 @pytest.fixture
@@ -22,7 +52,7 @@ def test_create_user(session, sample_user):
     assert user is not None, "User should be created in the database."
     assert user.username == sample_user["username"], "Username should match the input."
     assert len(user.salt) == 32, "Salt should be 32 characters (hex)."
-    assert len(user.password) == 64, "Password should be a 64-character SHA-256 hash."
+    assert user.password.startswith("scrypt$n=1024,r=8,p=1$"), "Password should be stored with its KDF parameters."
 
 def test_create_duplicate_user(session, sample_user):
     """Test attempting to create a user with a duplicate username."""
@@ -44,6 +74,37 @@ def test_check_password_incorrect(session, sample_user):
     Users.create_user(**sample_user)
     assert Users.check_password(sample_user["username"], "wrongpassword") is False, "Password should not match."
 
+def test_check_password_upgrades_legacy_hash(session, sample_user):
+    """Test that a legacy SHA-256 hash is replaced with a KDF hash at a successful login."""
+    salt = "00" * 16
+    legacy = hashlib.sha256((sample_user["password"] + salt).encode()).hexdigest()
+    session.add(Users(username=sample_user["username"], salt=salt, password=legacy))
+    session.commit()
+
+    assert Users.check_password(sample_user["username"], "wrongpassword") is False
+    assert session.query(Users).one().password == legacy, "A failed login should not touch the hash."
+
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+    user = session.query(Users).one()
+    assert user.password.startswith("scrypt$")
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+
+def test_check_password_upgrades_changed_cost(session, sample_user, hasher):
+    """Test that raising the KDF cost rehashes existing users at their next login."""
+    Users.create_user(**sample_user)
+    hasher.params = {"n": 2048, "r": 8, "p": 1}
+
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+    assert session.query(Users).one().password.startswith("scrypt$n=2048,r=8,p=1$")
+
+def test_authenticate_returns_user_id(session, sample_user):
+    """Test that authenticating returns the user's ID, or None for a wrong password."""
+    Users.create_user(**sample_user)
+    user = session.query(Users).filter_by(username=sample_user["username"]).first()
+
+    assert Users.authenticate(sample_user["username"], sample_user["password"]) == user.id
+    assert Users.authenticate(sample_user["username"], "wrongpassword") is None
+
 def test_check_password_user_not_found(session):
     """Test checking password for a non-existent user."""
     with pytest.raises(ValueError, match="User nonexistentuser not found"):
@@ -108,3 +169,123 @@ def test_get_id_by_username_user_not_found(session):
     """
     with pytest.raises(ValueError, match="User nonexistentuser not found"):
         Users.get_id_by_username("nonexistentuser")
+
+
+##########################################################
+# User Cache
+##########################################################
+
+def test_repeat_lookups_are_cached(session, sample_user, user_cache):
+    """Test that a repeat login and ID lookup are answered from the user cache."""
+    Users.create_user(**sample_user)
+
+    user_id = Users.authenticate(sample_user["username"], sample_user["password"])
+    assert Users.get_id_by_username(sample_user["username"]) == user_id
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+
+    assert user_cache.stats()["misses"] == 1
+    assert user_cache.stats()["hits"] == 2
+
+
+def test_update_password_invalidates_cached_user(session, sample_user, user_cache, mock_redis):
+    """Test that a password change drops the cached hash here and in other workers."""
+    Users.create_user(**sample_user)
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is True
+
+    Users.update_password(sample_user["username"], "newpassword456")
+
+    mock_redis.publish.assert_called_with(INVALIDATION_CHANNEL, "user:testuser")
+    assert Users.check_password(sample_user["username"], "newpassword456") is True
+    assert Users.check_password(sample_user["username"], sample_user["password"]) is False
+
+
+def test_delete_user_invalidates_cached_user(session, sample_user, user_cache):
+    """Test that a deleted user is no longer served from the cache."""
+    Users.create_user(**sample_user)
+    Users.get_id_by_username(sample_user["username"])
+
+    Users.delete_user(sample_user["username"])
+
+    with pytest.raises(ValueError, match="User testuser not found"):
+        Users.get_id_by_username(sample_user["username"])
+
+
+##########################################################
+# Bulk Provisioning
+##########################################################
+
+def test_bulk_create_users_reports_every_row(session, sample_user):
+    """Test that a bulk create inserts new users and reports duplicates and invalid rows."""
+    Users.create_user(**sample_user)
+    rows = [
+        {"line": 2, "username": "alice", "password": "pw1"},
+        {"line": 3, "username": "testuser", "password": "pw2"},
+        {"line": 4, "username": "alice", "password": "pw3"},
+        {"line": 5, "username": "", "password": "pw4"},
+        {"line": 6, "username": "bob", "password": ""},
+        {"line": 7, "error": "Malformed JSON"},
+        {"line": 8, "username": "carol", "password": "pw5"},
+    ]
+
+    reports = list(Users.bulk_create_users(rows, chunk_size=3))
+
+    assert [(r["line"], r["status"]) for r in reports] == [
+        (2, "created"), (3, "duplicate"), (4, "duplicate"), (5, "invalid"),
+        (6, "invalid"), (7, "invalid"), (8, "created"),
+    ]
+    assert reports[1]["error"] == "User with username 'testuser' already exists"
+    assert Users.check_password("alice", "pw1") is True
+    assert Users.check_password("carol", "pw5") is True
+    assert session.query(Users).count() == 3
+
+
+def test_bulk_create_users_checks_conflicts_once_per_chunk(session, mocker):
+    """Test that each chunk runs one pre-check query, one hashing pass and one insert."""
+    spy_hash = mocker.spy(user_model.password_hasher, "hash_many")
+    spy_execute = mocker.spy(session, "execute")
+    rows = [{"line": i, "username": f"user{i}", "password": "pw"} for i in range(10)]
+
+    reports = list(Users.bulk_create_users(rows, chunk_size=5))
+
+    assert all(report["status"] == "created" for report in reports)
+    assert spy_hash.call_count == 2
+    assert spy_execute.call_count == 2  # The inserts; the pre-checks go through session.scalars
+    assert len(spy_execute.call_args.args[1]) == 5
+
+
+def test_bulk_create_users_hashes_only_new_users(session, sample_user, mocker):
+    """Test that rows for existing users are reported as duplicates without being hashed."""
+    Users.create_user(**sample_user)
+    spy_hash = mocker.spy(user_model.password_hasher, "hash_many")
+
+    reports = list(Users.bulk_create_users([{"username": sample_user["username"], "password": "pw"},
+                                            {"username": "new-user", "password": "pw"}]))
+
+    assert [r["status"] for r in reports] == ["duplicate", "created"]
+    assert len(spy_hash.call_args.args[0]) == 1
+
+    spy_hash.reset_mock()
+    reports = list(Users.bulk_create_users([{"username": "new-user", "password": "pw"}]))
+    assert [r["status"] for r in reports] == ["duplicate"]
+    spy_hash.assert_not_called()
+
+
+def test_bulk_create_users_rechecks_after_concurrent_insert(session, mocker):
+    """Test that a username taken between the pre-check and the insert is reported as a duplicate."""
+    real_scalars = session.scalars
+    calls = []
+
+    def scalars(statement):
+        calls.append(statement)
+        if len(calls) == 1:
+            Users.create_user("alice", "concurrent")  # Another worker wins the race
+            return real_scalars(statement.where(Users.username == ""))
+        return real_scalars(statement)
+
+    mocker.patch.object(session, "scalars", side_effect=scalars)
+
+    reports = list(Users.bulk_create_users([{"username": "alice", "password": "pw"},
+                                            {"username": "bob", "password": "pw"}]))
+
+    assert [r["status"] for r in reports] == ["duplicate", "created"]
+    assert len(calls) == 2